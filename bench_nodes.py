@@ -0,0 +1,97 @@
+"""比较节点用dict和用MibNode保存时的内存
+
+python bench_nodes.py [节点数]
+
+生成一个有这么多个scalar的scalar group, 分别按原来的方式(asDict()的dict,
+kids是(name, type, subId, oid)元组)和用ParseContext建成MibNode,
+用tracemalloc统计建好以后node_list/node_dict/name_oid占用的内存
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from mib_parser import ParseContext
+
+
+def fresh(text):
+    """和解析出来的字符串一样, 每次都是新的对象"""
+    return text.encode("utf-8").decode("utf-8")
+
+
+def make_fields(count):
+    """scalar group的定义, 和解析器交给ParseContext的字段相同"""
+    yield {"name": fresh("benchGroup"), "parent_name": fresh("enterprises"), "subId": fresh("9999")}
+    for i in range(1, count):
+        yield {
+            "name": fresh(f"benchScalar{i}"),
+            "parent_name": fresh("benchGroup"),
+            "subId": fresh(str(i)),
+            "syntax": fresh("Integer32"),
+            "access": fresh("read-write"),
+            "bounds": fresh("0..65535"),
+        }
+
+
+def build_dicts(count):
+    """原来的表示: 每个节点一个dict, kids是元组"""
+    node_list = []
+    node_dict = {}
+    name_oid = {"enterprises": (1, 3, 6, 1, 4, 1)}
+    node_dict[name_oid["enterprises"]] = {"name": "enterprises", "type": "ident", "kids": []}
+    for i, node in enumerate(make_fields(count)):
+        node["type"] = fresh("ident" if i == 0 else "scalar")
+        node_list.append(node)
+        node["kids"] = []
+        oid = list(name_oid[node["parent_name"]])
+        node["parent"] = tuple(oid)
+        oid.append(int(node["subId"]))
+        node_dict[tuple(oid)] = node
+        name_oid[node["name"]] = tuple(oid)
+        if node["parent"] in node_dict:
+            kid = (node["name"], node["type"], node["subId"], tuple(oid))
+            node_dict[node["parent"]]["kids"].append(kid)
+    return node_list, node_dict, name_oid
+
+
+def build_nodes(count):
+    """MibNode: 经过ParseContext的add_*和link"""
+    ctx = ParseContext()
+    ctx.add_base("SNMPv2-SMI", ["enterprises"])
+    for i, fields in enumerate(make_fields(count)):
+        if i == 0:
+            ctx.add_object_identifier(fields)
+        else:
+            ctx.add_object_type(fields)
+    ctx.link()
+    return ctx.node_list, ctx.node_dict, ctx.name_oid
+
+
+def measure(build, count):
+    """build建好的结构占用的字节数和用时"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(count)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size, elapsed
+
+
+def main():
+    """命令行入口"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(f"{count} nodes")
+    for label, build in (("dict nodes + kid tuples", build_dicts), ("MibNode", build_nodes)):
+        size, elapsed = measure(build, count)
+        print(
+            f"{label:24} {size / 1e6:6.1f} MB  {size / count:5.0f} B/node  "
+            f"(built in {elapsed:.2f} s under tracemalloc)"
+        )
+
+
+if __name__ == "__main__":
+    main()
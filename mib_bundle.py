@@ -0,0 +1,150 @@
+import contextlib
+import itertools
+import mmap
+import re
+
+# 切分时只看这些token, 其余的字节由正则跳过. 注释和字符串整个匹配,
+# 里面的 END, { 之类不会被当成关键字. 模块和顶层定义只在行首查找,
+# 同一行上的第二个定义会和前一个留在同一段里
+SCAN = re.compile(
+    rb"(?P<comment>--[^\r\n]*)"
+    rb'|(?P<string>"[^"]*")'
+    rb"|(?P<punct>[{};])"
+    rb"|^[ \t]*(?:"
+    rb"(?P<module>(?P<name>[A-Za-z][\w-]*)\s+DEFINITIONS\s*::=\s*BEGIN(?![\w-]))"
+    rb"|(?P<definition>[A-Za-z][\w-]*\s+"
+    rb"(?:(?:MODULE-IDENTITY|OBJECT-TYPE|NOTIFICATION-TYPE)(?![\w-])"
+    rb"|OBJECT\s+IDENTIFIER\s*::=|::=\s*[A-Za-z]))"
+    rb"|(?P<keyword>(?:IMPORTS|END)(?![\w-]))"
+    rb")",
+    re.MULTILINE,
+)
+
+
+class ModuleSpan:
+    """bundle里一个模块的字节范围
+
+    start是模块名所在的行首, end是模块结束的位置, line是start所在的行号,
+    body_end是END所在的行首. items是顶层定义(包括IMPORTS)开始的(行首, 行号),
+    只有scan_modules的items=True时才记录
+    """
+
+    __slots__ = ("name", "start", "end", "body_end", "line", "items")
+
+    def __init__(self, name, start, line):
+        self.name = name
+        self.start = start
+        self.end = self.body_end = None
+        self.line = line
+        self.items = None
+
+    def __repr__(self):
+        return f"ModuleSpan({self.name!r}, {self.start}, {self.end}, line={self.line})"
+
+    def text(self, buf):
+        """模块的原文"""
+        return buf[self.start : self.end].decode("utf-8")
+
+    def lines(self, buf):
+        """逐行解码模块原文, 只读取用到的行"""
+        start = self.start
+        while start < self.end:
+            stop = buf.find(b"\n", start, self.end) + 1 or self.end
+            yield buf[start:stop].decode("utf-8")
+            start = stop
+
+    def chunks(self, size):
+        """把顶层定义合并成至少size字节的段, 返回[(开始, 结束, 行号)]
+
+        每段从行首开始, 只包含完整的定义, 可以单独解析. 最后一段到END之前
+        """
+        chunks = []
+        for start, line in self.items:
+            if chunks and start - chunks[-1][0] < size:
+                continue
+            if chunks:
+                chunks[-1][1] = start
+            chunks.append([start, self.body_end, line])
+        return [tuple(chunk) for chunk in chunks]
+
+
+def scan_modules(buf, items=False, within=None):
+    """在bytes或mmap里找出各个模块, 逐个返回ModuleSpan
+
+    只用正则扫描字节, 不做词法分析. 找不到END的模块到下一个模块头或者
+    文件末尾为止, 留给解析器报错. within是之前找到的ModuleSpan时只扫描它的范围
+    """
+    span = None
+    depth = 0
+    in_imports = False
+    start, end, line = 0, len(buf), 1
+    if within is not None:
+        start, end, line = within.start, within.end, within.line
+    counted = start
+    for match in SCAN.finditer(buf, start, end):
+        kind = match.lastgroup
+        if kind in ("comment", "string"):
+            continue
+        if kind == "punct":
+            if match.group() == b"{":
+                depth += 1
+            elif match.group() == b"}":
+                depth -= 1
+            else:
+                in_imports = False
+            continue
+        pos = match.start()
+        if kind == "module":
+            if span is not None:
+                span.end = span.body_end = pos
+                yield span
+            line += buf[counted:pos].count(b"\n")
+            counted = pos
+            span = ModuleSpan(match.group("name").decode("ascii"), pos, line)
+            span.items = [] if items else None
+            depth = 0
+            in_imports = False
+        elif span is None or depth != 0 or in_imports:
+            continue
+        elif kind == "keyword" and match.group(kind) == b"END":
+            span.end = match.end()
+            span.body_end = pos
+            yield span
+            span = None
+        else:
+            in_imports = kind == "keyword"
+            if items:
+                line += buf[counted:pos].count(b"\n")
+                counted = pos
+                span.items.append((pos, line))
+    if span is not None:
+        span.end = span.body_end = end
+        yield span
+
+
+@contextlib.contextmanager
+def open_bundle(fname):
+    """只读mmap打开fname, 空文件返回b"" """
+    with open(fname, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b""
+            return
+        with buf:
+            yield buf
+
+
+def scan_file(fname, items=False):
+    """fname里的模块, 返回ModuleSpan列表"""
+    with open_bundle(fname) as buf:
+        return list(scan_modules(buf, items))
+
+
+def is_bundle(fname):
+    """fname里是否有多个模块, 打不开时返回False"""
+    try:
+        with open_bundle(fname) as buf:
+            return len(list(itertools.islice(scan_modules(buf), 2))) > 1
+    except OSError:
+        return False
@@ -0,0 +1,88 @@
+import hashlib
+import marshal
+import os
+
+from mib_io import replace_file
+from mib_node import FIELDS, MibNode
+
+# 缓存文件布局的版本, 改变下面的序列化格式时加一
+CACHE_FORMAT = 2
+
+
+class MibCache:
+    """解析结果的磁盘缓存
+
+    key由源文件内容, 解析器版本和解析前已经加入的节点(基础模块和IMPORTS)
+    计算得到, 任何一个变化都会重新解析. 文件用marshal保存, 每个节点是
+    按FIELDS顺序排列的元组, 节点的type_info在加载后重新计算
+    """
+
+    def __init__(self, cache_dir, version):
+        self.cache_dir = cache_dir
+        self.version = version
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, fname, ctx, data=None):
+        """fname和ctx当前状态对应的缓存key, data不为None时代替文件内容"""
+        digest = hashlib.sha256()
+        digest.update(f"{CACHE_FORMAT}:{self.version}\0".encode())
+        # 版本2不写对象引用, 相同的内容总是得到相同的字节
+        digest.update(marshal.dumps([node.astuple() for node in ctx.node_list], 2))
+        digest.update(marshal.dumps(sorted(ctx.textual_conventions.items()), 2))
+        if data is None:
+            with open(fname, "rb") as f:
+                data = f.read()
+        digest.update(data)
+        return digest.hexdigest()
+
+    def path(self, key):
+        """key对应的缓存文件"""
+        return os.path.join(self.cache_dir, key + ".mibc")
+
+    def load(self, key, ctx):
+        """命中时用缓存替换ctx的内容并返回True
+
+        缓存文件损坏或者格式不对时当作没有命中, 这时ctx不变
+        """
+        try:
+            with open(self.path(key), "rb") as f:
+                data = marshal.load(f)
+            if data[0] != CACHE_FORMAT:
+                return False
+            _, module_name, imports, textual_conventions, nodes = data
+            textual_conventions = dict(textual_conventions)
+            node_list = [MibNode(**dict(zip(FIELDS, values))) for values in nodes]
+            node_dict = {}
+            name_oid = {}
+            # node_list是加入顺序的倒序, 按加入顺序重建kids和name_oid
+            for node in reversed(node_list):
+                node_dict[node.oid] = node
+                name_oid[node.name] = node.oid
+                if node.parent in node_dict:
+                    node_dict[node.parent].kids.append(node)
+            # 和ParseContext.link一样按subId排序
+            for node in node_list:
+                node.kids.sort(key=lambda kid: kid.subId)
+        except (OSError, EOFError, ValueError, TypeError, IndexError):
+            return False
+        ctx.module_name, ctx.imports = module_name, imports
+        ctx.textual_conventions.clear()
+        ctx.textual_conventions.update(textual_conventions)
+        ctx.node_list[:] = node_list
+        ctx.node_dict.clear()
+        ctx.node_dict.update(node_dict)
+        ctx.name_oid.clear()
+        ctx.name_oid.update(name_oid)
+        return True
+
+    def store(self, key, ctx):
+        """保存ctx, 先写临时文件再改名, 不会留下写了一半的缓存"""
+        data = (
+            CACHE_FORMAT,
+            ctx.module_name,
+            ctx.imports,
+            ctx.textual_conventions,
+            [node.astuple() for node in ctx.node_list],
+        )
+        with replace_file(self.path(key), "wb") as f:
+            marshal.dump(data, f)
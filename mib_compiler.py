@@ -0,0 +1,301 @@
+import contextlib
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from mib_bundle import open_bundle, scan_file
+from mib_fast_parser import SmiSyntaxError, read_header
+from mib_generator import MibGenerator, output_name
+from mib_parser import BASE_MODULES, MibParser
+
+
+class MibCompileError(Exception):
+    """找不到导入的模块, 或者模块之间循环导入"""
+
+
+class MibCompiler:
+    """多文件MIB编译器
+
+    按search_path查找IMPORTS里的模块并递归编译. 编译结果(ParseContext)
+    按模块名缓存在modules里, 一次运行中每个模块只解析一次.
+    bundles里登记的MIB bundle中的模块优先于search_path
+    """
+
+    SUFFIXES = ("", ".mib", ".my", ".txt", ".smi")
+
+    def __init__(self, search_path=(".",), engine="pyparsing", cache_dir=None, parse_jobs=1):
+        self.search_path = list(search_path)
+        self.engine = engine
+        self.cache_dir = cache_dir
+        self.parse_jobs = parse_jobs
+        self.modules = {}
+        self.compiling = []
+        # 模块名 -> (bundle文件, ModuleSpan)
+        self.bundles = {}
+
+    def find(self, module):
+        """在search_path里查找模块文件"""
+        for directory in self.search_path:
+            for suffix in self.SUFFIXES:
+                path = os.path.join(directory, module + suffix)
+                if os.path.isfile(path):
+                    return path
+        raise MibCompileError(f"cannot find MIB module {module} in {self.search_path}")
+
+    def compile(self, module):
+        """按模块名编译, 返回它的ParseContext"""
+        if module not in self.modules and module in self.bundles:
+            self.compile_span(*self.bundles[module])
+        elif module not in self.modules:
+            fname = self.find(module)
+            if self.compile_file(fname).module_name != module:
+                raise MibCompileError(f"{fname} does not define MIB module {module}")
+        return self.modules[module]
+
+    def compile_file(self, fname):
+        """编译文件, 返回它的ParseContext"""
+        with open(fname, encoding="utf-8") as f:
+            module, imports = read_header(f)
+        return self.compile_module(fname, module, imports)
+
+    def compile_span(self, fname, span):
+        """编译bundle文件fname里span范围内的模块, 只解码这一段"""
+        with open_bundle(fname) as buf:
+            module, imports = read_header(span.lines(buf), span.line)
+        return self.compile_module(fname, module, imports, span)
+
+    def compile_module(self, fname, module, imports, span=None):
+        """编译读过模块头的模块, span见MibParser.load"""
+        if module in self.modules:
+            return self.modules[module]
+        if module in self.compiling:
+            cycle = self.compiling[self.compiling.index(module) :] + [module]
+            raise MibCompileError(f"circular IMPORTS: {' -> '.join(cycle)}")
+
+        self.compiling.append(module)
+        try:
+            parser = MibParser(
+                engine=self.engine, cache_dir=self.cache_dir, parse_jobs=self.parse_jobs
+            )
+            parser.ctx.module_name = module
+            parser.ctx.imports = imports
+            for source, symbols in imports.items():
+                self.import_symbols(parser.ctx, source, symbols)
+            parser.load(fname, span)
+        finally:
+            self.compiling.pop()
+        self.modules[module] = parser.ctx
+        return parser.ctx
+
+    def import_symbols(self, ctx, source, symbols):
+        """把source模块中的symbols连同它们的祖先节点加入ctx"""
+        if source in BASE_MODULES:
+            base = BASE_MODULES[source]
+            ctx.add_base(source, [name for name in symbols if name in base])
+            return
+        dep = self.compile(source)
+        for name in symbols:
+            # 连同它所基于的TEXTUAL-CONVENTION一起导入
+            while name in dep.textual_conventions and name not in ctx.textual_conventions:
+                ctx.textual_conventions[name] = dep.textual_conventions[name]
+                name = dep.textual_conventions[name]
+        nodes = {}
+        for name in symbols:
+            oid = dep.name_oid.get(name)
+            while oid in dep.node_dict and oid not in ctx.node_dict:
+                nodes[oid] = dep.node_dict[oid]
+                oid = nodes[oid].parent
+        for oid in sorted(nodes, key=len):
+            ctx.add_imported(nodes[oid])
+
+
+def compile_and_generate(
+    fname,
+    search_path,
+    engine,
+    cache_dir,
+    generator_options=None,
+    bundles=None,
+    module=None,
+    parse_jobs=1,
+):
+    """编译一个文件并生成.c/.h, 返回错误信息, 成功时返回None
+
+    在进程池里运行, 生成过程的输出被丢弃. 生成代码时的异常也作为这个文件的
+    错误信息返回, 不会中断整批编译. generator_options是传给MibGenerator的参数,
+    bundles是MibCompiler.bundles. module不为None时编译bundle文件fname里的这个模块,
+    生成的文件以模块名命名
+    """
+    compiler = MibCompiler(
+        search_path, engine=engine, cache_dir=cache_dir, parse_jobs=parse_jobs
+    )
+    compiler.bundles.update(bundles or {})
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if module is None:
+                ctx = compiler.compile_file(fname)
+            else:
+                ctx = compiler.compile(module)
+            MibGenerator(
+                ctx.node_list,
+                ctx.node_dict,
+                ctx.name_oid,
+                fname if module is None else module,
+                **(generator_options or {}),
+            ).process()
+    except Exception as err:  # pylint: disable=broad-except
+        return f"{type(err).__name__}: {err}"
+    return None
+
+
+def read_modules(fname):
+    """读取fname里各个模块的模块头, 返回[(模块名, 导入, ModuleSpan)]
+
+    只有一个模块的普通文件ModuleSpan为None
+    """
+    spans = scan_file(fname)
+    if len(spans) <= 1:
+        with open(fname, encoding="utf-8") as f:
+            return [read_header(f) + (None,)]
+    with open_bundle(fname) as buf:
+        return [read_header(span.lines(buf), span.line) + (span,) for span in spans]
+
+
+def find_cycle(pending, start):
+    """沿pending里的依赖从start回到start的最短路径, 没有时返回None"""
+    paths = [[start]]
+    seen = {start}
+    for path in paths:
+        for dep in sorted(pending[path[-1]]):
+            if dep == start:
+                return path + [start]
+            if dep in pending and dep not in seen:
+                seen.add(dep)
+                paths.append(path + [dep])
+    return None
+
+
+def dependency_levels(headers):
+    """按IMPORTS把模块分层, 每层只依赖前面的层
+
+    headers为{模块名: 导入}, 返回(分层列表, 循环依赖, 被阻塞的模块).
+    循环依赖为{模块名: 回到自己的导入路径}, 只包括在循环里的模块;
+    被阻塞的模块只是导入了循环里的模块, 为{模块名: 没有分层的直接导入}
+    """
+    pending = {
+        module: {source for source in imports if source in headers}
+        for module, imports in headers.items()
+    }
+    levels = []
+    done = set()
+    while pending:
+        level = sorted(module for module, deps in pending.items() if deps <= done)
+        if not level:
+            break
+        levels.append(level)
+        done.update(level)
+        for module in level:
+            del pending[module]
+    cycles = {}
+    blocked = {}
+    for module in sorted(pending):
+        cycle = find_cycle(pending, module)
+        if cycle is not None:
+            cycles[module] = cycle
+        else:
+            blocked[module] = sorted(pending[module] & pending.keys())
+    return levels, cycles, blocked
+
+
+def compile_batch(
+    files,
+    jobs=None,
+    search_path=(),
+    engine="pyparsing",
+    cache_dir=None,
+    generator_options=None,
+    parse_jobs=1,
+):
+    """用进程池并行编译多个MIB文件并生成代码, 生成的文件都在当前目录
+
+    同一层的模块互不依赖, 并行编译; 后面的层在前面的层完成后开始.
+    parse_jobs大于1时每个模块再切成段, 在工作进程里并行解析.
+    没有指定cache_dir时使用临时目录, 让依赖模块在所有进程之间只解析一次.
+    包含多个模块的文件(MIB bundle)里的每个模块单独编译, 只解码自己的那一段.
+    不同目录下的同名文件会生成同名的.c/.h, 后面的作为错误不编译.
+    返回[(文件名, 错误信息或None)], 顺序和files相同, bundle里的模块按
+    "文件名:模块名"依次列出
+    """
+    if jobs is not None and jobs < 1:
+        raise ValueError("jobs must be at least 1")
+    results = {}
+    labels = []
+    headers = {}
+    # 模块 -> 结果里的文件名
+    module_file = {}
+    # 生成的文件名 -> 结果里的文件名
+    outputs = {}
+    bundles = {}
+    for fname in files:
+        try:
+            modules = read_modules(fname)
+        except (SmiSyntaxError, OSError) as err:
+            labels.append(fname)
+            results[fname] = f"{type(err).__name__}: {err}"
+            continue
+        for module, imports, span in modules:
+            label = fname if span is None else f"{fname}:{module}"
+            labels.append(label)
+            if module in module_file:
+                results[label] = f"module {module} already defined in {module_file[module]}"
+                continue
+            output = output_name(fname if span is None else module)
+            if output in outputs:
+                results[label] = f"output {output}.c/.h already generated for {outputs[output]}"
+                continue
+            outputs[output] = label
+            headers[module] = imports
+            module_file[module] = label
+            if span is not None:
+                bundles[module] = (fname, span)
+
+    levels, cycles, blocked = dependency_levels(headers)
+    for module, cycle in cycles.items():
+        results[module_file[module]] = f"MibCompileError: circular IMPORTS: {' -> '.join(cycle)}"
+    for module, deps in blocked.items():
+        results[module_file[module]] = f"skipped: depends on {', '.join(deps)}"
+
+    dirs = [os.path.dirname(fname) or "." for fname in files]
+    search_path = list(dict.fromkeys(dirs + list(search_path)))
+    with contextlib.ExitStack() as stack:
+        if cache_dir is None:
+            cache_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        pool = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+        failed = set()
+        for level in levels:
+            futures = {}
+            for module in level:
+                label = module_file[module]
+                broken = sorted(failed & set(headers[module]))
+                if broken:
+                    results[label] = f"skipped, IMPORTS failed module {', '.join(broken)}"
+                    failed.add(module)
+                    continue
+                fname = bundles[module][0] if module in bundles else label
+                futures[module] = pool.submit(
+                    compile_and_generate,
+                    fname,
+                    search_path,
+                    engine,
+                    cache_dir,
+                    generator_options,
+                    bundles,
+                    module if module in bundles else None,
+                    parse_jobs,
+                )
+            for module, future in futures.items():
+                results[module_file[module]] = future.result()
+                if results[module_file[module]] is not None:
+                    failed.add(module)
+    return [(label, results[label]) for label in labels]
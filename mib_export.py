@@ -0,0 +1,259 @@
+import mmap
+import struct
+import sys
+from array import array
+
+from mib_io import replace_file
+from mib_node import MibNode
+
+MAGIC = b"MIBT"
+# 文件布局的版本, 改变SECTIONS或者编码时加一
+EXPORT_FORMAT = 2
+# 魔数, 版本, 字节序(0小端 1大端), 节点数, 段数
+HEADER = struct.Struct("<4sHHII")
+# 每段在文件中的位置和元素个数
+SECTION = struct.Struct("<QQ")
+# 段按8字节对齐, memoryview.cast不需要复制
+ALIGN = 8
+NONE = 0xFFFFFFFF
+
+# 节点按OID排序, 下面按节点下标的列都和这个顺序一致
+SECTIONS = (
+    # 字符串表: 去重后的utf-8, 第i个是strings[string_offsets[i]:string_offsets[i+1]]
+    ("strings", "B"),
+    ("string_offsets", "I"),
+    # 第i个节点的OID是oids[oid_offsets[i]:oid_offsets[i+1]]
+    ("oids", "I"),
+    ("oid_offsets", "I"),
+    # 父节点的下标, 不在树里时为NONE
+    ("parents", "I"),
+    # 字符串字段, 值是字符串表的下标, 没有时为NONE
+    ("names", "I"),
+    ("parent_names", "I"),
+    ("syntaxes", "I"),
+    ("units", "I"),
+    ("bounds", "I"),
+    ("syn_seq_ofs", "I"),
+    # access取值不固定(比如not-access), 也存在字符串表里
+    ("accesses", "I"),
+    # TYPES里的下标
+    ("types", "B"),
+    # 列表字段, 同oids一样用offsets切分, 值是字符串表的下标
+    ("index_offsets", "I"),
+    ("indexes", "I"),
+    ("object_offsets", "I"),
+    ("objects", "I"),
+    ("enum_offsets", "I"),
+    ("enum_names", "I"),
+    ("enum_values", "i"),
+    # 按名字排序的节点下标, 用来按名字二分查找
+    ("by_name", "I"),
+)
+
+TYPES = (None, "ident", "object", "scalar", "table", "row", "column", "notification")
+
+
+class StringTable:
+    """导出时的字符串表, 相同的字符串只保存一次"""
+
+    def __init__(self):
+        self.ids = {}
+        self.data = bytearray()
+        self.offsets = array("I", [0])
+
+    def add(self, text):
+        """text的下标, None为NONE"""
+        if text is None:
+            return NONE
+        if text not in self.ids:
+            self.ids[text] = len(self.offsets) - 1
+            self.data += text.encode("utf-8")
+            self.offsets.append(len(self.data))
+        return self.ids[text]
+
+
+def export_tree(node_dict, fname):
+    """把node_dict({OID: MibNode})写成MibTree能直接打开的二进制文件"""
+    oids = sorted(node_dict)
+    position = {oid: i for i, oid in enumerate(oids)}
+    strings = StringTable()
+    columns = {name: array(typecode) for name, typecode in SECTIONS}
+    for name in ("oid_offsets", "index_offsets", "object_offsets", "enum_offsets"):
+        columns[name].append(0)
+    for oid in oids:
+        node = node_dict[oid]
+        columns["oids"].extend(oid)
+        columns["oid_offsets"].append(len(columns["oids"]))
+        columns["parents"].append(position.get(node.parent, NONE))
+        for column, field in (
+            ("names", "name"),
+            ("parent_names", "parent_name"),
+            ("syntaxes", "syntax"),
+            ("units", "units"),
+            ("bounds", "bounds"),
+            ("syn_seq_ofs", "syn_seq_of"),
+            ("accesses", "access"),
+        ):
+            columns[column].append(strings.add(getattr(node, field)))
+        columns["types"].append(TYPES.index(node.type))
+        columns["indexes"].extend(map(strings.add, node.index or ()))
+        columns["index_offsets"].append(len(columns["indexes"]))
+        columns["objects"].extend(map(strings.add, node.objects or ()))
+        columns["object_offsets"].append(len(columns["objects"]))
+        for enum_name, value in node.enums or ():
+            columns["enum_names"].append(strings.add(enum_name))
+            columns["enum_values"].append(value)
+        columns["enum_offsets"].append(len(columns["enum_names"]))
+    columns["by_name"].extend(sorted(range(len(oids)), key=lambda i: node_dict[oids[i]].name))
+    columns["strings"].frombytes(strings.data)
+    columns["string_offsets"] = strings.offsets
+
+    header_size = HEADER.size + SECTION.size * len(SECTIONS)
+    offset = header_size
+    table = []
+    for name, _ in SECTIONS:
+        offset += -offset % ALIGN
+        table.append((offset, len(columns[name])))
+        offset += len(columns[name]) * columns[name].itemsize
+    byteorder = 0 if sys.byteorder == "little" else 1
+    # 先写临时文件再改名, 正在读旧文件的进程不受影响
+    with replace_file(fname, "wb") as f:
+        f.write(HEADER.pack(MAGIC, EXPORT_FORMAT, byteorder, len(oids), len(SECTIONS)))
+        for entry in table:
+            f.write(SECTION.pack(*entry))
+        for (name, _), (start, _) in zip(SECTIONS, table):
+            f.write(b"\0" * (start - f.tell()))
+            columns[name].tofile(f)
+
+
+class MibTree:
+    """只读打开export_tree写出的文件
+
+    用mmap打开, 每一段直接cast成memoryview, 打开时不解析也不复制节点.
+    节点用按OID排序后的下标表示, 需要时再取出字段或者整个MibNode
+    """
+
+    def __init__(self, fname):
+        with open(fname, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size or header[:4] != MAGIC:
+                raise ValueError(f"{fname} is not a MIB tree export")
+            _, version, byteorder, self.count, sections = HEADER.unpack(header)
+            if version != EXPORT_FORMAT or sections != len(SECTIONS):
+                raise ValueError(f"{fname} is not a MIB tree export of format {EXPORT_FORMAT}")
+            if byteorder != (0 if sys.byteorder == "little" else 1):
+                raise ValueError(f"{fname} was exported on a machine of the other byte order")
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.buf)
+        self.views = []
+        # 截断或者损坏的文件也要释放已经建好的memoryview和mmap
+        try:
+            if len(view) < HEADER.size + SECTION.size * len(SECTIONS):
+                raise ValueError(f"{fname} is truncated")
+            for i, (name, typecode) in enumerate(SECTIONS):
+                start, count = SECTION.unpack_from(view, HEADER.size + i * SECTION.size)
+                size = count * array(typecode).itemsize
+                if start + size > len(view):
+                    raise ValueError(f"{fname} is truncated")
+                column = view[start : start + size].cast(typecode)
+                self.views.append(column)
+                setattr(self, name, column)
+        except BaseException:
+            view.release()
+            self.close()
+            raise
+        view.release()
+
+    def close(self):
+        """释放所有memoryview并关闭mmap"""
+        for column in getattr(self, "views", ()):
+            column.release()
+        self.views = []
+        self.buf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def string(self, i):
+        """字符串表中的第i个, NONE为None"""
+        if i == NONE:
+            return None
+        return str(self.strings[self.string_offsets[i] : self.string_offsets[i + 1]], "utf-8")
+
+    def name(self, i):
+        """第i个节点的名字"""
+        return self.string(self.names[i])
+
+    def oid(self, i):
+        """第i个节点的OID"""
+        return tuple(self.oids[self.oid_offsets[i] : self.oid_offsets[i + 1]])
+
+    def find(self, oid):
+        """OID为oid的节点下标, 没有时返回-1"""
+        oid = tuple(oid)
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.oid(mid) < oid:
+                low = mid + 1
+            else:
+                high = mid
+        return low if low < self.count and self.oid(low) == oid else -1
+
+    def resolve(self, oid):
+        """最长前缀匹配, 返回(节点下标, 剩下的实例部分), 都不匹配时返回(-1, oid)"""
+        oid = tuple(oid)
+        for length in range(len(oid), 0, -1):
+            i = self.find(oid[:length])
+            if i >= 0:
+                return i, oid[length:]
+        return -1, oid
+
+    def lookup(self, name):
+        """名字为name的节点下标, 没有时返回-1"""
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.name(self.by_name[mid]) < name:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.count and self.name(self.by_name[low]) == name:
+            return self.by_name[low]
+        return -1
+
+    def strings_at(self, values, offsets, i):
+        """列表字段第i个节点的字符串, 没有时为None"""
+        items = values[offsets[i] : offsets[i + 1]]
+        return tuple(map(self.string, items)) or None
+
+    def node(self, i):
+        """第i个节点的MibNode, kids为空"""
+        oid = self.oid(i)
+        enums = None
+        start, end = self.enum_offsets[i], self.enum_offsets[i + 1]
+        if end > start:
+            names = map(self.string, self.enum_names[start:end])
+            enums = tuple(zip(names, self.enum_values[start:end]))
+        return MibNode(
+            name=self.name(i),
+            oid=oid,
+            parent=oid[:-1],
+            parent_name=self.string(self.parent_names[i]),
+            subId=oid[-1],
+            type=TYPES[self.types[i]],
+            syntax=self.string(self.syntaxes[i]),
+            access=self.string(self.accesses[i]),
+            bounds=self.string(self.bounds[i]),
+            enums=enums,
+            units=self.string(self.units[i]),
+            index=self.strings_at(self.indexes, self.index_offsets, i),
+            syn_seq_of=self.string(self.syn_seq_ofs[i]),
+            objects=self.strings_at(self.objects, self.object_offsets, i),
+        )
@@ -0,0 +1,420 @@
+import re
+
+# 按顺序尝试, 第一个匹配的分组就是token的类型
+TOKEN = re.compile(
+    r"(?P<ws>\s+)"
+    r"|(?P<comment>--.*)"
+    r'|(?P<string>"[^"]*")'
+    r'|(?P<open_string>")'
+    r"|(?P<assign>::=)"
+    r"|(?P<range>\.\.)"
+    r"|(?P<number>\d+)"
+    r"|(?P<ident>[A-Za-z-][A-Za-z0-9-]*)"
+    r"|(?P<punct>[{}()\[\],;|.])"
+    r"|(?P<error>.)"
+)
+
+
+class SmiSyntaxError(Exception):
+    """快速解析引擎的语法错误"""
+
+    def __init__(self, msg, line, col):
+        super().__init__(f"{msg} (line:{line}, col:{col})")
+        self.msg = msg
+        self.lineno = line
+        self.col = col
+
+    def __reduce__(self):
+        # 从工作进程传回时按原来的参数重建
+        return type(self), (self.msg, self.lineno, self.col)
+
+
+def tokenize(source, first_line=1):
+    """把MIB文本切成(kind, text, line, col)
+
+    source可以是字符串, 也可以是按行迭代的对象(比如打开的文件),
+    字符串token的text不包含引号, 可以跨行. source是从文件中间截取的一段时,
+    first_line是它第一行的行号
+    """
+    if isinstance(source, str):
+        source = source.splitlines(keepends=True)
+    pending = None
+    lineno = first_line - 1
+    for lineno, line in enumerate(source, first_line):
+        pos = 0
+        if pending is not None:
+            end = line.find('"')
+            if end < 0:
+                pending[0].append(line)
+                continue
+            pending[0].append(line[:end])
+            yield ("string", "".join(pending[0]), pending[1], pending[2])
+            pending = None
+            pos = end + 1
+        while pos < len(line):
+            match = TOKEN.match(line, pos)
+            kind = match.lastgroup
+            if kind == "open_string":
+                pending = ([line[pos + 1 :]], lineno, pos + 1)
+                break
+            if kind == "string":
+                yield (kind, match.group()[1:-1], lineno, pos + 1)
+            elif kind not in ("ws", "comment"):
+                yield (kind, match.group(), lineno, pos + 1)
+            pos = match.end()
+    if pending is not None:
+        raise SmiSyntaxError("unterminated string", pending[1], pending[2])
+    yield ("eof", "", lineno + 1, 1)
+
+
+class FastSmiParser:
+    """基于tokenize的递归下降解析器
+
+    和pyparsing的语法支持相同的子集, 解析出的节点交给ctx,
+    所以生成的node_list/node_dict/name_oid和pyparsing引擎一样
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.tokens = None
+        self.tok = None
+
+    def parse_file(self, fname):
+        """解析文件"""
+        with open(fname, encoding="utf-8") as f:
+            self.parse(f)
+
+    def parse(self, source, first_line=1):
+        """解析字符串或者按行迭代的对象, first_line见tokenize"""
+        self.tokens = tokenize(source, first_line)
+        self.tok = next(self.tokens)
+        self.module_def()
+
+    def parse_chunk(self, source, first_line=1, header=False):
+        """解析ModuleSpan.chunks切出来的一段顶层定义, header为True时这一段从模块头开始"""
+        self.tokens = tokenize(source, first_line)
+        self.tok = next(self.tokens)
+        if header:
+            self.module_header()
+        while self.tok[0] != "eof":
+            self.module_item()
+
+    def advance(self):
+        """返回当前token并前进一个"""
+        tok = self.tok
+        self.tok = next(self.tokens)
+        return tok
+
+    def error(self, expected):
+        """在当前位置报错"""
+        kind, text, line, col = self.tok
+        found = text if kind != "eof" else "end of text"
+        raise SmiSyntaxError(f"Expected {expected}, found {found!r}", line, col)
+
+    def peek(self, text):
+        """当前token是否为text"""
+        return self.tok[1] == text and self.tok[0] != "string"
+
+    def accept(self, text):
+        """当前token为text时前进并返回True"""
+        if self.peek(text):
+            self.advance()
+            return True
+        return False
+
+    def expect(self, text):
+        """当前token必须为text"""
+        if not self.peek(text):
+            self.error(repr(text))
+        return self.advance()
+
+    def expect_kind(self, kind):
+        """当前token必须为kind类型, 返回它的text"""
+        if self.tok[0] != kind:
+            self.error(kind)
+        return self.advance()[1]
+
+    def identifier_list(self):
+        """a, b, c"""
+        items = [self.expect_kind("ident")]
+        while self.accept(","):
+            items.append(self.expect_kind("ident"))
+        return items
+
+    def raw_until(self, close):
+        """取到close为止的原文(不跨行), 用于范围 (0..100)"""
+        parts = []
+        prev = None
+        while not self.peek(close):
+            if self.tok[0] == "eof" or (prev and self.tok[2] != prev[2]):
+                self.error(repr(close))
+            kind, text, line, col = self.advance()
+            if prev is not None:
+                parts.append(" " * (col - prev[3] - len(prev[1])))
+            parts.append(text)
+            prev = (kind, text, line, col)
+        self.advance()
+        return "".join(parts)
+
+    def module_header(self):
+        """X-MIB DEFINITIONS ::= BEGIN, 返回模块名"""
+        name = self.expect_kind("ident")
+        self.expect("DEFINITIONS")
+        self.expect("::=")
+        self.expect("BEGIN")
+        return name
+
+    def header(self):
+        """模块头和紧跟着的IMPORTS, 返回(模块名, 导入)"""
+        name = self.module_header()
+        imports = {}
+        if self.accept("IMPORTS"):
+            imports = self.imports_def()
+        return name, imports
+
+    def parse_item(self, tokens):
+        """解析split_definitions切出来的一个顶层定义"""
+        self.tokens = iter(tokens + [("eof", "", tokens[-1][2] + 1, 1)])
+        self.tok = next(self.tokens)
+        self.module_item()
+        if self.tok[0] != "eof":
+            self.error("end of definition")
+
+    def module_def(self):
+        """X-MIB DEFINITIONS ::= BEGIN ... END"""
+        self.header()
+        while not self.peek("END"):
+            self.module_item()
+        self.advance()
+
+    def module_item(self):
+        """按第二个token分派"""
+        if self.accept("IMPORTS"):
+            self.imports_def()
+            return
+        name = self.expect_kind("ident")
+        if self.accept("MODULE-IDENTITY"):
+            self.identity_def(name)
+        elif self.accept("OBJECT"):
+            self.expect("IDENTIFIER")
+            self.expect("::=")
+            self.ctx.add_object_identifier(self.assignment({"name": name}))
+        elif self.accept("OBJECT-TYPE"):
+            self.object_type(name)
+        elif self.accept("NOTIFICATION-TYPE"):
+            self.notify_type(name)
+        elif self.accept("::="):
+            if self.accept("SEQUENCE"):
+                self.expect("{")
+                while not self.accept("}"):
+                    if self.advance()[0] == "eof":
+                        self.error("'}'")
+            elif self.accept("TEXTUAL-CONVENTION"):
+                self.textual_convention(name)
+            else:
+                node = {"name": name}
+                self.syntax_value(node)
+                self.ctx.add_textual_convention(node)
+        else:
+            self.error("'END'")
+
+    def imports_def(self):
+        """IMPORTS a, b FROM X-MIB c FROM Y-MIB; 返回{模块: [符号]}"""
+        imports = {}
+        while not self.accept(";"):
+            symbols = self.identifier_list()
+            self.expect("FROM")
+            imports.setdefault(self.expect_kind("ident"), []).extend(symbols)
+        return imports
+
+    def assignment(self, node):
+        """{ parent subId }"""
+        self.expect("{")
+        node["parent_name"] = self.expect_kind("ident")
+        node["subId"] = self.expect_kind("number")
+        self.expect("}")
+        return node
+
+    def text(self, keyword):
+        """keyword "text" """
+        self.expect(keyword)
+        return self.expect_kind("string")
+
+    def identity_def(self, name):
+        """MODULE-IDENTITY"""
+        for keyword in ("LAST-UPDATED", "ORGANIZATION", "CONTACT-INFO", "DESCRIPTION"):
+            self.text(keyword)
+        while self.peek("REVISION"):
+            self.text("REVISION")
+            self.text("DESCRIPTION")
+        self.expect("::=")
+        self.ctx.add_identity(self.assignment({"name": name}))
+
+    def size_bounds(self, node):
+        """SIZE (0..255)), 左括号已经读过"""
+        self.expect("SIZE")
+        self.expect("(")
+        node["bounds"] = self.raw_until(")")
+        self.expect(")")
+
+    def syntax_opts(self, node):
+        """枚举, SIZE或者范围"""
+        if self.accept("{"):
+            enums = []
+            while True:
+                label = self.expect_kind("ident")
+                self.expect("(")
+                enums.append((label, int(self.expect_kind("number"))))
+                self.expect(")")
+                if not self.accept(","):
+                    break
+            self.expect("}")
+            node["enums"] = enums
+        elif self.accept("("):
+            if self.peek("SIZE"):
+                self.size_bounds(node)
+            else:
+                node["bounds"] = self.raw_until(")")
+
+    def syntax(self, node):
+        """SYNTAX ..."""
+        self.expect("SYNTAX")
+        self.syntax_value(node)
+
+    def syntax_value(self, node):
+        """SYNTAX后面的类型"""
+        if self.accept("OBJECT"):
+            self.expect("IDENTIFIER")
+            node["syntax"] = "OBJECT"
+        elif self.peek("OCTET"):
+            node["syntax"] = self.advance()[1]
+            self.expect("STRING")
+            if self.accept("("):
+                self.size_bounds(node)
+        elif self.accept("SEQUENCE"):
+            self.expect("OF")
+            node["syn_seq_of"] = self.expect_kind("ident")
+        else:
+            node["syntax"] = self.expect_kind("ident")
+            self.syntax_opts(node)
+
+    def access(self, node):
+        """MAX-ACCESS/ACCESS"""
+        if not (self.accept("MAX-ACCESS") or self.accept("ACCESS")):
+            self.error("'MAX-ACCESS' or 'ACCESS'")
+        node["access"] = self.expect_kind("ident")
+
+    def object_type(self, name):
+        """OBJECT-TYPE"""
+        node = {"name": name}
+        self.syntax(node)
+        if self.peek("UNITS"):
+            node["units"] = self.text("UNITS")
+        self.access(node)
+        self.expect("STATUS")
+        self.expect_kind("ident")
+        if self.peek("DESCRIPTION"):
+            self.text("DESCRIPTION")
+        if self.peek("REFERENCE"):
+            self.text("REFERENCE")
+        if self.accept("INDEX"):
+            self.expect("{")
+            node["index"] = self.identifier_list()
+            self.expect("}")
+        self.expect("::=")
+        self.ctx.add_object_type(self.assignment(node))
+
+    def textual_convention(self, name):
+        """TEXTUAL-CONVENTION"""
+        if self.peek("DISPLAY-HINT"):
+            self.text("DISPLAY-HINT")
+        self.expect("STATUS")
+        self.expect_kind("ident")
+        self.text("DESCRIPTION")
+        if self.peek("REFERENCE"):
+            self.text("REFERENCE")
+        node = {"name": name}
+        self.syntax(node)
+        self.ctx.add_textual_convention(node)
+
+    def notify_type(self, name):
+        """NOTIFICATION-TYPE"""
+        node = {"name": name}
+        self.expect("OBJECTS")
+        self.expect("{")
+        node["objects"] = self.identifier_list()
+        self.expect("}")
+        if self.peek("MAX-ACCESS") or self.peek("ACCESS"):
+            self.access(node)
+        self.expect("STATUS")
+        self.expect_kind("ident")
+        if self.peek("DESCRIPTION"):
+            self.text("DESCRIPTION")
+        self.expect("::=")
+        self.ctx.add_notify_type(self.assignment(node))
+
+
+def read_header(source, first_line=1):
+    """只读取模块名和IMPORTS, 不解析模块的其余部分"""
+    parser = FastSmiParser(None)
+    parser.tokens = tokenize(source, first_line)
+    parser.tok = next(parser.tokens)
+    return parser.header()
+
+
+# 跟在名字后面时表示一个顶层定义的开始
+DEFINITION_KEYWORDS = ("MODULE-IDENTITY", "OBJECT-TYPE", "NOTIFICATION-TYPE")
+
+
+def is_definition_start(tokens, i):
+    """tokens[i]是否是一个顶层定义的开始"""
+    if tokens[i][0] != "ident":
+        return False
+    if tokens[i][1] == "IMPORTS":
+        return True
+    following = [tok[1] for tok in tokens[i + 1 : i + 4]]
+    if following[0] in DEFINITION_KEYWORDS:
+        return True
+    # 类型定义 X ::= SEQUENCE/TEXTUAL-CONVENTION/INTEGER..., 而
+    # STATUS current ::= { ... } 里的 current 后面是 ::= {
+    if following[0] == "::=" and tokens[i + 2][0] == "ident":
+        return True
+    return following == ["OBJECT", "IDENTIFIER", "::="]
+
+
+def split_definitions(source):
+    """把模块切成顶层定义, 只看token不解析
+
+    返回(header, items): header是 X-MIB DEFINITIONS ::= BEGIN 这几个token,
+    items是每个顶层定义(包括IMPORTS)的token列表, 不包含结尾的END
+    """
+    tokens = list(tokenize(source))
+    parser = FastSmiParser(None)
+    parser.tokens = iter(tokens)
+    parser.tok = next(parser.tokens)
+    parser.module_header()
+    start = 4
+    items = []
+    depth = 0
+    in_imports = False
+    for i in range(start, len(tokens)):
+        kind, text, line, col = tokens[i]
+        if kind == "eof":
+            raise SmiSyntaxError("Expected 'END'", line, col)
+        if depth == 0 and not in_imports:
+            if kind == "ident" and text == "END":
+                break
+            if is_definition_start(tokens, i):
+                items.append([])
+                in_imports = text == "IMPORTS"
+            elif not items:
+                raise SmiSyntaxError(f"unexpected {text!r}", line, col)
+        items[-1].append(tokens[i])
+        if kind == "punct":
+            if text == "{":
+                depth += 1
+            elif text == "}":
+                depth -= 1
+            elif text == ";":
+                in_imports = False
+    return tokens[:start], items
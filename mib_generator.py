@@ -1,81 +1,51 @@
+import io
+import marshal
 import os
 
+import mib_templates as tpl
+from mib_io import write_file
+from mib_types import resolve_syntax, syntax_type
+
+
+def output_name(fname):
+    """MIB文件或者模块名对应的生成文件名, 不包括.c/.h"""
+    return os.path.basename(fname).split(".")[0].replace("-", "_")
+
 
 class MibGenerator:
-    """生成C程序"""
+    """生成C程序
+
+    fragments是上一次生成时的new_fragments, 传入后子树没有变化的
+    scalar/table/notification等直接复用上次生成的代码.
+    dispatch_threshold: 成员数不少于它的scalar array用查表代替switch, 0表示不使用.
+    row_storage: 表格生成静态的行存储, 每个表格最多这么多行, 0表示不使用.
+    trap_queue: 生成能放这么多个notification的发送队列, 0表示不使用, 最多MAX_TRAP_QUEUE
+    """
 
-    def __init__(self, nodelist, nodedict, nameoid, fname):
+    def __init__(
+        self,
+        nodelist,
+        nodedict,
+        nameoid,
+        fname,
+        fragments=None,
+        dispatch_threshold=0,
+        row_storage=0,
+        trap_queue=0,
+    ):
+        if not 0 <= trap_queue <= MAX_TRAP_QUEUE:
+            raise ValueError(f"trap queue size must be between 0 and {MAX_TRAP_QUEUE}")
         self.node_list = nodelist
         self.node_dict = nodedict
         self.name_oid = nameoid
-        self.syntax_dict = {
-            "integer": "SNMP_ASN1_TYPE_INTEGER",
-            "integer32": "SNMP_ASN1_TYPE_INTEGER",
-            "unsigned32": "SNMP_ASN1_TYPE_UNSIGNED32",
-            "octet": "SNMP_ASN1_TYPE_OCTET_STRING",
-            "displaystring": "SNMP_ASN1_TYPE_OCTET_STRING",
-            "object": "SNMP_ASN1_TYPE_OBJECT_ID",
-            "timeticks": "SNMP_ASN1_TYPE_TIMETICKS",
-            "bits": "SNMP_ASN1_TYPE_UNSIGNED32",
-            "gauge": "SNMP_ASN1_TYPE_GAUGE",
-            "gauge32": "SNMP_ASN1_TYPE_GAUGE",
-            "counter": "SNMP_ASN1_TYPE_COUNTER",
-            "counter32": "SNMP_ASN1_TYPE_COUNTER",
-            "ipaddress": "SNMP_ASN1_TYPE_IPADDRESS",
-            "physaddress": "SNMP_ASN1_TYPE_OCTET_STRING",
-            "networkaddress": "SNMP_ASN1_TYPE_IPADDRESS",
-        }
-        self.syntax_ctype_dict = {
-            "integer": "s32_t",
-            "integer32": "s32_t",
-            "unsigned32": "u32_t",
-            "octet": "const char*",
-            "displaystring": "const char*",
-            "object": "u32_t",
-            "timeticks": "u32_t",
-            "bits": "u32_t",
-            "gauge": "u32_t",
-            "gauge32": "u32_t",
-            "counter": "u32_t",
-            "counter32": "u32_t",
-            "ipaddress": "const char*",
-            "physaddress": "const char*",
-            "networkaddress": "const char*",
-        }
-        self.syntax_variant_value_type_dict = {
-            "integer": "s32",
-            "integer32": "s32",
-            "unsigned32": "u32",
-            "octet": "const_ptr",
-            "displaystring": "const_ptr",
-            "object": "u32",
-            "timeticks": "u32",
-            "bits": "u32",
-            "gauge": "u32",
-            "gauge32": "u32",
-            "counter": "u32",
-            "counter32": "u32",
-            "ipaddress": "const_ptr",
-            "physaddress": "const_ptr",
-            "networkaddress": "const_ptr",
-        }
-        self.datatype_dict = {
-            "integer": "SNMP_VARIANT_VALUE_TYPE_S32",
-            "integer32": "SNMP_VARIANT_VALUE_TYPE_S32",
-            "unsigned32": "SNMP_VARIANT_VALUE_TYPE_U32",
-            "octet": "SNMP_VARIANT_VALUE_TYPE_CONST_PTR",
-            "displaystring": "SNMP_VARIANT_VALUE_TYPE_CONST_PTR",
-            "object": "SNMP_VARIANT_VALUE_TYPE_U32",
-            "timeticks": "SNMP_VARIANT_VALUE_TYPE_U32",
-            "bits": "SNMP_VARIANT_VALUE_TYPE_U32",
-            "gauge": "SNMP_VARIANT_VALUE_TYPE_U32",
-            "gauge32": "SNMP_VARIANT_VALUE_TYPE_U32",
-            "counter": "SNMP_VARIANT_VALUE_TYPE_U32",
-            "counter32": "SNMP_VARIANT_VALUE_TYPE_U32",
-            "ipaddress": "SNMP_VARIANT_VALUE_TYPE_U32",
-            "physaddress": "SNMP_VARIANT_VALUE_TYPE_U32",
-            "networkaddress": "SNMP_VARIANT_VALUE_TYPE_U32",
-        }
+        self.fragments = fragments
+        self.dispatch_threshold = dispatch_threshold
+        self.row_storage = row_storage
+        self.trap_queue = trap_queue
+        # 生成了send_trap_*的notification, 用于生成发送队列
+        self.notifications = []
+        self.new_fragments = {}
+        self.fragment_hits = 0
         self.access_dict = {
             "read-only": "SNMP_NODE_INSTANCE_READ_ONLY",
             "read-write": "SNMP_NODE_INSTANCE_READ_WRITE",
@@ -83,44 +53,42 @@ class MibGenerator:
             "not-access": "SNMP_NODE_INSTANCE_NOT_ACCESSIBLE",
         }
 
-        (_, fname) = os.path.split(fname)
-        self.fname = fname.split(".")[0].replace("-", "_")
+        self.fname = output_name(fname)
         self.out_fname_c = self.fname + ".c"
         self.out_fname_h = self.fname + ".h"
-        self.out_file_c = open(self.out_fname_c, "w", encoding="utf-8")
-        self.out_file_h = open(self.out_fname_h, "w", encoding="utf-8")
+        # 先生成到内存里, 全部完成后再一次写入文件
+        self.out_file_c = io.StringIO()
+        self.out_file_h = io.StringIO()
         self.node_extern = []
         self.func_extern = []
         self.struct_declare = []
+        # NodeContext/SyntaxContext, 每个节点和每种类型只计算一次
+        self.contexts = {}
+        self.syntaxes = {}
+        self.kid_lists = {}
         self.out_file_c.write(f'#include "{self.out_fname_h}"\n\n')
 
+    def get_type(self, node):
+        """node的SyntaxType, 解析后已经附加在节点上, 没有时现查"""
+        if node.type_info is not None:
+            return node.type_info
+        return resolve_syntax(node["syntax"])
+
     def get_syntax_type(self, node):
         """获取syntax类型"""
-        dt = node["syntax"].lower()
-        if dt in self.syntax_dict:
-            return self.syntax_dict[dt]
-        return "SNMP_ASN1_TYPE_INTEGER"
+        return self.get_type(node).asn1_type
 
     def get_ctype(self, node):
         """获取c类型"""
-        dt = node["syntax"].lower()
-        if dt in self.syntax_ctype_dict:
-            return self.syntax_ctype_dict[dt]
-        return "u32_t"
+        return self.get_type(node).ctype
 
     def get_variant_value_type(self, node):
         """获取snmp_variant_value类型"""
-        dt = node["syntax"].lower()
-        if dt in self.syntax_variant_value_type_dict:
-            return self.syntax_variant_value_type_dict[dt]
-        return "u32"
+        return self.get_type(node).variant
 
     def get_data_type(self, node):
         """获取datatype table"""
-        dt = node["syntax"].lower()
-        if dt in self.datatype_dict:
-            return self.datatype_dict[dt]
-        return "SNMP_VARIANT_VALUE_TYPE_U32"
+        return self.get_type(node).data_type
 
     def get_access(self, node):
         """获取权限"""
@@ -131,22 +99,11 @@ class MibGenerator:
 
     def get_enums_str(self, node):
         """返回所有枚举"""
-        enums_dict = {}
-        enums_str = ""
-        enums_list = node["enums"]
-        for i in range(1, len(enums_list), 2):
-            enums_dict[int(enums_list[i])] = enums_list[i - 1]
-            enums_str = enums_str + enums_list[i] + ":" + enums_list[i - 1] + " "
-        enums_str = enums_str[:-1]
-        return enums_str
+        return " ".join(f"{value}:{label}" for label, value in node["enums"])
 
     def get_enums_dict(self, node):
         """返回字典"""
-        enums_dict = {}
-        enums_list = node["enums"]
-        for i in range(1, len(enums_list), 2):
-            enums_dict[int(enums_list[i])] = enums_list[i - 1]
-        return enums_dict
+        return {value: label for label, value in node["enums"]}
 
     def get_bounds(self, node):
         """获取取值范围"""
@@ -166,510 +123,295 @@ class MibGenerator:
                 bounds.append(mi)
         return bounds
 
+    def context(self, node):
+        """node的NodeContext, 每个节点只计算一次"""
+        ctx = self.contexts.get(node.oid)
+        if ctx is None:
+            syntax = self.get_type(node) if node.syntax is not None else None
+            key = (syntax, node.access, node.bounds, node.enums)
+            if key not in self.syntaxes:
+                self.syntaxes[key] = SyntaxContext(self, node)
+            ctx = NodeContext(node, self.syntaxes[key])
+            self.contexts[node.oid] = ctx
+        return ctx
+
+    def kid_contexts(self, node):
+        """node所有子节点的NodeContext"""
+        kids = self.kid_lists.get(node.oid)
+        if kids is None:
+            kids = [self.context(kid) for kid in node.kids]
+            self.kid_lists[node.oid] = kids
+        return kids
+
+    def write_function(self, signature, parts):
+        """写入函数定义并加入extern声明"""
+        self.func_extern.append(signature + ";\n")
+        parts.insert(0, signature)
+        self.out_file_c.write("".join(parts))
+
     def generate_scalar_array_get_method(self, node):
         """生成scalar_array_get_method"""
-        f = self.out_file_c
-        self.func_extern.append(
-            f"s16_t {node['name']}_get_value(const struct snmp_scalar_array_node_def *scalar, "
-            "void *value);\n"
-        )
-        f.write(
-            f"s16_t {node['name']}_get_value(const struct snmp_scalar_array_node_def *scalar, "
-            "void *value)\n"
-            "{\n"
-            "    switch (scalar->oid) {\n"
-        )
-        for kid in node["kids"]:
-            f.write(f"    case {kid[2]}: // {kid[0]}\n")
-            if "enums" in self.node_dict[kid[3]]:
-                f.write(f"        // {self.get_enums_str(self.node_dict[kid[3]])}\n")
-            ct = self.get_ctype(self.node_dict[kid[3]])
-            if ct == self.syntax_ctype_dict["octet"]:
-                f.write('        return sprintf((char*)value, "abcdef");\n')
+        c = self.context(node)
+        parts = [tpl.SWITCH_SCALAR]
+        for kid in self.kid_contexts(node):
+            parts.append(tpl.CASE(c=kid))
+            if kid.syntax.enums is not None:
+                parts.append(tpl.ENUMS(c=kid))
+            parts.append(tpl.GET_STRING if kid.syntax.octet else tpl.GET_NUMBER(c=kid))
+        parts.append("    default:\n        return 0;\n    }\n}\n\n")
+        self.write_function(tpl.SCALAR_ARRAY_GET(c=c), parts)
+
+    def switch_set_test(self, kids, parts):
+        """scalar array和table的set_test中每一列的检查"""
+        for kid in kids:
+            if not kid.syntax.writable:
+                continue
+            if kid.syntax.check is None:
+                parts.append(tpl.CASE_BREAK(c=kid))
             else:
-                f.write(
-                    f"        *({ct} *)value = {kid[2]};\n"
-                    f"        return sizeof(*({ct} *)value);\n"
-                )
-        f.write("    default:\n")
-        f.write("        return 0;\n")
-        f.write("    }\n")
-        f.write("}\n\n")
+                parts.append(tpl.CASE(c=kid))
+                parts.append(tpl.CHECK(c=kid))
+
+    def switch_set_value(self, kids, parts, end):
+        """scalar array和table的set_value中每一列的赋值"""
+        for kid in kids:
+            if kid.syntax.writable:
+                parts.append(tpl.CASE(c=kid))
+                parts.append(tpl.SET_BODY(c=kid))
+                parts.append(end)
 
     def generate_scalar_array_test_method(self, node):
         """生成scalar_array_test_method"""
-        f = self.out_file_c
-        self.func_extern.append(
-            f"snmp_err_t {node['name']}_set_test(const struct snmp_scalar_array_node_def *scalar, "
-            "u16_t len, void *value);\n"
+        parts = [tpl.SWITCH_SCALAR]
+        self.switch_set_test(self.kid_contexts(node), parts)
+        parts.append(
+            "    default: return SNMP_ERR_NOSUCHINSTANCE;\n    }\n"
+            "    return SNMP_ERR_NOERROR;\n}\n\n"
         )
-        f.write(
-            f"snmp_err_t {node['name']}_set_test(const struct snmp_scalar_array_node_def *scalar, "
-            "u16_t len, void *value)\n"
-            "{\n"
-            "    switch (scalar->oid) {\n"
-        )
-        for kid in node["kids"]:
-            kid_node = self.node_dict[kid[3]]
-            if kid_node["access"] not in ["read-write", "write-only"]:
-                continue
-            bound = self.get_bounds(kid_node)
-            ct = self.get_ctype(kid_node)
-            if len(bound) == 1:
-                f.write(f"    case {kid[2]}: // {kid[0]}\n")
-                if ct == self.syntax_ctype_dict["octet"]:
-                    f.write(f"        if (len != {bound[0]})\n")
-                else:
-                    f.write(f"        if (*({ct} *)value != {bound[0]})\n")
-                f.write("            return SNMP_ERR_WRONGVALUE;\n        break;\n")
-            elif len(bound) == 2:
-                f.write(f"    case {kid[2]}: // {kid[0]}\n")
-                if ct == self.syntax_ctype_dict["octet"]:
-                    f.write(f"        if (len < {bound[0]} || len > {bound[1]})\n")
-                else:
-                    f.write(
-                        f"        if (*({ct} *)value < {bound[0]} || *({ct} *)value > {bound[1]})\n"
-                    )
-                f.write("            return SNMP_ERR_WRONGVALUE;\n        break;\n")
-            else:
-                f.write(f"    case {kid[2]}: break; // {kid[0]}\n")
-        f.write("    default: return SNMP_ERR_NOSUCHINSTANCE;\n")
-        f.write("    }\n")
-        f.write("    return SNMP_ERR_NOERROR;\n")
-        f.write("}\n\n")
+        self.write_function(tpl.SCALAR_ARRAY_TEST(c=self.context(node)), parts)
 
     def generate_scalar_array_set_method(self, node):
         """生成scalar_array_set_method"""
-        f = self.out_file_c
-        self.func_extern.append(
-            f"snmp_err_t {node['name']}_set_value(const struct snmp_scalar_array_node_def *scalar, "
-            "u16_t len, void *value);\n"
+        parts = [tpl.SWITCH_SCALAR]
+        self.switch_set_value(self.kid_contexts(node), parts, "        break;\n")
+        parts.append(
+            "    default: return SNMP_ERR_NOSUCHINSTANCE;\n    }\n"
+            "    return SNMP_ERR_NOERROR;\n}\n\n"
         )
-        f.write(
-            f"snmp_err_t {node['name']}_set_value(const struct snmp_scalar_array_node_def *scalar, "
-            "u16_t len, void *value)\n"
-            "{\n"
-            "    switch (scalar->oid) {\n"
-        )
-        for kid in node["kids"]:
-            kid_node = self.node_dict[kid[3]]
-            if kid_node["access"] in ["read-write", "write-only"]:
-                f.write(f"    case {kid[2]}: // {kid[0]}\n")
-                ct = self.get_ctype(kid_node)
-                if ct == self.syntax_ctype_dict["octet"]:
-                    f.write("        // (char *)value;\n")
+        self.write_function(tpl.SCALAR_ARRAY_SET(c=self.context(node)), parts)
+
+    def max_index(self, node):
+        """表格的最大行号, 即索引列取值范围的上限"""
+        return self.get_bounds(self.node_dict[node["kids"][0][3]])[-1]
+
+    def switch_variant(self, kids, parts):
+        """simple table中每一列的snmp_variant_value"""
+        for i, kid in enumerate(kids):
+            parts.append(tpl.CASE(c=kid))
+            if i == 0:
+                parts.append(tpl.VARIANT_INDEX(c=kid))
+            else:
+                if kid.syntax.enums is not None:
+                    parts.append(tpl.ENUMS(c=kid))
+                if kid.syntax.variant == "const_ptr":
+                    parts.append(tpl.VARIANT_STRING(c=kid))
                 else:
-                    f.write(f"        // *({ct} *)value;\n")
-                f.write("        break;\n")
-        f.write("    default: return SNMP_ERR_NOSUCHINSTANCE;\n")
-        f.write("    }\n")
-        f.write("    return SNMP_ERR_NOERROR;\n")
-        f.write("}\n\n")
+                    parts.append(tpl.VARIANT_VALUE(c=kid))
+            parts.append(tpl.VARIANT_LEN(c=kid))
 
     def generate_table_get_cell_value_method(self, node):
         """生成table_get_cell_value_method"""
-        self.func_extern.append(
-            f"snmp_err_t {node['parent_name']}_get_cell_value(const u32_t *column, "
-            "const u32_t *row_oid, u8_t row_oid_len, union snmp_variant_value *value, "
-            "u32_t *value_len);\n"
-        )
-        f = self.out_file_c
-        entry_node_index = self.node_dict[node["kids"][0][3]]
-        bounds = self.get_bounds(entry_node_index)
-        f.write(
-            f"snmp_err_t {node['parent_name']}_get_cell_value(const u32_t *column, "
-            "const u32_t *row_oid, u8_t row_oid_len, union snmp_variant_value *value, "
-            "u32_t *value_len)\n"
-            "{\n"
-            "    u32_t index = 1;\n\n"
-            "    if (row_oid_len != 1)\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n"
-            "    index = row_oid[0];\n"
-            f"    if (index > {bounds[-1]})\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n\n"
+        parts = [tpl.SIMPLE_TABLE_CHECK_ROW(max_index=self.max_index(node))]
+        self.switch_variant(self.kid_contexts(node), parts)
+        parts.append(
+            "    default:\n        break;\n    }\n    return SNMP_ERR_NOERROR;\n}\n\n"
         )
-        f.write("    switch (*column) {\n")
-        for i, kid in enumerate(node["kids"]):
-            f.write(f"    case {kid[2]}: // {kid[0]}\n")
-            snmp_variant_value = self.get_variant_value_type(self.node_dict[kid[3]])
-            if i == 0:
-                f.write(f"        value->{snmp_variant_value} = index;\n")
-            else:
-                if "enums" in self.node_dict[kid[3]]:
-                    f.write(
-                        f"        // {self.get_enums_str(self.node_dict[kid[3]])}\n"
-                    )
-                kid_name = '"' + kid[0] + '"'
-                f.write(
-                    f"        value->{snmp_variant_value} = "
-                    f"{kid_name if snmp_variant_value == 'const_ptr'  else '*column'};\n"
-                )
-            f.write(
-                f"        *value_len = "
-                f"{'strlen' if snmp_variant_value == 'const_ptr'  else 'sizeof'}"
-                f"(value->{snmp_variant_value});\n"
-            )
-            f.write("        break;\n")
-        f.write("    default:\n")
-        f.write("        break;\n")
-        f.write("    }\n")
-        f.write("    return SNMP_ERR_NOERROR;\n")
-        f.write("}\n\n")
+        self.write_function(tpl.TABLE_GET_CELL_VALUE(c=self.context(node)), parts)
 
     def generate_table_get_next_cell_instance_and_value_method(self, node):
         """生成table_get_next_cell_instance_and_value_method"""
-        self.func_extern.append(
-            f"snmp_err_t {node['parent_name']}_get_next_cell_instance_and_value("
-            "const u32_t *column, struct snmp_obj_id *row_oid, "
-            "union snmp_variant_value *value, u32_t *value_len);\n"
-        )
-        f = self.out_file_c
-        entry_node_index = self.node_dict[node["kids"][0][3]]
-        bounds = self.get_bounds(entry_node_index)
-        f.write(
-            f"snmp_err_t {node['parent_name']}_get_next_cell_instance_and_value("
-            "const u32_t *column, struct snmp_obj_id *row_oid, "
-            "union snmp_variant_value *value, u32_t *value_len)\n"
-            "{\n"
-            "    if (row_oid->len == 0) {\n"
-            "        u32_t oid_arr[] = {1};\n"
-            "        snmp_oid_assign(row_oid, oid_arr, 1);\n"
-            "    } else if (row_oid->len > 1) {\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n"
-            "    } else {\n"
-            "        row_oid->id[0]++;\n"
-            "    }\n\n"
-            "    u32_t index = row_oid->id[0];\n"
-            f"    if (index > {bounds[-1]})\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n\n"
+        parts = [
+            tpl.NEXT_ROW(max_index=self.max_index(node)),
+            "\n    switch (*column) {\n",
+        ]
+        self.switch_variant(self.kid_contexts(node), parts)
+        parts.append(
+            "    default:\n        return SNMP_ERR_NOSUCHINSTANCE;\n    }\n"
+            "    return SNMP_ERR_NOERROR;\n}\n\n"
         )
-        f.write("    switch (*column) {\n")
-        for i, kid in enumerate(node["kids"]):
-            snmp_variant_value = self.get_variant_value_type(self.node_dict[kid[3]])
-            f.write(f"    case {kid[2]}: // {kid[0]}\n")
-            if i == 0:
-                f.write(f"        value->{snmp_variant_value} = index;\n")
-            else:
-                kid_name = '"' + kid[0] + '"'
-                if "enums" in self.node_dict[kid[3]]:
-                    f.write(
-                        f"        // {self.get_enums_str(self.node_dict[kid[3]])}\n"
-                    )
-                f.write(
-                    f"        value->{snmp_variant_value} = "
-                    f"{kid_name if snmp_variant_value == 'const_ptr'  else '*column'};\n"
-                )
-            f.write(
-                f"        *value_len = "
-                f"{'strlen' if snmp_variant_value == 'const_ptr'  else 'sizeof'}"
-                f"(value->{snmp_variant_value});\n"
-            )
-            f.write("        break;\n")
-        f.write("    default:\n")
-        f.write("        return SNMP_ERR_NOSUCHINSTANCE;\n")
-        f.write("    }\n")
-        f.write("    return SNMP_ERR_NOERROR;\n")
-        f.write("}\n\n")
+        signature = tpl.TABLE_GET_NEXT_CELL_INSTANCE_AND_VALUE(c=self.context(node))
+        self.write_function(signature, parts)
 
     def generate_table_get_cell_instance_method(self, node):
         """生成table get_cell_instance函数"""
-        self.func_extern.append(
-            f"snmp_err_t {node['parent_name']}_get_cell_instance(const u32_t *column, "
-            "const u32_t *row_oid, u8_t row_oid_len, struct snmp_node_instance *cell_instance);\n"
-        )
-        f = self.out_file_c
-        entry_node_index = self.node_dict[node["kids"][0][3]]
-        bounds = self.get_bounds(entry_node_index)
-        f.write(
-            f"snmp_err_t {node['parent_name']}_get_cell_instance(const u32_t *column, "
-            "const u32_t *row_oid, u8_t row_oid_len, struct snmp_node_instance *cell_instance)\n"
-            "{\n"
-            "    if (row_oid_len != 1)\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n"
-            "    u32_t index = row_oid[0];\n"
-            f"    if (index > {bounds[-1]})\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n"
-            "    return SNMP_ERR_NOERROR;\n"
-            "}\n\n"
+        self.write_function(
+            tpl.TABLE_GET_CELL_INSTANCE(c=self.context(node)),
+            [tpl.CHECK_ROW(max_index=self.max_index(node))],
         )
 
     def generate_table_get_next_cell_instance_method(self, node):
         """生成table get_next_cell_instance函数"""
-        self.func_extern.append(
-            f"snmp_err_t {node['parent_name']}_get_next_cell_instance(const u32_t *column, "
-            "struct snmp_obj_id *row_oid, struct snmp_node_instance *cell_instance);\n"
-        )
-        f = self.out_file_c
-        entry_node_index = self.node_dict[node["kids"][0][3]]
-        bounds = self.get_bounds(entry_node_index)
-        f.write(
-            f"snmp_err_t {node['parent_name']}_get_next_cell_instance(const u32_t *column, "
-            "struct snmp_obj_id *row_oid, struct snmp_node_instance *cell_instance)\n"
-            "{\n"
-            "    if (row_oid->len == 0) {\n"
-            "        u32_t oid_arr[] = {1};\n"
-            "        snmp_oid_assign(row_oid, oid_arr, 1);\n"
-            "    } else if (row_oid->len > 1) {\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n"
-            "    } else {\n"
-            "        row_oid->id[0]++;\n"
-            "    }\n\n"
-            "    u32_t index = row_oid->id[0];\n"
-            f"    if (index > {bounds[-1]})\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n"
-            "    return SNMP_ERR_NOERROR;\n"
-            "}\n\n"
+        self.write_function(
+            tpl.TABLE_GET_NEXT_CELL_INSTANCE(c=self.context(node)),
+            [
+                tpl.NEXT_ROW(max_index=self.max_index(node)),
+                "    return SNMP_ERR_NOERROR;\n}\n\n",
+            ],
         )
 
     def generate_table_get_value_method(self, node):
         """生成table get_value函数"""
-        self.func_extern.append(
-            f"s16_t {node['parent_name']}_get_value"
-            "(struct snmp_node_instance *instance, void *value);\n"
-        )
-        entry_node_index = self.node_dict[node["kids"][0][3]]
-        bounds = self.get_bounds(entry_node_index)
-        f = self.out_file_c
-        f.write(
-            f"s16_t {node['parent_name']}_get_value"
-            "(struct snmp_node_instance *instance, void *value)\n"
-            "{\n"
-            "    if (instance->instance_oid.len != 3)\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n"
-            "    u32_t column = instance->instance_oid.id[1];\n"
-            "    u32_t index = instance->instance_oid.id[2];\n"
-            f"    if (index > {bounds[-1]})\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n\n"
-            "    switch (column)\n"
-            "    {\n"
-        )
-        for i, kid in enumerate(node["kids"]):
-            f.write(f"    case {kid[2]}: // {kid[0]}\n")
-            ct = self.get_ctype(self.node_dict[kid[3]])
+        parts = [tpl.SWITCH_INSTANCE(max_index=self.max_index(node))]
+        for i, kid in enumerate(self.kid_contexts(node)):
+            parts.append(tpl.CASE(c=kid))
             if i == 0:
-                f.write(f"        *({ct} *)value = index;\n")
-                f.write(f"        return sizeof(*({ct} *)value);\n")
-            else:
-                if "enums" in self.node_dict[kid[3]]:
-                    f.write(
-                        f"        // {self.get_enums_str(self.node_dict[kid[3]])}\n"
-                    )
-                if ct == self.syntax_ctype_dict["octet"]:
-                    f.write('        return sprintf((char*)value, "abcdef");\n')
-                else:
-                    f.write(
-                        f"        *({ct} *)value = {kid[2]};\n"
-                        f"        return sizeof(*({ct} *)value);\n"
-                    )
-        f.write("    default:\n        return 0;\n    }\n}\n\n")
+                parts.append(tpl.GET_INDEX(c=kid))
+                continue
+            if kid.syntax.enums is not None:
+                parts.append(tpl.ENUMS(c=kid))
+            parts.append(tpl.GET_STRING if kid.syntax.octet else tpl.GET_NUMBER(c=kid))
+        parts.append("    default:\n        return 0;\n    }\n}\n\n")
+        self.write_function(tpl.TABLE_GET_VALUE(c=self.context(node)), parts)
 
     def generate_table_set_test_method(self, node):
         """生成table set_test函数"""
-        self.func_extern.append(
-            f"snmp_err_t {node['parent_name']}_set_test"
-            "(struct snmp_node_instance *instance, u16_t len, void *value);\n"
-        )
-        f = self.out_file_c
-        entry_node_index = self.node_dict[node["kids"][0][3]]
-        bounds = self.get_bounds(entry_node_index)
-        f.write(
-            f"snmp_err_t {node['parent_name']}_set_test"
-            "(struct snmp_node_instance *instance, u16_t len, void *value)\n"
-            "{\n"
-            "    if (instance->instance_oid.len != 3)\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n"
-            "    u32_t column = instance->instance_oid.id[1];\n"
-            "    u32_t index = instance->instance_oid.id[2];\n"
-            f"    if (index > {bounds[-1]})\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n\n"
-            "    switch (column)\n"
-            "    {\n"
-        )
-        for kid in node["kids"]:
-            kid_node = self.node_dict[kid[3]]
-            if kid_node["access"] not in ["read-write", "write-only"]:
-                continue
-            bound = self.get_bounds(kid_node)
-            ct = self.get_ctype(kid_node)
-            if len(bound) == 1:
-                f.write(f"    case {kid[2]}: // {kid[0]}\n")
-                if ct == self.syntax_ctype_dict["octet"]:
-                    f.write(f"        if (len != {bound[0]})\n")
-                else:
-                    f.write(f"        if (*({ct} *)value != {bound[0]})\n")
-                f.write("            return SNMP_ERR_WRONGVALUE;\n        break;\n")
-            elif len(bound) == 2:
-                f.write(f"    case {kid[2]}: // {kid[0]}\n")
-                if ct == self.syntax_ctype_dict["octet"]:
-                    f.write(f"        if (len < {bound[0]} || len > {bound[1]})\n")
-                else:
-                    f.write(
-                        f"        if (*({ct} *)value < {bound[0]} || *({ct} *)value > {bound[1]})\n"
-                    )
-                f.write("            return SNMP_ERR_WRONGVALUE;\n        break;\n")
-            else:
-                f.write(f"    case {kid[2]}: break; // {kid[0]}\n")
-        f.write(
-            "    default:\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n"
-            "    }\n"
-            "    return SNMP_ERR_NOERROR;\n"
-            "}\n\n"
+        parts = [tpl.SWITCH_INSTANCE(max_index=self.max_index(node))]
+        self.switch_set_test(self.kid_contexts(node), parts)
+        parts.append(
+            "    default:\n        return SNMP_ERR_NOSUCHINSTANCE;\n    }\n"
+            "    return SNMP_ERR_NOERROR;\n}\n\n"
         )
+        self.write_function(tpl.TABLE_SET_TEST(c=self.context(node)), parts)
 
     def generate_table_set_value_method(self, node):
         """生成table set_value函数"""
-        self.func_extern.append(
-            f"snmp_err_t {node['parent_name']}_set_value"
-            "(struct snmp_node_instance *instance, u16_t len, void *value);\n"
-        )
-        f = self.out_file_c
-        entry_node_index = self.node_dict[node["kids"][0][3]]
-        bounds = self.get_bounds(entry_node_index)
-        f.write(
-            f"snmp_err_t {node['parent_name']}_set_value"
-            "(struct snmp_node_instance *instance, u16_t len, void *value)\n"
-            "{\n"
-            "    if (instance->instance_oid.len != 3)\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n"
-            "    u32_t column = instance->instance_oid.id[1];\n"
-            "    u32_t index = instance->instance_oid.id[2];\n"
-            f"    if (index > {bounds[-1]})\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n\n"
-            "    switch (column)\n"
-            "    {\n"
-        )
-        for kid in node["kids"]:
-            kid_node = self.node_dict[kid[3]]
-            if kid_node["access"] in ["read-write", "write-only"]:
-                f.write(f"    case {kid[2]}: // {kid[0]}\n")
-                ct = self.get_ctype(kid_node)
-                if ct == self.syntax_ctype_dict["octet"]:
-                    f.write("        // (char *)value;\n")
-                else:
-                    f.write(f"        // *({ct} *)value;\n")
-                f.write("        return SNMP_ERR_NOERROR;\n")
-        f.write(
-            "    default:\n"
-            "        return SNMP_ERR_NOSUCHINSTANCE;\n"
-            "    }\n"
-            "}\n\n"
+        parts = [tpl.SWITCH_INSTANCE(max_index=self.max_index(node))]
+        self.switch_set_value(
+            self.kid_contexts(node), parts, "        return SNMP_ERR_NOERROR;\n"
         )
+        parts.append("    default:\n        return SNMP_ERR_NOSUCHINSTANCE;\n    }\n}\n\n")
+        self.write_function(tpl.TABLE_SET_VALUE(c=self.context(node)), parts)
 
     def generate_scalar_get_method(self, node):
         """生成scalar_get_method"""
-        self.func_extern.append(
-            f"s16_t {node['parent_name']}_{node['name']}_get_value("
-            "struct snmp_node_instance *node, void *value);\n"
-        )
-        f = self.out_file_c
-        f.write(
-            f"s16_t {node['parent_name']}_{node['name']}_get_value("
-            "struct snmp_node_instance *node, void *value)\n"
-            "{\n"
-        )
-        if "enums" in node:
-            f.write(f"    // {self.get_enums_str(node)}\n")
-        ct = self.get_ctype(node)
-        if ct == self.syntax_ctype_dict["octet"]:
-            f.write('    return sprintf((char*)value, "abcdef");\n')
-        else:
-            f.write(
-                f"    *({ct} *)value = {node['subId']};\n"
-                f"    return sizeof(*({ct} *)value);\n"
-            )
-        f.write("}\n\n")
+        c = self.context(node)
+        parts = ["\n{\n"]
+        if c.syntax.enums is not None:
+            parts.append(tpl.SCALAR_ENUMS(c=c))
+        parts.append(tpl.SCALAR_GET_STRING if c.syntax.octet else tpl.SCALAR_GET_NUMBER(c=c))
+        parts.append("}\n\n")
+        self.write_function(tpl.SCALAR_GET(c=c), parts)
 
     def generate_scalar_test_method(self, node):
         """生成scalar_test_method"""
-        self.func_extern.append(
-            f"snmp_err_t {node['parent_name']}_{node['name']}_set_test("
-            "struct snmp_node_instance *node, u16_t len, void *value);\n"
-        )
-        f = self.out_file_c
-        f.write(
-            f"snmp_err_t {node['parent_name']}_{node['name']}_set_test("
-            "struct snmp_node_instance *node, u16_t len, void *value)\n"
-            "{\n"
-        )
-        if node["access"] not in ["read-write", "write-only"]:
-            f.write("    return SNMP_ERR_NOACCESS;\n}\n\n")
-            return
-        bound = self.get_bounds(node)
-        ct = self.get_ctype(node)
-        if len(bound) == 1:
-            if ct == self.syntax_ctype_dict["octet"]:
-                f.write(f"    if (len != {bound[0]})\n")
-            else:
-                f.write(f"    if (*({ct} *)value != {bound[0]})\n")
-            f.write("        return SNMP_ERR_WRONGVALUE;\n")
-        elif len(bound) == 2:
-            if ct == self.syntax_ctype_dict["octet"]:
-                f.write(f"    if (len < {bound[0]} || len > {bound[1]})\n")
-            else:
-                f.write(
-                    f"    if (*({ct} *)value < {bound[0]} || *({ct} *)value > {bound[1]})\n"
-                )
-            f.write("        return SNMP_ERR_WRONGVALUE;\n")
-        f.write("    return SNMP_ERR_NOERROR;\n}\n\n")
+        c = self.context(node)
+        parts = ["\n{\n"]
+        if not c.syntax.writable:
+            parts.append(tpl.NO_ACCESS)
+        else:
+            if c.syntax.check is not None:
+                parts.append(tpl.SCALAR_CHECK(c=c))
+            parts.append(tpl.RETURN_NOERROR)
+        self.write_function(tpl.SCALAR_TEST(c=c), parts)
 
     def generate_scalar_set_method(self, node):
         """生成scalar_set_method"""
-        self.func_extern.append(
-            f"snmp_err_t {node['parent_name']}_{node['name']}_set_value("
-            "struct snmp_node_instance *node, u16_t len, void *value);\n"
-        )
-        f = self.out_file_c
-        f.write(
-            f"snmp_err_t {node['parent_name']}_{node['name']}_set_value("
-            "struct snmp_node_instance *node, u16_t len, void *value)\n"
-            "{\n"
-        )
-        if node["access"] not in ["read-write", "write-only"]:
-            f.write("    return SNMP_ERR_NOACCESS;\n}\n\n")
-            return
-        ct = self.get_ctype(node)
-        if ct == self.syntax_ctype_dict["octet"]:
-            f.write("    // (char *)value;\n")
+        c = self.context(node)
+        parts = ["\n{\n"]
+        if not c.syntax.writable:
+            parts.append(tpl.NO_ACCESS)
+        else:
+            parts.append(tpl.SCALAR_SET_BODY(c=c))
+            parts.append(tpl.RETURN_NOERROR)
+        self.write_function(tpl.SCALAR_SET(c=c), parts)
+
+    def get_member(self, kid):
+        """查表分派时单个成员的get函数体"""
+        parts = []
+        if kid.syntax.enums is not None:
+            parts.append(tpl.SCALAR_ENUMS(c=kid))
+        if kid.syntax.octet:
+            parts.append(tpl.SCALAR_GET_STRING)
+        else:
+            parts.append(tpl.SCALAR_GET_NUMBER(c=kid))
+        parts.append("}\n\n")
+        return "".join(parts)
+
+    def test_member(self, kid):
+        """查表分派时单个成员的set_test函数体"""
+        if kid.syntax.check is None:
+            return tpl.RETURN_NOERROR
+        return tpl.SCALAR_CHECK(c=kid) + tpl.RETURN_NOERROR
+
+    def set_member(self, kid):
+        """查表分派时单个成员的set_value函数体"""
+        return tpl.SCALAR_SET_BODY(c=kid) + tpl.RETURN_NOERROR
+
+    def generate_scalar_array_dispatch(self, node, op, kids):
+        """用查表代替switch, 每个成员生成一个函数
+
+        subId足够密集时按subId直接下标查函数表, 否则在按subId排好序的表里二分查找
+        """
+        c = self.context(node)
+        parts = []
+        for kid in kids:
+            parts.append(tpl.MEMBER(c=kid, op=op))
+            parts.append(getattr(self, op.body)(kid))
+        kids = sorted(kids, key=lambda kid: kid.subId)
+        size = kids[-1].subId + 1
+        if size <= DENSE_FILL * len(kids):
+            parts.append(tpl.DENSE_TABLE(c=c, op=op, size=size))
+            by_subid = {kid.subId: kid for kid in kids}
+            for subid in range(size):
+                if subid in by_subid:
+                    parts.append(tpl.DENSE_ENTRY(c=by_subid[subid], op=op))
+                else:
+                    parts.append(tpl.DENSE_HOLE)
+            parts.append("};\n")
+            body = tpl.DENSE_DISPATCH(c=c, op=op, size=size)
         else:
-            f.write(f"    // *({ct} *)value;\n")
-        f.write("    return SNMP_ERR_NOERROR;\n}\n\n")
+            parts.append(tpl.SORTED_TABLE(c=c, op=op, size=len(kids)))
+            parts.extend(tpl.SORTED_ENTRY(c=kid, op=op) for kid in kids)
+            parts.append("};\n")
+            body = tpl.SORTED_DISPATCH(c=c, op=op, size=len(kids))
+        self.out_file_c.write("".join(parts))
+        self.write_function(op.signature(c=c), [body])
 
     def generate_scalar_array(self, node):
         """生成array scalar"""
         print("scalar array: ", node["name"])
+        c = self.context(node)
+        kids = self.kid_contexts(node)
         self.node_extern.append(
             f"extern const struct snmp_scalar_array_node {node['name']}_root;\n"
         )
-        self.generate_scalar_array_get_method(node)
-        if self.get_scalar_array_writable(node):
-            self.generate_scalar_array_test_method(node)
-            self.generate_scalar_array_set_method(node)
-        f = self.out_file_c
-        f.write(
+        writable = any(kid.syntax.writable for kid in kids)
+        if self.dispatch_threshold and len(kids) >= self.dispatch_threshold:
+            self.out_file_c.write(tpl.DISPATCH_GET_TYPE(c=c))
+            if writable:
+                self.out_file_c.write(tpl.DISPATCH_SET_TYPE(c=c))
+            self.out_file_c.write("\n")
+            self.generate_scalar_array_dispatch(node, GET_OP, kids)
+            if writable:
+                writable_kids = [kid for kid in kids if kid.syntax.writable]
+                self.generate_scalar_array_dispatch(node, TEST_OP, writable_kids)
+                self.generate_scalar_array_dispatch(node, SET_OP, writable_kids)
+        else:
+            self.generate_scalar_array_get_method(node)
+            if writable:
+                self.generate_scalar_array_test_method(node)
+                self.generate_scalar_array_set_method(node)
+        parts = [
             f"static const struct snmp_scalar_array_node_def {node['name']}_nodes[] = {'{'}\n"
-        )
-        for kid in node["kids"]:
-            f.write(
-                f"    {'{'}{kid[2]}, {self.get_syntax_type(self.node_dict[kid[3]])}, "
-                f"{self.get_access(self.node_dict[kid[3]]) }{'}'}, // {kid[0]}\n"
-            )
-        f.write("};\n")
-        if self.get_scalar_array_writable(node):
-            f.write(
-                f"const struct snmp_scalar_array_node {node['name']}_root =\n"
-                f"    SNMP_SCALAR_CREATE_ARRAY_NODE({node['subId']}, {node['name']}_nodes,\n"
-                f"                                  {node['name']}_get_value,\n"
-                f"                                  {node['name']}_set_test,\n"
-                f"                                  {node['name']}_set_value);\n\n"
-            )
+        ]
+        parts.extend(tpl.SCALAR_ARRAY_DEF(c=kid) for kid in kids)
+        parts.append("};\n")
+        parts.append(tpl.SCALAR_ARRAY_NODE(c=c))
+        if writable:
+            parts.append(tpl.SCALAR_ARRAY_NODE_SET(c=c))
         else:
-            f.write(
-                f"const struct snmp_scalar_array_node {node['name']}_root =\n"
-                f"    SNMP_SCALAR_CREATE_ARRAY_NODE({node['subId']}, {node['name']}_nodes,\n"
-                f"                                  {node['name']}_get_value,\n"
-                "                                  NULL, NULL);\n\n"
-            )
+            parts.append(tpl.SCALAR_ARRAY_NODE_READ_ONLY)
+        self.out_file_c.write("".join(parts))
 
     def generate_empty_tree(self, node):
         """生成empty tree"""
@@ -696,7 +438,7 @@ class MibGenerator:
         )
         for kid in node["kids"]:
             if (
-                self.is_array_of_scalar(self.node_dict[kid[3]]["kids"])
+                self.is_array_of_scalar(kid.kids)
                 or kid[1] == "scalar"
                 or kid[1] == "table"
             ):
@@ -714,112 +456,337 @@ class MibGenerator:
     def generate_scalar(self, node):
         """生成scalar"""
         print("scalar: ", node["name"])
+        c = self.context(node)
         self.node_extern.append(
             f"extern const struct snmp_scalar_node {node['name']}_root;\n"
         )
         self.generate_scalar_get_method(node)
-        f = self.out_file_c
-        set_func_name = "NULL, NULL"
+        set_funcs = "NULL, NULL"
         if node["access"] != "read-only" and node["access"] != "not-access":
             self.generate_scalar_test_method(node)
             self.generate_scalar_set_method(node)
-            set_func_name = (
-                f"{node['parent_name']}_{node['name']}_set_test, "
-                + f"{node['parent_name']}_{node['name']}_set_value"
-            )
-        f.write(
-            f"const struct snmp_scalar_node {node['name']}_root = "
-            f"SNMP_SCALAR_CREATE_NODE({node['subId']}, "
-            f"{self.get_access(node)}, {self.get_syntax_type(node)}, "
-            f"{node['parent_name']}_{node['name']}_get_value, {set_func_name});\n\n"
-        )
+            set_funcs = tpl.SCALAR_SET_FUNCS(c=c)
+        self.out_file_c.write(tpl.SCALAR_NODE(c=c, set_funcs=set_funcs))
 
     def generate_table(self, node):
         """生成table"""
         print("table: ", node["name"])
         if len(node["kids"]) != 1:
             return
-        f = self.out_file_c
+        c = self.context(node)
         row_node = self.node_dict[node["kids"][0][3]]
         row_name = row_node["name"]
+        storage = self.table_storage(row_node)
+        if storage is not None:
+            self.generate_row_storage(row_node, storage)
         if self.get_table_writable(row_node):
-            self.generate_table_get_cell_instance_method(row_node)
-            self.generate_table_get_next_cell_instance_method(row_node)
-            self.generate_table_get_value_method(row_node)
-            self.generate_table_set_test_method(row_node)
-            self.generate_table_set_value_method(row_node)
+            if storage is None:
+                self.generate_table_get_cell_instance_method(row_node)
+                self.generate_table_get_next_cell_instance_method(row_node)
+                self.generate_table_get_value_method(row_node)
+                self.generate_table_set_test_method(row_node)
+                self.generate_table_set_value_method(row_node)
+            else:
+                self.generate_stored_table_methods(row_node, storage)
             self.generate_row(row_node)
             self.node_extern.append(
                 f"extern const struct snmp_table_node {node['name']}_root;\n"
             )
-            f.write(
-                f"const struct snmp_table_node {node['name']}_root =\n"
-                f"    SNMP_TABLE_CREATE({node['subId']}, {node['name']}_{row_name}_row,\n"
-                f"                             {node['name']}_get_cell_instance,\n"
-                f"                             {node['name']}_get_next_cell_instance,\n"
-                f"                             {node['name']}_get_value,\n"
-                f"                             {node['name']}_set_test,\n"
-                f"                             {node['name']}_set_value);\n"
-                "\n"
-            )
+            self.out_file_c.write(tpl.TABLE_NODE(c=c, row=row_name))
         else:
-            self.generate_table_get_cell_value_method(row_node)
-            self.generate_table_get_next_cell_instance_and_value_method(row_node)
+            if storage is None:
+                self.generate_table_get_cell_value_method(row_node)
+                self.generate_table_get_next_cell_instance_and_value_method(row_node)
+            else:
+                self.generate_stored_simple_table_methods(row_node, storage)
             self.generate_simple_row(row_node)
             self.node_extern.append(
                 f"extern const struct snmp_table_simple_node {node['name']}_root;\n"
             )
-            f.write(
-                f"const struct snmp_table_simple_node {node['name']}_root =\n"
-                f"    SNMP_TABLE_CREATE_SIMPLE({node['subId']}, {node['name']}_{row_name}_row,\n"
-                f"                             {node['name']}_get_cell_value,\n"
-                f"                             {node['name']}_get_next_cell_instance_and_value);\n"
-                "\n"
-            )
+            self.out_file_c.write(tpl.SIMPLE_TABLE_NODE(c=c, row=row_name))
+
+    def index_part(self, node):
+        """INDEX里的一个对象在行存储里的表示, 不支持的类型返回None"""
+        if node.syntax is None:
+            return None
+        c = self.context(node)
+        if c.syntax.syntax_type == "SNMP_ASN1_TYPE_IPADDRESS":
+            return IndexPart(c, "fixed", 4)
+        if c.syntax.octet:
+            bounds = self.get_bounds(node)
+            if len(bounds) == 1 and bounds[0] > 0:
+                return IndexPart(c, "fixed", bounds[0])
+            size = bounds[-1] if bounds else INDEX_STRING_SIZE
+            return IndexPart(c, "string", min(size, 255))
+        if c.syntax.syntax_type == "SNMP_ASN1_TYPE_OBJECT_ID":
+            return None
+        return IndexPart(c, "number", 1)
+
+    def column_part(self, node):
+        """行存储里二进制字节串列(IpAddress, PhysAddress, OCTET STRING)的表示,
+        按长度读写, 不当作C字符串. 其它列返回None"""
+        c = self.context(node)
+        if not c.syntax.binary:
+            return None
+        if c.syntax.syntax_type == "SNMP_ASN1_TYPE_IPADDRESS":
+            return IndexPart(c, "fixed", 4)
+        bounds = self.get_bounds(node)
+        if len(bounds) == 1 and bounds[0] > 0:
+            return IndexPart(c, "fixed", bounds[0])
+        return IndexPart(c, "string", bounds[-1] if bounds else STRING_SIZE - 1)
+
+    def table_storage(self, row_node):
+        """表格的RowStorage, 没有打开row_storage, INDEX里有不支持的类型或者INDEX编码后
+        放不进实例OID时为None
+
+        INDEX是单个整数且取值范围在1..row_storage之内时, 行号直接作为数组下标;
+        否则(包括可以取0的INDEX)行按INDEX编码成的OID排好序, 用二分查找.
+        实例OID是表格OID, entry, 列和INDEX, 一共不能超过MAX_OID_LEN个子标识符,
+        字符串索引的长度按剩下的空间截短
+        """
+        if not self.row_storage or not row_node.index:
+            return None
+        columns = [
+            part
+            for part in map(self.column_part, row_node.kids)
+            if part is not None and part.c.name not in row_node.index
+        ]
+        parts = []
+        for name in row_node.index:
+            oid = self.name_oid.get(name)
+            part = self.index_part(self.node_dict[oid]) if oid is not None else None
+            if part is None:
+                return None
+            parts.append(part)
+        if len(parts) == 1 and parts[0].kind == "number":
+            bounds = self.get_bounds(self.node_dict[self.name_oid[row_node.index[0]]])
+            # 数组下标是行号减1, 行号0放不进去
+            if bounds and bounds[0] >= 1 and bounds[-1] <= self.row_storage:
+                return RowStorage(self.context(row_node), parts, columns, bounds[-1], False)
+        max_len = MAX_OID_LEN - len(row_node.oid) - 1
+        strings = [part for part in parts if part.kind == "string"]
+        # 除了定长的部分, 每个字符串至少要放下长度和一个字节
+        room = max_len - sum(part.key_len for part in parts if part.kind != "string")
+        room -= len(strings)
+        if room < (1 if strings else 0):
+            print(f"{row_node.name}: INDEX does not fit in SNMP_MAX_OBJ_ID_LEN, no row storage")
+            return None
+        for part in strings:
+            part.size = min(part.size, room)
+        return RowStorage(
+            self.context(row_node), parts, columns, self.row_storage, True, max_len
+        )
+
+    def generate_row_storage(self, row_node, storage):
+        """生成行结构体, 行数组和增删查找行的函数"""
+        c = self.context(row_node)
+        self.struct_declare.append(tpl.ROW_STRUCT(c=c))
+        if storage.sorted:
+            for part in storage.indexes:
+                if part.kind == "number":
+                    self.struct_declare.append(tpl.ROW_FIELD(c=part.c))
+                elif part.kind == "string":
+                    self.struct_declare.append(tpl.INDEX_FIELD_STRING(c=part.c, size=part.size))
+                else:
+                    self.struct_declare.append(tpl.INDEX_FIELD_FIXED(c=part.c, size=part.size))
+        for kid in row_node.kids:
+            if kid.name in storage.names:
+                continue
+            k = self.context(kid)
+            part = storage.columns.get(kid.name)
+            if part is not None and part.kind == "string":
+                self.struct_declare.append(tpl.ROW_FIELD_BYTES(c=k, size=part.size))
+            elif part is not None:
+                self.struct_declare.append(tpl.INDEX_FIELD_FIXED(c=k, size=part.size))
+            elif k.syntax.octet:
+                bounds = self.get_bounds(kid)
+                length = bounds[-1] + 1 if bounds else STRING_SIZE
+                self.struct_declare.append(tpl.ROW_FIELD_STRING(c=k, size=length))
+            else:
+                self.struct_declare.append(tpl.ROW_FIELD(c=k))
+        self.struct_declare.append("};\n\n")
+        if storage.sorted:
+            self.generate_sorted_rows(c, storage)
+            return
+        size = storage.size
+        self.out_file_c.write(tpl.ROW_STORAGE(c=c, size=size))
+        self.write_function(tpl.ROW_LOOKUP(c=c), [tpl.ROW_LOOKUP_BODY(c=c, size=size)])
+        self.write_function(tpl.ROW_ADD(c=c), [tpl.ROW_ADD_BODY(c=c, size=size)])
+        self.write_function(tpl.ROW_REMOVE(c=c), [tpl.ROW_REMOVE_BODY(c=c, size=size)])
+        self.write_function(tpl.ROW_NEXT(c=c), [tpl.ROW_NEXT_BODY(c=c, size=size)])
+
+    def generate_sorted_rows(self, c, storage):
+        """按INDEX排序的行数组, INDEX和OID之间的编码解码, 二分查找和增删行的函数"""
+        size, key_len, max_len = storage.size, storage.key_len, storage.max_len
+        loop = any(part.kind != "number" for part in storage.indexes)
+        self.out_file_c.write(tpl.SORTED_ROW_STORAGE(c=c, size=size, max_len=max_len))
+
+        parts = ["\n{\n    u16_t len = 0;\n", "    u16_t i;\n\n" if loop else "\n"]
+        for part in storage.indexes:
+            if part.kind == "number":
+                parts.append(tpl.ENCODE_NUMBER(c=part.c))
+            elif part.kind == "string":
+                parts.append(tpl.ENCODE_STRING(c=part.c))
+            else:
+                parts.append(tpl.ENCODE_FIXED(c=part.c, size=part.size))
+        parts.append("    return len;\n}\n\n")
+        self.write_function(tpl.INDEX_ENCODE(c=c), parts)
+
+        parts = ["\n{\n    u16_t pos = 0;\n", "    u16_t i;\n\n" if loop else "\n"]
+        for part in storage.indexes:
+            if part.kind == "number":
+                parts.append(tpl.DECODE_NUMBER(c=part.c))
+            elif part.kind == "string":
+                parts.append(tpl.DECODE_STRING(c=part.c, size=part.size))
+            else:
+                parts.append(tpl.DECODE_FIXED(c=part.c, size=part.size))
+        parts.append("    return pos == len;\n}\n\n")
+        self.write_function(tpl.INDEX_DECODE(c=c), parts)
+
+        self.out_file_c.write(tpl.SORTED_ROW_SEARCH(c=c, key_len=key_len))
+        self.write_function(
+            tpl.SORTED_ROW_LOOKUP(c=c), [tpl.SORTED_ROW_LOOKUP_BODY(c=c, key_len=key_len)]
+        )
+        self.write_function(
+            tpl.SORTED_ROW_ADD(c=c),
+            [tpl.SORTED_ROW_ADD_BODY(c=c, size=size, key_len=key_len, max_len=max_len)],
+        )
+        self.write_function(
+            tpl.SORTED_ROW_REMOVE(c=c), [tpl.SORTED_ROW_REMOVE_BODY(c=c, key_len=key_len)]
+        )
+
+    def switch_stored_variant(self, kids, storage, parts):
+        """行存储的simple table中每一列的snmp_variant_value"""
+        for kid in kids:
+            parts.append(tpl.CASE(c=kid))
+            column = storage.columns.get(kid.name)
+            if column is not None:
+                parts.append(tpl.INDEX_VARIANT_BYTES(c=kid, size=column.length))
+                continue
+            part = storage.names.get(kid.name)
+            if part is None:
+                if kid.syntax.enums is not None:
+                    parts.append(tpl.ENUMS(c=kid))
+                parts.append(tpl.STORED_VARIANT(c=kid))
+            elif not storage.sorted:
+                parts.append(tpl.VARIANT_INDEX(c=kid))
+            elif part.kind == "number":
+                parts.append(tpl.STORED_VARIANT(c=kid))
+            else:
+                parts.append(tpl.INDEX_VARIANT_BYTES(c=kid, size=part.length))
+                continue
+            parts.append(tpl.VARIANT_LEN(c=kid))
+
+    def generate_stored_simple_table_methods(self, node, storage):
+        """生成行存储的simple table的get_cell_value和get_next_cell_instance_and_value"""
+        c = self.context(node)
+        kids = self.kid_contexts(node)
+        parts = [storage.check_row]
+        self.switch_stored_variant(kids, storage, parts)
+        parts.append(
+            "    default:\n        break;\n    }\n    return SNMP_ERR_NOERROR;\n}\n\n"
+        )
+        self.write_function(tpl.TABLE_GET_CELL_VALUE(c=c), parts)
+
+        parts = [storage.next_row, storage.next_value]
+        self.switch_stored_variant(kids, storage, parts)
+        parts.append(
+            "    default:\n        return SNMP_ERR_NOSUCHINSTANCE;\n    }\n"
+            "    return SNMP_ERR_NOERROR;\n}\n\n"
+        )
+        self.write_function(tpl.TABLE_GET_NEXT_CELL_INSTANCE_AND_VALUE(c=c), parts)
+
+    def generate_stored_table_methods(self, node, storage):
+        """生成行存储的table的get_cell_instance, get_next_cell_instance, get_value,
+        set_test和set_value"""
+        c = self.context(node)
+        kids = self.kid_contexts(node)
+        self.write_function(tpl.TABLE_GET_CELL_INSTANCE(c=c), [storage.check_instance])
+        self.write_function(
+            tpl.TABLE_GET_NEXT_CELL_INSTANCE(c=c),
+            [storage.next_row, "    return SNMP_ERR_NOERROR;\n}\n\n"],
+        )
+
+        parts = [storage.switch_instance]
+        for kid in kids:
+            parts.append(tpl.CASE(c=kid))
+            part = storage.names.get(kid.name)
+            if part is not None and not storage.sorted:
+                parts.append(tpl.GET_INDEX(c=kid))
+                continue
+            part = part or storage.columns.get(kid.name)
+            if part is not None and part.kind != "number":
+                parts.append(tpl.INDEX_GET_BYTES(c=kid, size=part.length))
+                continue
+            if kid.syntax.enums is not None:
+                parts.append(tpl.ENUMS(c=kid))
+            if kid.syntax.octet:
+                parts.append(tpl.STORED_GET_STRING(c=kid))
+            else:
+                parts.append(tpl.STORED_GET_NUMBER(c=kid))
+        parts.append("    default:\n        return 0;\n    }\n}\n\n")
+        self.write_function(tpl.TABLE_GET_VALUE(c=c), parts)
+
+        # 索引列决定行的位置, 不能通过SET修改
+        writable = [
+            kid for kid in kids if kid.syntax.writable and kid.name not in storage.names
+        ]
+        parts = [storage.switch_instance]
+        for kid in writable:
+            parts.append(tpl.CASE(c=kid))
+            column = storage.columns.get(kid.name)
+            if column is not None and column.kind == "fixed":
+                parts.append(tpl.STORED_CHECK_FIXED(size=column.size))
+            elif column is not None:
+                parts.append(tpl.STORED_CHECK_BYTES(c=kid))
+            elif kid.syntax.octet:
+                parts.append(tpl.STORED_CHECK_LENGTH(c=kid))
+            parts.append("        break;\n" if kid.syntax.check is None else tpl.CHECK(c=kid))
+        parts.append(
+            "    default:\n        return SNMP_ERR_NOSUCHINSTANCE;\n    }\n"
+            "    return SNMP_ERR_NOERROR;\n}\n\n"
+        )
+        self.write_function(tpl.TABLE_SET_TEST(c=c), parts)
+
+        parts = [storage.switch_instance]
+        for kid in writable:
+            parts.append(tpl.CASE(c=kid))
+            column = storage.columns.get(kid.name)
+            if column is not None and column.kind == "fixed":
+                parts.append(tpl.STORED_SET_FIXED(c=kid, size=column.size))
+            elif column is not None:
+                parts.append(tpl.STORED_SET_BYTES(c=kid))
+            elif kid.syntax.octet:
+                parts.append(tpl.STORED_SET_STRING(c=kid))
+            else:
+                parts.append(tpl.STORED_SET_NUMBER(c=kid))
+            parts.append("        return SNMP_ERR_NOERROR;\n")
+        parts.append("    default:\n        return SNMP_ERR_NOSUCHINSTANCE;\n    }\n}\n\n")
+        self.write_function(tpl.TABLE_SET_VALUE(c=c), parts)
 
     def get_table_writable(self, row_node):
         """判断表格是否可写"""
-        for kid in row_node["kids"]:
-            if self.node_dict[kid[3]]["access"] in ["read-write", "write-only"]:
-                return True
-        return False
+        return any(kid.syntax.writable for kid in self.kid_contexts(row_node))
 
     def get_scalar_array_writable(self, node):
         """判断是否可写"""
-        for kid in node["kids"]:
-            if self.node_dict[kid[3]]["access"] in ["read-write", "write-only"]:
-                return True
-        return False
+        return any(kid.syntax.writable for kid in self.kid_contexts(node))
 
     def generate_row(self, node):
         """生成row"""
         print("row: ", node["name"])
-        f = self.out_file_c
-        f.write(
-            "static const struct snmp_table_col_def "
-            f"{node['parent_name']}_{node['name']}_row[] = {'{'}\n"
-        )
-        for kid in node["kids"]:
-            f.write(
-                f"    {'{'}{kid[2]}, {self.get_syntax_type(self.node_dict[kid[3]])}, "
-                f"{self.get_access(self.node_dict[kid[3]])}{'}'}, // {kid[0]}\n"
-            )
-        f.write("};\n")
+        parts = [tpl.ROW_DEF(c=self.context(node))]
+        parts.extend(tpl.SCALAR_ARRAY_DEF(c=kid) for kid in self.kid_contexts(node))
+        parts.append("};\n")
+        self.out_file_c.write("".join(parts))
 
     def generate_simple_row(self, node):
         """生成simple row"""
         print("row: ", node["name"])
-        f = self.out_file_c
-        f.write(
-            "static const struct snmp_table_simple_col_def "
-            f"{node['parent_name']}_{node['name']}_row[] = {'{'}\n"
-        )
-        for kid in node["kids"]:
-            f.write(
-                f"    {'{'}{kid[2]}, {self.get_syntax_type(self.node_dict[kid[3]])}, "
-                f"{self.get_data_type(self.node_dict[kid[3]])}{'}'}, // {kid[0]}\n"
-            )
-        f.write("};\n")
+        parts = [tpl.SIMPLE_ROW_DEF(c=self.context(node))]
+        parts.extend(tpl.SIMPLE_COL_DEF(c=kid) for kid in self.kid_contexts(node))
+        parts.append("};\n")
+        self.out_file_c.write("".join(parts))
 
     def generate_column(self, node):
         """生成column"""
@@ -830,81 +797,70 @@ class MibGenerator:
         print("notification: ", node["name"])
         if len(node["objects"]) == 0:
             return
+        c = self.context(node)
+        objs = [self.context(self.node_dict[self.name_oid[obj]]) for obj in node["objects"]]
         self.struct_declare.append(f"struct {node['name']} {'{'}\n")
-        for obj in node["objects"]:
-            kid = self.node_dict[self.name_oid[obj]]
-            self.struct_declare.append(f"    {self.get_ctype(kid)} {kid['name']};\n")
+        self.struct_declare.extend(tpl.TRAP_STRUCT_FIELD(c=obj) for obj in objs)
         self.struct_declare.append("};\n\n")
-        self.func_extern.append(
-            f"err_t send_trap_{node['name']}(const struct {node['name']} *trap);\n"
-        )
-        f = self.out_file_c
-        f.write(f"err_t send_trap_{node['name']}(const struct {node['name']} *trap)\n")
-        f.write("{\n")
-        f.write("    err_t ret = ERR_OK;\n")
-        f.write(
-            "    const struct snmp_obj_id trap_oid = "
-            f"{'{'}{len(node['parent'])+1}, {'{'}{node['parent']}, "
-            f"{node['subId']}{'}'}{'}'};\n\n".translate({ord(c): None for c in "()"})
-        )
-        for obj in node["objects"]:
-            kid = self.node_dict[self.name_oid[obj]]
-            f.write(
-                f"    const struct snmp_obj_id oid_{obj} = "
-                f"{'{'}{len(kid['parent'])+1}, {'{'}{kid['parent']}, "
-                f"{kid['subId']}{'}'}{'}'};\n".translate({ord(c): None for c in "()"})
-            )
-        f.write("\n")
-        for obj in node["objects"]:
-            kid = self.node_dict[self.name_oid[obj]]
-            f.write(
-                f"    struct snmp_varbind *vb_{kid['name']} = "
-                "(struct snmp_varbind*)calloc(1, sizeof(struct snmp_varbind));\n"
+        size = len(objs)
+        self.out_file_c.write(tpl.TRAP_OID(c=c))
+        parts = [tpl.VARBIND_OIDS(c=c, size=size)]
+        parts.extend(tpl.VARBIND_OID(c=obj) for obj in objs)
+        parts.append("};\n\n")
+        self.out_file_c.write("".join(parts))
+        parts = [tpl.VARBIND_ARRAY(size=size), "\n"]
+        for i, obj in enumerate(objs):
+            parts.append(tpl.VARBIND_ASSIGN(c=obj, other=c, i=i))
+            parts.append((tpl.VARBIND_STRING if obj.syntax.string else tpl.VARBIND_VALUE)(c=obj, i=i))
+            if i + 1 < size:
+                parts.append(tpl.VARBIND_NEXT(i=i))
+            if i > 0:
+                parts.append(tpl.VARBIND_PREV(i=i))
+            parts.append("\n")
+        parts.append(tpl.SEND(c=c))
+        self.write_function(tpl.SEND_TRAP(c=c), parts)
+
+    def generate_trap_queue(self):
+        """生成所有notification共用的发送队列, queue_trap_*入队, <模块>_flush_traps发送"""
+        module, size = self.fname, self.trap_queue
+        notifications = [self.context(node) for node in self.notifications]
+        parts = [tpl.TRAP_TYPES(module=module)]
+        parts.extend(tpl.TRAP_TYPE(c=c, module=module) for c in notifications)
+        parts.append("};\n\n")
+        parts.append(tpl.TRAP_ENTRY(module=module))
+        parts.extend(tpl.TRAP_ENTRY_FIELD(c=c) for c in notifications)
+        parts.append(tpl.TRAP_QUEUE(module=module, size=size))
+        objects = [
+            [self.context(self.node_dict[self.name_oid[obj]]) for obj in node.objects]
+            for node in self.notifications
+        ]
+        if any(obj.syntax.string for objs in objects for obj in objs):
+            parts.append(tpl.SAME_STRING_FUNC(module=module))
+        for c, objs in zip(notifications, objects):
+            parts.append(tpl.TRAP_SAME(c=c))
+            parts.append(
+                " &&\n           ".join(
+                    tpl.SAME_STRING(c=obj, module=module)
+                    if obj.syntax.string
+                    else tpl.SAME_VALUE(c=obj)
+                    for obj in objs
+                )
             )
-        f.write("\n")
-        for i, obj in enumerate(node["objects"]):
-            kid = self.node_dict[self.name_oid[obj]]
-            f.write(
-                f"    snmp_oid_assign(&vb_{kid['name']}->oid, "
-                f"oid_{kid['name']}.id, oid_{kid['name']}.len);\n"
+            parts.append(";\n}\n\n")
+        self.out_file_c.write("".join(parts))
+        for c in notifications:
+            self.write_function(
+                tpl.QUEUE_TRAP(c=c), [tpl.QUEUE_TRAP_BODY(c=c, module=module, size=size)]
             )
-            f.write(f"    vb_{kid['name']}->type = {self.get_syntax_type(kid)};\n")
-            if kid["syntax"].lower() in ["octet", "displaystring"]:
-                f.write(
-                    f"    vb_{kid['name']}->value = (void *)trap->{kid['name']};\n"
-                    f"    vb_{kid['name']}->value_len = strlen(trap->{kid['name']});\n"
-                )
-            else:
-                f.write(
-                    f"    vb_{kid['name']}->value = (void *)&trap->{kid['name']};\n"
-                    f"    vb_{kid['name']}->value_len = sizeof(trap->{kid['name']});\n"
-                )
-            if i + 1 < len(node["objects"]):
-                kid_next = self.node_dict[self.name_oid[node["objects"][i + 1]]]
-                f.write(f"    vb_{kid['name']}->next = vb_{kid_next['name']};\n")
-            if i > 0:
-                kid_prev = self.node_dict[self.name_oid[node["objects"][i - 1]]]
-                f.write(f"    vb_{kid['name']}->prev = vb_{kid_prev['name']};\n")
-            f.write("\n")
-        first_kid = self.node_dict[self.name_oid[node["objects"][0]]]
-        f.write(
-            "    ret = snmp_send_trap(&trap_oid, SNMP_GENTRAP_ENTERPRISE_SPECIFIC, "
-            f"1, vb_{first_kid['name']});\n\n"
-        )
-        for obj in node["objects"]:
-            kid = self.node_dict[self.name_oid[obj]]
-            f.write(f"    free(vb_{kid['name']});\n")
-        f.write("    return ret;\n")
-        f.write("}\n\n")
+        parts = [tpl.FLUSH_TRAPS_BEGIN(module=module)]
+        parts.extend(tpl.FLUSH_TRAPS_CASE(c=c, module=module) for c in notifications)
+        parts.append(tpl.FLUSH_TRAPS_END(module=module, size=size))
+        self.write_function(tpl.FLUSH_TRAPS(module=module), parts)
 
     def is_array_of_scalar(self, kids):
         """判断子节点是否全为scalar"""
-        if len(kids) == 0:
-            return False
-        for kid in kids:
-            if self.node_dict[kid[3]]["type"] != "scalar":
-                return False
-        return True
+        # kids里就是子节点本身, 不需要再查node_dict
+        return len(kids) > 0 and all(kid.type == "scalar" for kid in kids)
 
     def generate_extern(self):
         """声明"""
@@ -922,7 +878,6 @@ class MibGenerator:
         f_h.write("\n")
         f_h.write(f"#endif /* {self.fname.upper()}_H */\n")
         f_h.write("\n")
-        f_h.close()
 
     def generate_mibs(self, node):
         """mibs"""
@@ -937,15 +892,59 @@ class MibGenerator:
             )
             self.node_extern.append(f"extern const struct snmp_mib {kid[0]}_mib;\n")
 
+    def fragment_key(self, node):
+        """node生成的代码所依赖的全部节点内容"""
+        nodes = [node]
+        for kid in nodes:
+            nodes.extend(kid["kids"])
+        if node["type"] == "notification":
+            nodes.extend(self.node_dict[self.name_oid[obj]] for obj in node["objects"])
+        # 行存储的字段和编码取决于INDEX里的对象, 它们可以在别的表格里
+        for kid in list(nodes):
+            for name in kid.index or ():
+                oid = self.name_oid.get(name)
+                if oid in self.node_dict:
+                    nodes.append(self.node_dict[oid])
+        # TEXTUAL-CONVENTION变化时节点内容不变, type_info也要算进去
+        types = [kid.type_info.name if kid.type_info else None for kid in nodes]
+        return marshal.dumps([kid.astuple() for kid in nodes] + types, 2)
+
+    def generate_fragment(self, generate, node):
+        """调用generate生成node, 依赖的节点没有变化时复用上次的代码"""
+        if self.fragments is None:
+            generate(node)
+            return
+        key = self.fragment_key(node)
+        fragment = self.fragments.get(key)
+        lists = (self.node_extern, self.func_extern, self.struct_declare)
+        if fragment is None:
+            out_file_c = self.out_file_c
+            marks = [len(lines) for lines in lists]
+            self.out_file_c = io.StringIO()
+            try:
+                generate(node)
+                text = self.out_file_c.getvalue()
+            finally:
+                self.out_file_c = out_file_c
+            fragment = (text,) + tuple(
+                tuple(lines[mark:]) for lines, mark in zip(lists, marks)
+            )
+        else:
+            self.fragment_hits += 1
+            for lines, new_lines in zip(lists, fragment[1:]):
+                lines.extend(new_lines)
+        self.new_fragments[key] = fragment
+        self.out_file_c.write(fragment[0])
+
     def process_node_dict(self, node: dict):
         """处理单个节点"""
         tp = node["type"]
         if tp == "ident":
             if self.is_array_of_scalar(node["kids"]):
-                self.generate_scalar_array(node)
+                self.generate_fragment(self.generate_scalar_array, node)
                 return
             elif len(node["kids"]) == 0:
-                self.generate_empty_tree(node)
+                self.generate_fragment(self.generate_empty_tree, node)
                 return
             else:
                 self.generate_tree(node)
@@ -953,19 +952,215 @@ class MibGenerator:
                     self.process_node_dict(self.node_dict[kid[3]])
                 return
         elif tp == "scalar":
-            self.generate_scalar(node)
+            self.generate_fragment(self.generate_scalar, node)
             return
         elif tp == "table":
-            self.generate_table(node)
+            self.generate_fragment(self.generate_table, node)
             return
         elif tp == "notification":
-            self.generate_notification(node)
+            if node["objects"]:
+                self.notifications.append(node)
+            self.generate_fragment(self.generate_notification, node)
             return
 
     def process(self):
         """process mib"""
-        self.process_node_dict(self.node_dict[(1, 3, 6, 4, 1)])
-        self.generate_mibs(self.node_dict[(1, 3, 6, 4, 1)])
+        enterprises = self.node_dict[self.name_oid["enterprises"]]
+        self.process_node_dict(enterprises)
+        if self.trap_queue and self.notifications:
+            self.generate_trap_queue()
+        self.generate_mibs(enterprises)
         self.generate_extern()
-        f = self.out_file_c
-        f.close()
+        write_file(self.out_fname_c, self.out_file_c.getvalue())
+        write_file(self.out_fname_h, self.out_file_h.getvalue())
+
+
+class DispatchOp:
+    """scalar array查表分派的一种操作(get_value/set_test/set_value)"""
+
+    __slots__ = ("suffix", "fn", "result", "params", "args", "missing", "signature", "body")
+
+    def __init__(self, suffix, fn, result, params, args, missing, signature, body):
+        self.suffix = suffix
+        self.fn = fn
+        self.result = result
+        self.params = params
+        self.args = args
+        self.missing = missing
+        self.signature = signature
+        self.body = body
+
+
+GET_OP = DispatchOp(
+    "get_value", "get_fn", "s16_t", "void *value", "value", "0",
+    tpl.SCALAR_ARRAY_GET, "get_member",
+)
+TEST_OP = DispatchOp(
+    "set_test", "set_fn", "snmp_err_t", "u16_t len, void *value", "len, value",
+    "SNMP_ERR_NOSUCHINSTANCE", tpl.SCALAR_ARRAY_TEST, "test_member",
+)
+SET_OP = DispatchOp(
+    "set_value", "set_fn", "snmp_err_t", "u16_t len, void *value", "len, value",
+    "SNMP_ERR_NOSUCHINSTANCE", tpl.SCALAR_ARRAY_SET, "set_member",
+)
+
+# subId的最大值不超过成员数的DENSE_FILL倍时用按下标查找的函数表
+DENSE_FILL = 2
+
+# 行存储里没有SIZE的字符串列的长度, 包括结尾的'\0'; 没有SIZE的二进制列少一个字节
+STRING_SIZE = 256
+
+# 没有SIZE的字符串索引的最大长度
+INDEX_STRING_SIZE = 32
+
+# 发送队列的下标和计数是u16_t
+MAX_TRAP_QUEUE = 65535
+
+# lwIP默认的SNMP_MAX_OBJ_ID_LEN, 完整的实例OID最多这么多个子标识符
+MAX_OID_LEN = 50
+
+
+class IndexPart:
+    """INDEX里的一个对象, 或者行存储里按长度保存的字节串列
+
+    kind: number是一个子标识符, fixed是定长的字节串(IpAddress, SIZE (n)),
+    string是长度加字节串. size是字节串的最大长度
+    """
+
+    __slots__ = ("c", "kind", "size")
+
+    def __init__(self, c, kind, size):
+        self.c = c
+        self.kind = kind
+        self.size = size
+
+    @property
+    def key_len(self):
+        """编码成OID后最多的子标识符个数"""
+        return self.size + 1 if self.kind == "string" else self.size
+
+    @property
+    def length(self):
+        """行里字节串的长度, C表达式"""
+        return f"row->{self.c.name}_len" if self.kind == "string" else str(self.size)
+
+
+class RowStorage:
+    """表格的行存储方式
+
+    sorted为False时行号直接作为数组下标, 用占用位图找下一行;
+    为True时行按INDEX编码成的OID排好序, 用二分查找.
+    key_len是INDEX编码后最多的子标识符个数, max_len是实例OID里能放下的个数,
+    编码后超过max_len的行不能加入. columns是按长度保存的非索引字节串列.
+    check_row等是用行节点c填好的函数体开头
+    """
+
+    __slots__ = (
+        "indexes",
+        "names",
+        "columns",
+        "size",
+        "sorted",
+        "key_len",
+        "max_len",
+        "check_row",
+        "next_row",
+        "next_value",
+        "check_instance",
+        "switch_instance",
+    )
+
+    def __init__(self, c, indexes, columns, size, sorted_rows, max_len=None):
+        self.indexes = indexes
+        self.names = {part.c.name: part for part in indexes}
+        self.columns = {part.c.name: part for part in columns}
+        self.size = size
+        self.sorted = sorted_rows
+        self.key_len = sum(part.key_len for part in indexes)
+        self.max_len = self.key_len if max_len is None else min(self.key_len, max_len)
+        prefix = "SORTED_" if sorted_rows else "STORED_"
+        for name in ("check_row", "next_row", "next_value", "check_instance", "switch_instance"):
+            text = getattr(tpl, prefix + name.upper())
+            setattr(self, name, text if isinstance(text, str) else text(c=c))
+
+# 去掉OID元组repr里的括号
+NO_PARENS = {ord(c): None for c in "()"}
+
+
+class SyntaxContext:
+    """生成代码时用到的类型相关的属性
+
+    syntax, access, 取值范围和枚举都相同的节点共享同一个SyntaxContext,
+    查表和拼接只做一次
+    """
+
+    __slots__ = (
+        "syntax_type",
+        "data_type",
+        "ctype",
+        "variant",
+        "variant_len",
+        "octet",
+        "binary",
+        "string",
+        "access_type",
+        "writable",
+        "enums",
+        "target",
+        "check",
+    )
+
+    def __init__(self, gen, node):
+        self.enums = gen.get_enums_str(node) if node.enums is not None else None
+        self.writable = node.access in ["read-write", "write-only"]
+        self.access_type = gen.get_access(node) if node.access is not None else None
+        self.syntax_type = self.data_type = self.ctype = self.variant = None
+        self.octet = self.binary = self.string = False
+        self.variant_len = self.target = self.check = None
+        if node.syntax is None:
+            return
+        syntax = gen.get_type(node)
+        self.syntax_type = syntax.asn1_type
+        self.data_type = syntax.data_type
+        self.ctype = syntax.ctype
+        self.variant = syntax.variant
+        self.variant_len = "strlen" if self.variant == "const_ptr" else "sizeof"
+        self.octet = self.ctype == syntax_type("octet").ctype
+        # DisplayString以外的字节串可以包含0, 不能当作C字符串
+        self.binary = self.octet and syntax.name != "displaystring"
+        self.string = syntax.string
+        self.target = "(char *)value" if self.octet else f"*({self.ctype} *)value"
+        if self.writable:
+            self.check = self.get_check(gen.get_bounds(node))
+
+    def get_check(self, bound):
+        """set_test里检查取值范围的条件, 没有范围时为None"""
+        value = "len" if self.octet else f"*({self.ctype} *)value"
+        if len(bound) == 1:
+            return f"{value} != {bound[0]}"
+        if len(bound) == 2:
+            return f"{value} < {bound[0]} || {value} > {bound[1]}"
+        return None
+
+
+class NodeContext:
+    """生成代码时用到的节点属性, 模板直接用 {c.xxx} 取值"""
+
+    __slots__ = ("name", "parent_name", "subId", "parent", "syntax")
+
+    def __init__(self, node, syntax):
+        self.name = node.name
+        self.parent_name = node.parent_name
+        self.subId = node.subId
+        self.parent = node.parent
+        self.syntax = syntax
+
+    @property
+    def oid_len(self):
+        """OID的长度"""
+        return len(self.parent) + 1
+
+    @property
+    def oid_str(self):
+        """OID, 逗号分隔"""
+        return f"{self.parent}, {self.subId}".translate(NO_PARENS)
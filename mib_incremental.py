@@ -0,0 +1,120 @@
+import hashlib
+
+from mib_fast_parser import FastSmiParser, read_header, split_definitions
+from mib_generator import MibGenerator
+from mib_parser import ENGINES, ParseContext, parse_item
+
+
+class RecordingContext:
+    """记录解析动作的ParseContext替身
+
+    add_*的结果依赖已经加入的节点(比如column还是scalar), 所以这里只记下
+    调用和参数, 之后按顺序在新的ParseContext上重放
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def __getattr__(self, name):
+        if not name.startswith("add_"):
+            raise AttributeError(name)
+        return lambda fields: self.records.append((name, dict(fields)))
+
+
+def fingerprint(tokens):
+    """顶层定义的指纹, 只和token有关, 不受所在行号影响"""
+    digest = hashlib.sha1()
+    for kind, text, _, _ in tokens:
+        digest.update(f"{kind}\0{text}\0".encode())
+    return digest.digest()
+
+
+def item_text(lines, tokens):
+    """tokens在源文件中对应的原文, 前面补上换行和空格, 让报错的行列号不变"""
+    kind, text, line, col = tokens[0]
+    end_kind, end_text, end_line, end_col = tokens[-1]
+    end = end_col - 1 + len(end_text) + (2 if end_kind == "string" else 0)
+    if line == end_line:
+        body = lines[line - 1][col - 1 : end]
+    else:
+        body = lines[line - 1][col - 1 :] + "".join(lines[line : end_line - 1])
+        body += lines[end_line - 1][:end]
+    return "\n" * (line - 1) + " " * (col - 1) + body
+
+
+class IncrementalParser:
+    """增量解析和生成, 用于反复编译同一个文件(比如watch模式)
+
+    模块被切成顶层定义, 按指纹缓存每个定义的解析动作, 只有内容变化了的
+    定义才重新解析. 生成时把上一次的代码片段交给MibGenerator,
+    子树没有变化的scalar/table/notification直接复用
+    """
+
+    def __init__(self, engine="fast", compiler=None, generator_options=None):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown parser engine: {engine}")
+        self.engine = engine
+        self.compiler = compiler
+        self.generator_options = generator_options or {}
+        self.records = {}
+        self.fragments = {}
+        self.reused = 0
+        self.parsed = 0
+        self.fragment_hits = 0
+
+    def parse_definition(self, lines, tokens):
+        """解析一个顶层定义, 返回它的解析动作"""
+        recorder = RecordingContext()
+        if self.engine == "fast":
+            FastSmiParser(recorder).parse_item(tokens)
+        else:
+            parse_item(recorder, item_text(lines, tokens))
+        return recorder.records
+
+    def load(self, fname):
+        """解析fname, 返回ParseContext"""
+        with open(fname, encoding="utf-8") as f:
+            lines = f.readlines()
+        _, items = split_definitions(lines)
+
+        ctx = ParseContext()
+        ctx.module_name, ctx.imports = read_header(lines)
+        ctx.add_base("SNMPv2-SMI", ["private", "enterprises"])
+        if self.compiler is not None:
+            for source, symbols in ctx.imports.items():
+                self.compiler.import_symbols(ctx, source, symbols)
+
+        records = {}
+        self.reused = self.parsed = 0
+        for tokens in items:
+            key = fingerprint(tokens)
+            if key in self.records:
+                self.reused += 1
+                records[key] = self.records[key]
+            elif key not in records:
+                self.parsed += 1
+                records[key] = self.parse_definition(lines, tokens)
+            for name, fields in records[key]:
+                getattr(ctx, name)(dict(fields))
+        # 只保留这一次用到的定义, 删掉的定义不会一直留在内存里
+        self.records = records
+        ctx.link()
+        ctx.node_list.reverse()
+        ctx.resolve_types()
+        return ctx
+
+    def parse(self, fname):
+        """增量解析fname并生成.c/.h, 返回ParseContext"""
+        ctx = self.load(fname)
+        gen = MibGenerator(
+            ctx.node_list,
+            ctx.node_dict,
+            ctx.name_oid,
+            fname,
+            fragments=self.fragments,
+            **self.generator_options,
+        )
+        gen.process()
+        self.fragments = gen.new_fragments
+        self.fragment_hits = gen.fragment_hits
+        return ctx
@@ -0,0 +1,47 @@
+import bisect
+
+
+class OidIndex:
+    """按OID字典序排好的索引, 用于查找前缀, 遍历子树和GETNEXT
+
+    node_dict就是MibParser解析出来的 {oid: node}
+    """
+
+    def __init__(self, node_dict):
+        self.nodes = dict(node_dict)
+        self.oids = sorted(self.nodes)
+
+    def __len__(self):
+        return len(self.oids)
+
+    def __contains__(self, oid):
+        return tuple(oid) in self.nodes
+
+    def lookup(self, oid):
+        """精确查找, 没有时返回None"""
+        return self.nodes.get(tuple(oid))
+
+    def longest_prefix(self, oid):
+        """返回OID最长的已定义前缀对应的节点, 用于解析实例OID(如 ...1.0)"""
+        oid = tuple(oid)
+        for end in range(len(oid), 0, -1):
+            node = self.nodes.get(oid[:end])
+            if node is not None:
+                return node
+        return None
+
+    def iter_subtree(self, oid):
+        """按字典序遍历以oid为根的子树(包含oid本身)"""
+        oid = tuple(oid)
+        depth = len(oid)
+        for i in range(bisect.bisect_left(self.oids, oid), len(self.oids)):
+            if self.oids[i][:depth] != oid:
+                break
+            yield self.nodes[self.oids[i]]
+
+    def next_oid(self, oid):
+        """字典序中oid之后的第一个已定义OID, 没有时返回None"""
+        i = bisect.bisect_right(self.oids, tuple(oid))
+        if i == len(self.oids):
+            return None
+        return self.oids[i]
@@ -0,0 +1,24 @@
+import contextlib
+import os
+
+
+@contextlib.contextmanager
+def replace_file(fname, mode="w"):
+    """打开同一目录下的临时文件, 写完后改名为fname. 出错时删除临时文件,
+    不会留下写了一半的文件"""
+    # 不用mkstemp, 它创建的文件权限是0600, open按umask创建
+    tmp = f"{fname}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, mode, encoding=None if "b" in mode else "utf-8") as f:
+            yield f
+        os.replace(tmp, fname)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+
+def write_file(fname, text):
+    """用replace_file写入text"""
+    with replace_file(fname) as f:
+        f.write(text)
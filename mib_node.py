@@ -0,0 +1,97 @@
+import sys
+
+# 节点可能带的字段, 没有出现的字段为None
+FIELDS = (
+    "name",
+    "oid",
+    "parent",
+    "parent_name",
+    "subId",
+    "type",
+    "syntax",
+    "access",
+    "bounds",
+    "enums",
+    "units",
+    "index",
+    "syn_seq_of",
+    "objects",
+)
+
+# 这些字段的取值很少, intern之后所有节点共享同一个字符串
+INTERNED = ("type", "syntax", "access", "parent_name")
+
+
+class MibNode:
+    """MIB树上的一个节点
+
+    用__slots__代替每个节点一个dict, kids直接保存子节点.
+    保留了字典式的访问: node["name"], "enums" in node,
+    以及旧的kid元组下标 kid[0]..kid[3] 即 (name, type, subId, oid)
+    """
+
+    # type_info是解析后附加的SyntaxType, 不保存到缓存
+    __slots__ = FIELDS + ("kids", "type_info")
+
+    def __init__(self, **fields):
+        for field in FIELDS:
+            setattr(self, field, None)
+        self.type_info = None
+        for field in INTERNED:
+            value = fields.get(field)
+            if isinstance(value, str):
+                fields[field] = sys.intern(value)
+        for field in ("enums", "index", "objects"):
+            if fields.get(field) is not None:
+                fields[field] = tuple(fields[field])
+        for field, value in fields.items():
+            setattr(self, field, value)
+        self.kids = []
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return (self.name, self.type, self.subId, self.oid)[key]
+        if key not in SLOTS:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in SLOTS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in SLOTS and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        """同dict.get"""
+        if key in self:
+            return getattr(self, key)
+        return default
+
+    def keys(self):
+        """已设置的字段"""
+        return [key for key in self.__slots__ if getattr(self, key) is not None]
+
+    def items(self):
+        """已设置的字段和值"""
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def astuple(self):
+        """按FIELDS顺序的字段值, 不含kids"""
+        return tuple(getattr(self, field) for field in FIELDS)
+
+    def __eq__(self, other):
+        if not isinstance(other, MibNode):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{key}={getattr(self, key)!r}" for key in FIELDS if key in self)
+        return f"MibNode({fields})"
+
+
+SLOTS = frozenset(MibNode.__slots__)
@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from mib_bundle import open_bundle, scan_modules
+from mib_fast_parser import FastSmiParser
+from mib_incremental import RecordingContext
+from mib_parser import parse_chunk
+
+# 每段至少这么多字节, 段太小时传递记录的开销超过解析本身
+MIN_CHUNK = 64 * 1024
+# 每个进程平均分到的段数, 多分几段各进程的负载更均匀
+CHUNKS_PER_JOB = 4
+
+
+def parse_records(fname, start, end, line, engine, header):
+    """第一阶段: 在工作进程里解析fname的一段, 返回记录[(add_*, 字段)]
+
+    记录里只有parent_name和subId, 不需要前面的定义, 所以各段可以单独解析
+    """
+    with open_bundle(fname) as buf:
+        text = buf[start:end].decode("utf-8")
+    recorder = RecordingContext()
+    if engine == "fast":
+        FastSmiParser(recorder).parse_chunk(text, line, header)
+    else:
+        # 前面补上换行, 让报错的行号和文件里的一样
+        parse_chunk(recorder, "\n" * (line - 1) + text)
+    return recorder.records
+
+
+def add_records(ctx, records):
+    """把记录交给ctx, 第二阶段的链接由ctx.link完成"""
+    for name, fields in records:
+        getattr(ctx, name)(fields)
+
+
+def parse_parallel(ctx, fname, jobs, engine, span=None):
+    """把fname里的模块切成段, 在jobs个进程里解析, 再按顺序交给ctx
+
+    每一段的记录交给ctx以后马上链接, 和后面的段的解析同时进行. 父节点在
+    后面的段里的定义留到之后链接, 最后仍要调用ctx.link检查链接不上的定义.
+    span不为None时解析bundle里的这个模块. 找不到模块的范围时返回False,
+    这时ctx没有变化
+    """
+    with open_bundle(fname) as buf:
+        span = next(scan_modules(buf, items=True, within=span), None)
+    if span is None or not span.items:
+        return False
+    size = max(MIN_CHUNK, (span.end - span.start) // (jobs * CHUNKS_PER_JOB))
+    chunks = span.chunks(size)
+    # 第一段从模块头开始, 模块头和第一个定义之间的内容也要经过解析器
+    chunks[0] = (span.start, chunks[0][1], span.line)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(parse_records, fname, start, end, line, engine, i == 0)
+            for i, (start, end, line) in enumerate(chunks)
+        ]
+        for future in futures:
+            add_records(ctx, future.result())
+            ctx.link(strict=False)
+    return True
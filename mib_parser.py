@@ -1,11 +1,21 @@
+import argparse
+import bisect
+import contextlib
+import functools
+import os
+import re
 import sys
+import threading
 from pyparsing import (
     DelimitedList,
     Keyword,
     Literal,
     Optional,
     ParseException,
+    ParseExpression,
+    ParserElement,
     QuotedString,
+    StringEnd,
     Word,
     ZeroOrMore,
     alphanums,
@@ -13,329 +23,889 @@ from pyparsing import (
     nums,
     restOfLine,
 )
-from mib_generator import MibGenerator
-
-
-class MibParser:
-    """MIB解析器"""
+from mib_bundle import open_bundle
+from mib_cache import MibCache
+from mib_fast_parser import FastSmiParser, SmiSyntaxError
+from mib_generator import MAX_TRAP_QUEUE, MibGenerator
+from mib_node import MibNode
+from mib_types import resolve_syntax
+
+
+# 内置的基础模块, 不从文件解析. 只提供OID节点, 导入的类型和宏直接忽略
+BASE_MODULES = {
+    "SNMPv2-SMI": {
+        "iso": (1,),
+        "org": (1, 3),
+        "dod": (1, 3, 6),
+        "internet": (1, 3, 6, 1),
+        "directory": (1, 3, 6, 1, 1),
+        "mgmt": (1, 3, 6, 1, 2),
+        "mib-2": (1, 3, 6, 1, 2, 1),
+        "transmission": (1, 3, 6, 1, 2, 1, 10),
+        "experimental": (1, 3, 6, 1, 3),
+        "private": (1, 3, 6, 1, 4),
+        "enterprises": (1, 3, 6, 1, 4, 1),
+        "security": (1, 3, 6, 1, 5),
+        "snmpV2": (1, 3, 6, 1, 6),
+        "snmpDomains": (1, 3, 6, 1, 6, 1),
+        "snmpProxys": (1, 3, 6, 1, 6, 2),
+        "snmpModules": (1, 3, 6, 1, 6, 3),
+    },
+    "RFC1155-SMI": {
+        "internet": (1, 3, 6, 1),
+        "directory": (1, 3, 6, 1, 1),
+        "mgmt": (1, 3, 6, 1, 2),
+        "experimental": (1, 3, 6, 1, 3),
+        "private": (1, 3, 6, 1, 4),
+        "enterprises": (1, 3, 6, 1, 4, 1),
+    },
+    "RFC1213-MIB": {"mib-2": (1, 3, 6, 1, 2, 1)},
+    "SNMPv2-TC": {},
+    "SNMPv2-CONF": {},
+    "RFC-1212": {},
+    "RFC-1215": {},
+}
+
+
+def add_kid(parent, node):
+    """把node按subId插入parent.kids, kids始终按subId排序"""
+    bisect.insort(parent.kids, node, key=sub_id)
+
+
+def sub_id(node):
+    """节点的subId, 用作kids的排序键"""
+    return node.subId
+
+
+class MibLinkError(Exception):
+    """链接时有定义的父节点找不到, 或者父节点之间循环引用"""
+
+
+class ParseContext:
+    """单次解析的上下文, 解析动作把节点写到这里
+
+    解析动作只记下定义, 父节点在link里统一查找, 所以父节点可以定义在
+    子节点后面
+    """
 
     def __init__(self) -> None:
+        self.module_name = None
+        self.imports = {}
         self.node_list = []
         self.node_dict = {}
         self.name_oid = {}
-        self.bnf = self.smi_bnf()
-
-    def add_node(self, node):
-        """add_node"""
+        # TEXTUAL-CONVENTION和类型定义, 名字 -> syntax
+        self.textual_conventions = {}
+        # 还没有链接的定义, 按在文件里的顺序
+        self.unlinked = []
+        self.unlinked_names = set()
+
+    def add_imported(self, node):
+        """把其他模块定义的节点作为本模块的根节点, 父节点要先加"""
+        if node.oid in self.node_dict:
+            return
+        fields = {key: value for key, value in node.items() if key != "kids"}
+        node = MibNode(**fields)
+        self.node_list.append(node)
+        self.node_dict[node.oid] = node
+        self.name_oid[node.name] = node.oid
+        if node.parent in self.node_dict:
+            add_kid(self.node_dict[node.parent], node)
+
+    def add_base(self, module, names):
+        """从内置的基础模块导入names"""
+        base = BASE_MODULES[module]
+        for name in sorted(names, key=lambda name: len(base[name])):
+            oid = base[name]
+            self.add_imported(
+                MibNode(name=name, type="ident", subId=oid[-1], oid=oid, parent=oid[:-1])
+            )
+
+    def defined(self, name):
+        """name是否已经定义(包括导入的和还没有链接的)"""
+        return name in self.name_oid or name in self.unlinked_names
+
+    def add_unlinked(self, fields):
+        """记下一个定义, 等link时再加入树"""
+        self.unlinked.append(fields)
+        self.unlinked_names.add(fields["name"])
+
+    def add_node(self, fields):
+        """把父节点已经在树里的定义加入树, OBJECT-TYPE在这里按父节点区分column和scalar"""
+        parent = self.name_oid[fields["parent_name"]]
+        oid = parent + (int(fields["subId"]),)
+        fields["subId"] = int(fields["subId"])
+        parent_node = self.node_dict.get(parent)
+        if fields["type"] == "object" and parent_node is not None:
+            if parent_node["type"] == "row":
+                fields["type"] = "column"
+            elif parent_node["type"] == "ident":
+                fields["type"] = "scalar"
+        node = MibNode(oid=oid, parent=parent, **fields)
         self.node_list.append(node)
-        node["kids"] = []
-        oid = list(self.name_oid[node["parent_name"]])
-        node["parent"] = tuple(oid)
-        oid.append(int(node["subId"]))
-        self.node_dict[tuple(oid)] = node
-        self.name_oid[node["name"]] = tuple(oid)
-        if node["parent"] in self.node_dict:
-            parent = self.node_dict[node["parent"]]
-            kid = (node["name"], node["type"], node["subId"], tuple(oid))
-            parent["kids"].append(kid)
-
-    def object_type_action(self, toks):
-        """object_type_action"""
-        node = toks.asDict()
+        self.node_dict[oid] = node
+        self.name_oid[node.name] = oid
+        if parent_node is not None:
+            add_kid(parent_node, node)
+
+    def link(self, strict=True):
+        """把unlinked里的定义加入树, 每个定义只访问一次
+
+        按文件顺序处理, 父节点还没有加入时先沿parent_name把祖先加入, 所以
+        没有前向引用时加入的顺序和文件顺序相同. kids按subId插入,
+        树的形状和定义的先后无关. 找不到的父节点和循环引用一起报告;
+        strict为False时不报错, 链接不上的定义留在unlinked里
+        """
+        # 同名的定义以后面的为准, 和name_oid一样
+        pending = {fields["name"]: fields for fields in self.unlinked}
+        # id(定义) -> True已经加入, False链接不上
+        done = {}
+        missing = {}
+        cycles = []
+        for fields in self.unlinked:
+            chain = []
+            on_chain = set()
+            current = fields
+            while True:
+                key = id(current)
+                if key in done:
+                    ok = done[key]
+                    break
+                if key in on_chain:
+                    start = [id(item) for item in chain].index(key)
+                    cycles.append([item["name"] for item in chain[start:]])
+                    ok = False
+                    break
+                chain.append(current)
+                on_chain.add(key)
+                name = current["parent_name"]
+                current = pending.get(name)
+                if current is None:
+                    ok = name in self.name_oid
+                    if not ok:
+                        missing.setdefault(name, []).append(chain[-1]["name"])
+                    break
+            for item in reversed(chain):
+                if ok:
+                    self.add_node(item)
+                done[id(item)] = ok
+        self.unlinked = [fields for fields in self.unlinked if not done[id(fields)]]
+        self.unlinked_names = {fields["name"] for fields in self.unlinked}
+        if strict and self.unlinked:
+            errors = [
+                f"undefined parent {name!r} of {', '.join(map(repr, names))}"
+                for name, names in missing.items()
+            ]
+            errors += [f"circular parent {' -> '.join(map(repr, names))}" for names in cycles]
+            raise MibLinkError("; ".join(errors))
+
+    def add_object_type(self, node):
+        """add_object_type, column和scalar要等链接以后才能区分"""
         node["type"] = "object"
 
         if "syn_seq_of" in node.keys():
             node["type"] = "table"
         elif "index" in node.keys():
             node["type"] = "row"
-        elif self.node_dict[self.name_oid[node["parent_name"]]]["type"] == "row":
-            node["type"] = "column"
-        elif self.node_dict[self.name_oid[node["parent_name"]]]["type"] == "ident":
-            node["type"] = "scalar"
-        self.add_node(node)
-
-    def notify_type_action(self, toks):
-        """notify_type_action"""
-        node = toks.asDict()
+        self.add_unlinked(node)
+
+    def add_notify_type(self, node):
+        """add_notify_type"""
         node["type"] = "notification"
-        self.add_node(node)
+        self.add_unlinked(node)
 
-    def object_identifier_action(self, toks):
-        """object_identifier_action"""
-        node = toks.asDict()
+    def add_object_identifier(self, node):
+        """add_object_identifier"""
         node["type"] = "ident"
-        if node["name"] in self.name_oid:
+        if self.defined(node["name"]):
             print(f"OBJECT IDENTIFIER: {node['name']} repeat!")
             raise ParseException("de", msg="ddd")
         else:
-            self.add_node(node)
+            self.add_unlinked(node)
+
+    def add_textual_convention(self, node):
+        """add_textual_convention"""
+        if "syntax" in node:
+            self.textual_conventions[node["name"]] = node["syntax"]
 
-    def identity_action(self, toks):
-        """identify_action"""
-        node = toks.asDict()
+    def resolve_types(self):
+        """解析完成后给每个带SYNTAX的节点加上它的SyntaxType"""
+        for node in self.node_list:
+            if node.syntax is not None:
+                node.type_info = resolve_syntax(node.syntax, self.textual_conventions)
+
+    def add_identity(self, node):
+        """add_identity"""
         node["type"] = "ident"
-        if node["name"] in self.name_oid:
+        if self.defined(node["name"]):
             print(f"MODULE-IDENTITY: {node['name']} repeat!")
         else:
-            self.add_node(node)
-
-    def enums_action(self, toks):
-        """enums_action"""
-        enum_value = "(" + Word(nums).set_results_name("enum_value") + ")"
-        for i in range(1, len(toks.enums), 2):
-            try:
-                v = enum_value.parse_string(toks.enums[i])
-                toks.enums[i] = v.enum_value
-            except ParseException as _:
-                pass
-
-    def smi_bnf(self):
-        """smi_bnf"""
-        # punctuation
-        # pylint: disable=unused-variable
-        colon = Literal(":")
-        lbrace = Literal("{")
-        rbrace = Literal("}")
-        lbrack = Literal("[")
-        rbrack = Literal("]")
-        lparen = Literal("(")
-        rparen = Literal(")")
-        equals = Literal("=")
-        comma = Literal(",")
-        dot = Literal(".")
-        slash = Literal("/")
-        bslash = Literal("\\")
-        star = Literal("*")
-        semi = Literal(";")
-        langle = Literal("<")
-        rangle = Literal(">")
-
-        # keywords
-        assign_ = Keyword("::=")
-        define_ = Keyword("DEFINITIONS")
-        begin_ = Keyword("BEGIN")
-        end_ = Keyword("END")
-        imports_ = Keyword("IMPORTS")
-        from_ = Keyword("FROM")
-        identity_ = Keyword("MODULE-IDENTITY")
-        updated_ = Keyword("LAST-UPDATED")
-        org_ = Keyword("ORGANIZATION")
-        contact_ = Keyword("CONTACT-INFO")
-        revision_ = Keyword("REVISION")
-        descr_ = Keyword("DESCRIPTION")
-        object_ = Keyword("OBJECT")
-        objects_ = Keyword("OBJECTS")
-        notify_type_ = Keyword("NOTIFICATION-TYPE")
-        identifier_ = Keyword("IDENTIFIER")
-        octet_ = Keyword("OCTET")
-        string_ = Keyword("STRING")
-        obj_type_ = Keyword("OBJECT-TYPE")
-        syntax_ = Keyword("SYNTAX")
-        units_ = Keyword("UNITS")
-        access_ = Keyword("ACCESS")
-        max_access_ = Keyword("MAX-ACCESS")
-        status_ = Keyword("STATUS")
-        reference_ = Keyword("REFERENCE")
-        index_ = Keyword("INDEX")
-        sequence_ = Keyword("SEQUENCE")
-        of_ = Keyword("OF")
-        size_ = Keyword("SIZE")
-
-        identifier = Word(alphas + "-", alphanums + "-").set_name("identifier")
-        text = QuotedString('"', multiline=True)
-        sub_id = Word(nums)
-
-        imports_list = DelimitedList(identifier)
-        imports_item = imports_list + from_ + identifier
-        # IMPORTS
-        imports_def = imports_ + ZeroOrMore(imports_item) + semi
-
-        # { enterprises 12345 }
-        assignment = (
-            lbrace
-            + identifier.set_results_name("parent_name")
-            + sub_id.set_results_name("subId")
-            + rbrace
-        )
+            self.add_unlinked(node)
 
-        # suppress 只用来匹配，不作为结果输出
-        updated = (updated_ + text).suppress()
-        org = (org_ + text).suppress()
-        contact = (contact_ + text).suppress()
-        descr = (descr_ + text).suppress()
-        reference = (reference_ + text).suppress()
-        revision = (revision_ + text).suppress()
-        revision_item = revision + descr
-
-        identity_body = updated + org + contact + descr + ZeroOrMore(revision_item)
-        # MODULE-IDENTITY
-        identity_def = (
-            identifier.set_results_name("name")
-            + identity_
-            + identity_body
-            + assign_
-            + assignment
-        ).set_parse_action(self.identity_action)
-
-        # OBJECT IDENTIFIER
-        object_identifier = (
-            identifier.set_results_name("name")
-            + object_
-            + identifier_
-            + assign_
-            + assignment
-        ).set_parse_action(self.object_identifier_action)
-
-        # 范围
-        bounds = QuotedString("(", endQuoteChar=")").set_results_name("bounds")
-        size_def = Word("(", max=1) + size_ + bounds + Word(")", max=1)
-        # 枚举
-        syntax_enum_item = identifier + Word("(" + nums + ")")
-        syntax_enum = (
-            lbrace
-            + DelimitedList(syntax_enum_item)
-            .set_results_name("enums")
-            .set_parse_action(self.enums_action)
-            + rbrace
-        )
 
-        syntax_opts = (syntax_enum | size_def | bounds).set_name("syntaxOpts")
+# 当前线程正在使用的ParseContext, 共享的语法通过它找到结果写到哪里
+_active = threading.local()
 
-        integer = identifier.set_results_name("syntax") + Optional(syntax_opts)
-        sequence_of = sequence_ + of_ + identifier.set_results_name("syn_seq_of")
-        syn_obj_id = (object_ + identifier_).set_results_name("syntax")
-        syn_octet_string = (
-            octet_.set_results_name("syntax") + string_ + Optional(size_def)
-        )
-        syntax = syntax_ + (syn_obj_id | syn_octet_string | sequence_of | integer)
-        units = units_ + text.set_results_name("units")
-        access = (max_access_ | access_) + identifier.set_results_name("access")
-        status = status_ + identifier
-        index_def = (
-            index_
-            + lbrace
-            + DelimitedList(identifier).set_results_name("index")
-            + rbrace
-        )
 
-        object_body = (
-            syntax
-            + Optional(units)
-            + access
-            + status
-            + Optional(descr)
-            + Optional(reference)
-            + Optional(index_def)
-        )
-        # OBJECT-TYPE
-        object_type = (
-            identifier.set_results_name("name")
-            + obj_type_
-            + object_body
-            + assign_
-            + assignment
-        ).set_parse_action(self.object_type_action)
-
-        # TABLE ENTRY
-        sequence_def = (
-            identifier
-            + assign_
-            + sequence_
-            + QuotedString("{", multiline=True, endQuoteChar="}")
-        )
+def _context_action(name):
+    """把解析动作转发给当前的ParseContext"""
 
-        nofify_objects = (
-            objects_
-            + lbrace
-            + DelimitedList(identifier).set_results_name("objects")
-            + rbrace
-        )
-        notify_body = nofify_objects + Optional(access) + status + Optional(descr)
-        # NOTIFICATION-TYPE
-        notify_type = (
-            identifier.set_results_name("name")
-            + notify_type_
-            + notify_body
-            + assign_
-            + assignment
-        ).set_parse_action(self.notify_type_action)
-
-        # textualConv = (
-        #     (
-        #         lineStart
-        #         + identifier
-        #         + White()
-        #         + assign_
-        #         + White()
-        #         + OneOrMore(Word(alphas) + White(" \t"))
-        #         + lineEnd
-        #     )
-        #     .leaveWhitespace()
-        #     .setDebug()
-        # )
-        module_item = (
-            imports_def
-            | identity_def
-            | object_identifier
-            | object_type
-            | sequence_def
-            | notify_type
-        )
-        module_def = (
-            identifier + define_ + assign_ + begin_ + ZeroOrMore(module_item) + end_
-        )
+    def action(toks):
+        return getattr(_active.ctx, name)(toks.asDict())
 
-        bnf = module_def
+    return action
 
-        single_line_comment = "--" + restOfLine
-        bnf.ignore(single_line_comment)
 
-        return bnf
+class KeywordDispatch(ParseExpression):
+    """根据定义开头的关键字直接选择子语法, 不再按顺序逐个尝试
 
-    def parse(self, fname):
-        """parse"""
-        private = {
-            "subId": 4,
-            "type": "ident",
-            "name": "private",
-            "parent": (1, 3, 6, 1),
-            "kids": [("enterprises", "ident", "1")],
-        }
-        enterprises = {
-            "subId": 1,
-            "type": "ident",
-            "name": "enterprises",
-            "parent": (1, 3, 6, 1, 4),
-            "kids": [],
-        }
-        self.node_dict[(1, 3, 6, 4)] = private
-        self.node_dict[(1, 3, 6, 4, 1)] = enterprises
-        self.name_oid["enterprises"] = (1, 3, 6, 4, 1)
-        self.name_oid["private"] = (1, 3, 6, 4)
-        self.node_list.append(private)
-        self.node_list.append(enterprises)
+    peek是一个带命名分组的正则, 匹配成功的分组名就是dispatch的key,
+    匹配不上时退回到fallback(原来的有序选择)
+    """
 
-        try:
-            self.bnf.parse_file(fname)
+    def __init__(self, peek, dispatch, fallback):
+        super().__init__(list(dispatch.values()) + [fallback])
+        self.peek = peek
+        self.dispatch = dispatch
+        self.fallback = fallback
+        self._may_return_empty = False
+        self.skipWhitespace = all(e.skipWhitespace for e in self.exprs)
+
+    def parseImpl(self, instring, loc, do_actions=True):
+        match = self.peek.match(instring, self.preParse(instring, loc))
+        expr = self.fallback
+        if match:
+            expr = self.dispatch[match.lastgroup]
+        return expr._parse(instring, loc, do_actions)
+
+    def _generateDefaultName(self):
+        return f"KeywordDispatch:({', '.join(self.dispatch)})"
+
+
+# 定义开头: IMPORTS 或者 "名字 关键字"
+MODULE_ITEM_PEEK = re.compile(
+    r"(?P<imports>IMPORTS)(?![\w-])"
+    r"|[A-Za-z-][A-Za-z0-9-]*\s+(?:"
+    r"(?P<identity>MODULE-IDENTITY)"
+    r"|(?P<object_identifier>OBJECT\s+IDENTIFIER)"
+    r"|(?P<object_type>OBJECT-TYPE)"
+    r"|(?P<notify_type>NOTIFICATION-TYPE)"
+    r"|(?P<sequence>::=\s*SEQUENCE)"
+    r"|(?P<textual_convention>::=\s*TEXTUAL-CONVENTION)"
+    r"|(?P<type_assignment>::=)"
+    r")(?![\w-])"
+)
+
+
+def smi_bnf():
+    """smi_bnf, 返回(整个模块的语法, 单个顶层定义的语法, 模块中一段定义的语法)"""
+    # punctuation
+    # pylint: disable=unused-variable
+    colon = Literal(":")
+    lbrace = Literal("{")
+    rbrace = Literal("}")
+    lbrack = Literal("[")
+    rbrack = Literal("]")
+    lparen = Literal("(")
+    rparen = Literal(")")
+    equals = Literal("=")
+    comma = Literal(",")
+    dot = Literal(".")
+    slash = Literal("/")
+    bslash = Literal("\\")
+    star = Literal("*")
+    semi = Literal(";")
+    langle = Literal("<")
+    rangle = Literal(">")
+
+    # keywords
+    assign_ = Keyword("::=")
+    define_ = Keyword("DEFINITIONS")
+    begin_ = Keyword("BEGIN")
+    end_ = Keyword("END")
+    imports_ = Keyword("IMPORTS")
+    from_ = Keyword("FROM")
+    identity_ = Keyword("MODULE-IDENTITY")
+    updated_ = Keyword("LAST-UPDATED")
+    org_ = Keyword("ORGANIZATION")
+    contact_ = Keyword("CONTACT-INFO")
+    revision_ = Keyword("REVISION")
+    descr_ = Keyword("DESCRIPTION")
+    object_ = Keyword("OBJECT")
+    objects_ = Keyword("OBJECTS")
+    notify_type_ = Keyword("NOTIFICATION-TYPE")
+    identifier_ = Keyword("IDENTIFIER")
+    octet_ = Keyword("OCTET")
+    string_ = Keyword("STRING")
+    obj_type_ = Keyword("OBJECT-TYPE")
+    syntax_ = Keyword("SYNTAX")
+    units_ = Keyword("UNITS")
+    access_ = Keyword("ACCESS")
+    max_access_ = Keyword("MAX-ACCESS")
+    status_ = Keyword("STATUS")
+    reference_ = Keyword("REFERENCE")
+    index_ = Keyword("INDEX")
+    sequence_ = Keyword("SEQUENCE")
+    of_ = Keyword("OF")
+    size_ = Keyword("SIZE")
+    tc_ = Keyword("TEXTUAL-CONVENTION")
+    display_hint_ = Keyword("DISPLAY-HINT")
+
+    identifier = Word(alphas + "-", alphanums + "-").set_name("identifier")
+    text = QuotedString('"', multiline=True)
+    sub_id = Word(nums)
+
+    imports_list = DelimitedList(identifier)
+    imports_item = imports_list + from_ + identifier
+    # IMPORTS
+    imports_def = imports_ + ZeroOrMore(imports_item) + semi
+
+    # { enterprises 12345 }
+    assignment = (
+        lbrace
+        + identifier.set_results_name("parent_name")
+        + sub_id.set_results_name("subId")
+        + rbrace
+    )
+
+    # suppress 只用来匹配，不作为结果输出
+    updated = (updated_ + text).suppress()
+    org = (org_ + text).suppress()
+    contact = (contact_ + text).suppress()
+    descr = (descr_ + text).suppress()
+    reference = (reference_ + text).suppress()
+    revision = (revision_ + text).suppress()
+    revision_item = revision + descr
+
+    identity_body = updated + org + contact + descr + ZeroOrMore(revision_item)
+    # MODULE-IDENTITY
+    identity_def = (
+        identifier.set_results_name("name")
+        + identity_
+        + identity_body
+        + assign_
+        + assignment
+    ).set_parse_action(_context_action("add_identity"))
+
+    # OBJECT IDENTIFIER
+    object_identifier = (
+        identifier.set_results_name("name")
+        + object_
+        + identifier_
+        + assign_
+        + assignment
+    ).set_parse_action(_context_action("add_object_identifier"))
+
+    # 范围
+    bounds = QuotedString("(", endQuoteChar=")").set_results_name("bounds")
+    size_def = Word("(", max=1) + size_ + bounds + Word(")", max=1)
+    # 枚举, 每一项解析成(label, value)
+    syntax_enum_item = (
+        identifier + lparen.suppress() + sub_id + rparen.suppress()
+    ).set_parse_action(lambda toks: [(toks[0], int(toks[1]))])
+    syntax_enum = (
+        lbrace + DelimitedList(syntax_enum_item).set_results_name("enums") + rbrace
+    )
+
+    syntax_opts = (syntax_enum | size_def | bounds).set_name("syntaxOpts")
+
+    integer = identifier.set_results_name("syntax") + Optional(syntax_opts)
+    sequence_of = sequence_ + of_ + identifier.set_results_name("syn_seq_of")
+    syn_obj_id = object_.set_results_name("syntax") + identifier_
+    syn_octet_string = (
+        octet_.set_results_name("syntax") + string_ + Optional(size_def)
+    )
+    syntax_value = syn_obj_id | syn_octet_string | sequence_of | integer
+    syntax = syntax_ + syntax_value
+    units = units_ + text.set_results_name("units")
+    access = (max_access_ | access_) + identifier.set_results_name("access")
+    status = status_ + identifier
+    index_def = (
+        index_
+        + lbrace
+        + DelimitedList(identifier).set_results_name("index")
+        + rbrace
+    )
+
+    object_body = (
+        syntax
+        + Optional(units)
+        + access
+        + status
+        + Optional(descr)
+        + Optional(reference)
+        + Optional(index_def)
+    )
+    # OBJECT-TYPE
+    object_type = (
+        identifier.set_results_name("name")
+        + obj_type_
+        + object_body
+        + assign_
+        + assignment
+    ).set_parse_action(_context_action("add_object_type"))
+
+    # TABLE ENTRY
+    sequence_def = (
+        identifier
+        + assign_
+        + sequence_
+        + QuotedString("{", multiline=True, endQuoteChar="}")
+    )
+
+    nofify_objects = (
+        objects_
+        + lbrace
+        + DelimitedList(identifier).set_results_name("objects")
+        + rbrace
+    )
+    notify_body = nofify_objects + Optional(access) + status + Optional(descr)
+    # NOTIFICATION-TYPE
+    notify_type = (
+        identifier.set_results_name("name")
+        + notify_type_
+        + notify_body
+        + assign_
+        + assignment
+    ).set_parse_action(_context_action("add_notify_type"))
+
+    display_hint = (display_hint_ + text).suppress()
+    # TEXTUAL-CONVENTION
+    textual_convention = (
+        identifier.set_results_name("name")
+        + assign_
+        + tc_
+        + Optional(display_hint)
+        + status
+        + descr
+        + Optional(reference)
+        + syntax
+    ).set_parse_action(_context_action("add_textual_convention"))
+
+    # 类型定义 X ::= INTEGER (0..5)
+    type_assignment = (
+        identifier.set_results_name("name") + assign_ + syntax_value
+    ).set_parse_action(_context_action("add_textual_convention"))
+
+    module_item = KeywordDispatch(
+        MODULE_ITEM_PEEK,
+        {
+            "imports": imports_def,
+            "identity": identity_def,
+            "object_identifier": object_identifier,
+            "object_type": object_type,
+            "notify_type": notify_type,
+            "sequence": sequence_def,
+            "textual_convention": textual_convention,
+            "type_assignment": type_assignment,
+        },
+        imports_def
+        | identity_def
+        | object_identifier
+        | object_type
+        | sequence_def
+        | textual_convention
+        | type_assignment
+        | notify_type,
+    )
+    module_header = identifier + define_ + assign_ + begin_
+    module_def = module_header + ZeroOrMore(module_item) + end_
+    # ModuleSpan.chunks切出来的一段, 第一段从模块头开始
+    chunk_def = Optional(module_header) + ZeroOrMore(module_item) + StringEnd()
+
+    bnf = module_def
+
+    single_line_comment = "--" + restOfLine
+    bnf.ignore(single_line_comment)
+    chunk_def.ignore(single_line_comment)
+
+    return bnf, module_item, chunk_def
+
+
+@functools.cache
+def smi_grammar():
+    """整个进程共享同一个语法, 只在第一次调用时构建"""
+    return smi_bnf()
+
+
+def get_bnf():
+    """整个模块的语法"""
+    return smi_grammar()[0]
+
+
+def get_item_bnf():
+    """单个顶层定义的语法"""
+    return smi_grammar()[1]
+
+
+def get_chunk_bnf():
+    """模块中一段顶层定义的语法"""
+    return smi_grammar()[2]
+
+
+def enable_packrat(cache_size=128):
+    """打开packrat缓存, cache_size为None时不限制缓存大小"""
+    ParserElement.enable_packrat(cache_size_limit=cache_size)
+
+
+def packrat_stats():
+    """最近一次解析的packrat缓存命中和未命中次数"""
+    hits, misses = ParserElement.packrat_cache_stats[:2]
+    return hits, misses
+
+
+@contextlib.contextmanager
+def active_context(ctx):
+    """解析期间让共享语法的解析动作写入ctx"""
+    prev = getattr(_active, "ctx", None)
+    _active.ctx = ctx
+    try:
+        yield ctx
+    finally:
+        _active.ctx = prev
+
+
+def parse_file(ctx, fname):
+    """用共享的语法解析fname, 结果写入ctx"""
+    with active_context(ctx):
+        get_bnf().parse_file(fname)
+
+
+def parse_string(ctx, text):
+    """用共享的语法解析模块原文text, 结果写入ctx"""
+    with active_context(ctx):
+        get_bnf().parse_string(text)
+
+
+def parse_chunk(ctx, text):
+    """用共享的语法解析模块中的一段顶层定义, 结果写入ctx"""
+    with active_context(ctx):
+        get_chunk_bnf().parse_string(text)
+
+
+def parse_item(ctx, text):
+    """用共享的语法解析一个顶层定义, 结果写入ctx"""
+    with active_context(ctx):
+        get_item_bnf().parse_string(text, parse_all=True)
+
+
+ENGINES = ("pyparsing", "fast")
+
+# 语法或者节点结构变化时修改, 旧的磁盘缓存随之失效
+PARSER_VERSION = "2"
+
+
+class MibParser:
+    """MIB解析器"""
+
+    def __init__(
+        self,
+        packrat=False,
+        packrat_cache=128,
+        engine="pyparsing",
+        cache_dir=None,
+        generator_options=None,
+        parse_jobs=1,
+    ) -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"unknown parser engine: {engine}")
+        self.engine = engine
+        # 大于1时把模块切成段, 在这么多个进程里并行解析
+        self.parse_jobs = parse_jobs
+        # 传给MibGenerator的参数
+        self.generator_options = generator_options or {}
+        self.packrat = packrat
+        if packrat:
+            enable_packrat(packrat_cache)
+        self.cache = MibCache(cache_dir, PARSER_VERSION) if cache_dir else None
+        self.cached = False
+        self.ctx = ParseContext()
+        self.node_list = self.ctx.node_list
+        self.node_dict = self.ctx.node_dict
+        self.name_oid = self.ctx.name_oid
+
+    @property
+    def bnf(self):
+        """共享的pyparsing语法, 缓存命中时不会构建"""
+        return get_bnf()
+
+    def load(self, fname, span=None):
+        """只解析fname不生成代码, 出错时抛出异常
+
+        span不为None时只解析fname里的这一个模块(MIB bundle里的ModuleSpan)
+        """
+        # pylint: disable=import-outside-toplevel
+        from mib_parallel import parse_parallel
+
+        key = None
+        if self.cache is not None:
+            data = None
+            if span is not None:
+                with open_bundle(fname) as buf:
+                    data = buf[span.start : span.end]
+            key = self.cache.key(fname, self.ctx, data)
+            self.cached = self.cache.load(key, self.ctx)
+        if not self.cached:
+            # 找不到模块范围时不能切分, 按顺序解析, 由解析器报错
+            if self.parse_jobs <= 1 or not parse_parallel(
+                self.ctx, fname, self.parse_jobs, self.engine, span
+            ):
+                self.parse_module(fname, span)
+            self.ctx.link()
             self.node_list.reverse()
-            print("Parsing of " + fname + " complete.")
+            if key is not None:
+                self.cache.store(key, self.ctx)
+        self.ctx.resolve_types()
+
+    def parse_module(self, fname, span=None):
+        """在当前进程里按顺序解析fname(或者它的span范围)"""
+        if span is None and self.engine == "fast":
+            FastSmiParser(self.ctx).parse_file(fname)
+        elif span is None:
+            parse_file(self.ctx, fname)
+        else:
+            with open_bundle(fname) as buf:
+                text = span.text(buf)
+            if self.engine == "fast":
+                FastSmiParser(self.ctx).parse(text, span.line)
+            else:
+                # 前面补上换行, 让报错的行号和文件里的一样
+                parse_string(self.ctx, "\n" * (span.line - 1) + text)
 
-            gen = MibGenerator(self.node_list, self.node_dict, self.name_oid, fname)
+    def parse(self, fname):
+        """parse, 成功时返回True"""
+        self.ctx.add_base("SNMPv2-SMI", ["private", "enterprises"])
+        try:
+            self.load(fname)
+            print("Parsing of " + fname + " complete.")
+            if self.cached:
+                print("(loaded from cache)")
+            elif self.packrat:
+                hits, misses = packrat_stats()
+                print(f"packrat cache: {hits} hits, {misses} misses")
+
+            gen = MibGenerator(
+                self.node_list,
+                self.node_dict,
+                self.name_oid,
+                fname,
+                **self.generator_options,
+            )
             gen.process()
-        except ParseException as err:
-            print(err.line)
-            print(" " * (err.column - 1) + "^")
-            print(err)
-        except IOError as _:
-            print("could not open input mib file " + fname)
-        finally:
+        except (ParseException, SmiSyntaxError, OSError, MibLinkError) as err:
+            print_error(err, fname)
+            return False
+        return True
+
+
+def print_error(err, fname):
+    """输出解析错误"""
+    if isinstance(err, ParseException):
+        print(err.line)
+        print(" " * (err.column - 1) + "^")
+        print(err)
+    elif isinstance(err, OSError):
+        print("could not open input mib file " + fname)
+    else:
+        print(err)
+
+
+def int_range(low, high=None):
+    """argparse的type, 取值在low..high之内的整数, 没有high时不限上限"""
+
+    def parse(text):
+        try:
+            value = int(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid int value: {text!r}") from None
+        if value < low or (high is not None and value > high):
+            bounds = f"between {low} and {high}" if high is not None else f"at least {low}"
+            raise argparse.ArgumentTypeError(f"must be {bounds}, got {value}")
+        return value
+
+    return parse
+
+
+def main():
+    """命令行入口"""
+    # pylint: disable=import-outside-toplevel
+    from mib_bundle import is_bundle
+    from mib_compiler import MibCompileError, MibCompiler, compile_batch
+    from mib_export import export_tree
+    from mib_watch import MibWatcher
+
+    arg_parser = argparse.ArgumentParser(prog="mib_parser.py")
+    arg_parser.add_argument("mib_files", nargs="*", metavar="mib_file")
+    arg_parser.add_argument(
+        "--packrat", action="store_true", help="enable packrat memoization"
+    )
+    arg_parser.add_argument(
+        "--packrat-cache",
+        type=int,
+        default=128,
+        metavar="N",
+        help="packrat cache size, 0 for unbounded (default: 128)",
+    )
+    arg_parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="pyparsing",
+        help="parser engine, fast uses the hand-written tokenizer (default: pyparsing)",
+    )
+    arg_parser.add_argument(
+        "-I",
+        "--mib-path",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="resolve IMPORTS from MIB files in DIR (may be repeated)",
+    )
+    arg_parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        help="cache parsed MIBs in DIR, unchanged files are not parsed again",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int_range(1),
+        metavar="N",
+        help="compile the files in N worker processes (default: one per CPU)",
+    )
+    arg_parser.add_argument(
+        "--parse-jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="split each module at top-level definitions and parse the parts in "
+        "N worker processes (default: 1)",
+    )
+    arg_parser.add_argument(
+        "--export",
+        metavar="FILE",
+        help="also write the parsed OID tree to FILE in the binary format read by "
+        "mib_export.MibTree (single MIB module only)",
+    )
+    arg_parser.add_argument(
+        "--watch",
+        metavar="DIR",
+        help="keep running and regenerate the MIB files in DIR whenever they change",
+    )
+    arg_parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="how often --watch checks for changes (default: 1.0)",
+    )
+    arg_parser.add_argument(
+        "--dispatch-threshold",
+        type=int,
+        default=0,
+        metavar="N",
+        help="dispatch scalar arrays with at least N members through a function table "
+        "instead of a switch (default: 0, disabled)",
+    )
+    arg_parser.add_argument(
+        "--row-storage",
+        type=int,
+        default=0,
+        metavar="ROWS",
+        help="generate static row storage of up to ROWS rows for each table "
+        "(default: 0, disabled)",
+    )
+    arg_parser.add_argument(
+        "--trap-queue",
+        type=int_range(0, MAX_TRAP_QUEUE),
+        default=0,
+        metavar="N",
+        help=f"generate a queue of up to N (at most {MAX_TRAP_QUEUE}) notifications with "
+        "queue_trap_* and a rate-limited <module>_flush_traps (default: 0, disabled)",
+    )
+    args = arg_parser.parse_args()
+    generator_options = {
+        "dispatch_threshold": args.dispatch_threshold,
+        "row_storage": args.row_storage,
+        "trap_queue": args.trap_queue,
+    }
+    if args.watch and args.export:
+        arg_parser.error("--export cannot be used with --watch")
+    if args.watch:
+        if args.packrat:
+            enable_packrat(args.packrat_cache or None)
+        watcher = MibWatcher(
+            args.watch,
+            args.mib_path,
+            engine=args.engine,
+            interval=args.interval,
+            generator_options=generator_options,
+        )
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
             pass
+        return 0
+    if not args.mib_files:
+        arg_parser.error("the following arguments are required: mib_file")
+    batch = len(args.mib_files) > 1 or args.jobs or is_bundle(args.mib_files[0])
+    if args.export and batch:
+        arg_parser.error("--export needs a single MIB module")
+    if batch:
+        results = compile_batch(
+            args.mib_files,
+            jobs=args.jobs,
+            search_path=args.mib_path,
+            engine=args.engine,
+            cache_dir=args.cache_dir,
+            generator_options=generator_options,
+            parse_jobs=args.parse_jobs,
+        )
+        for fname, error in results:
+            print(f"{fname}: {'ok' if error is None else error}")
+        failed = sum(error is not None for _, error in results)
+        print(f"{len(results) - failed} succeeded, {failed} failed.")
+        return 1 if failed else 0
+
+    fname = args.mib_files[0]
+    if not args.mib_path:
+        parse = MibParser(
+            packrat=args.packrat,
+            packrat_cache=args.packrat_cache or None,
+            engine=args.engine,
+            cache_dir=args.cache_dir,
+            generator_options=generator_options,
+            parse_jobs=args.parse_jobs,
+        )
+        if not parse.parse(fname):
+            return 1
+        if args.export:
+            export_tree(parse.node_dict, args.export)
+        return 0
+
+    if args.packrat:
+        enable_packrat(args.packrat_cache or None)
+    compiler = MibCompiler(
+        [os.path.dirname(fname) or "."] + args.mib_path,
+        engine=args.engine,
+        cache_dir=args.cache_dir,
+        parse_jobs=args.parse_jobs,
+    )
+    try:
+        ctx = compiler.compile_file(fname)
+        print(f"Compiling of {fname} complete, {len(compiler.modules)} modules.")
+        gen = MibGenerator(
+            ctx.node_list, ctx.node_dict, ctx.name_oid, fname, **generator_options
+        )
+        gen.process()
+    except (
+        ParseException, SmiSyntaxError, OSError, MibCompileError, MibLinkError
+    ) as err:
+        print_error(err, fname)
+        return 1
+    if args.export:
+        export_tree(ctx.node_dict, args.export)
+    return 0
 
 
 if __name__ == "__main__":
-    args = sys.argv[1:]
-    if len(args) != 1:
-        print("usage: mib_parser.py <mib-file>")
-    else:
-        parse = MibParser()
-        parse.parse(args[0])
+    sys.exit(main())
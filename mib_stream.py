@@ -0,0 +1,59 @@
+import os
+
+from mib_compiler import MibCompiler
+from mib_fast_parser import FastSmiParser, tokenize
+from mib_parser import ParseContext
+from mib_types import resolve_syntax
+
+
+class StreamContext(ParseContext):
+    """iter_nodes用的ParseContext
+
+    新节点放进pending等待取走, 不保存node_list. node_dict和name_oid
+    仍然保留, 后面的定义和导入这个模块的模块要用它们查找父节点
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pending = []
+
+    def add_node(self, fields):
+        super().add_node(fields)
+        self.pending.append(self.node_list.pop())
+
+
+def iter_nodes(source, search_path=(), engine="fast"):
+    """边解析边返回节点, 每解析完一个顶层定义就返回它产生的MibNode
+
+    source是文件路径, 或者按行迭代的文本(比如打开的文件). 可以是多个
+    DEFINITIONS ::= BEGIN ... END 拼在一起的MIB包, 按行读取, 不会一次读入整个文件.
+    IMPORTS先在前面已经读到的模块里找, 再到search_path里编译(用engine).
+    节点的type_info按已经读到的TEXTUAL-CONVENTION确定. 父节点定义在后面的节点
+    等父节点出现以后再返回
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding="utf-8") as f:
+            yield from iter_nodes(f, search_path, engine)
+        return
+    compiler = MibCompiler(search_path, engine=engine)
+    parser = FastSmiParser(None)
+    parser.tokens = tokenize(source)
+    parser.tok = next(parser.tokens)
+    while parser.tok[0] != "eof":
+        ctx = parser.ctx = StreamContext()
+        ctx.module_name, ctx.imports = parser.header()
+        ctx.add_base("SNMPv2-SMI", ["private", "enterprises"])
+        for module, symbols in ctx.imports.items():
+            compiler.import_symbols(ctx, module, symbols)
+        while not parser.peek("END"):
+            parser.module_item()
+            # 父节点还没有出现的定义等后面的定义链接
+            ctx.link(strict=False)
+            for node in ctx.pending:
+                if node.syntax is not None:
+                    node.type_info = resolve_syntax(node.syntax, ctx.textual_conventions)
+                yield node
+            ctx.pending.clear()
+        parser.advance()
+        ctx.link()
+        compiler.modules[ctx.module_name] = ctx
@@ -0,0 +1,690 @@
+# 生成C代码用的模板, 模块加载时编译成函数, 生成时用节点的NodeContext填充.
+# 模板里的 {c.xxx} 是NodeContext的属性, {c.syntax.xxx} 是它的SyntaxContext的属性, {{ }} 是C代码里的花括号
+
+import ast
+
+# 模板可以使用的参数
+TEMPLATE_ARGS = (
+    "c",
+    "max_index",
+    "row",
+    "set_funcs",
+    "other",
+    "op",
+    "size",
+    "key_len",
+    "max_len",
+    "i",
+    "module",
+)
+
+
+def template(text):
+    """把模板编译成返回f-string的函数, 比每次str.format解析模板快
+
+    函数只有模板里用到的参数, 没有默认值, 都要用关键字传入. 少传或者多传
+    参数时直接报错, 不会把None写进生成的代码
+    """
+    source = f"f{text!r}"
+    tree = ast.parse(source, mode="eval")
+    args = sorted({node.id for node in ast.walk(tree) if isinstance(node, ast.Name)})
+    unknown = set(args) - set(TEMPLATE_ARGS)
+    if unknown:
+        raise ValueError(f"unknown template arguments {sorted(unknown)} in {text!r}")
+    params = f"*, {', '.join(args)}" if args else ""
+    return eval(f"lambda {params}: {source}")  # pylint: disable=eval-used
+
+
+# 函数签名, 定义和extern声明共用
+SCALAR_ARRAY_GET = template(
+    "s16_t {c.name}_get_value(const struct snmp_scalar_array_node_def *scalar, "
+    "void *value)"
+)
+SCALAR_ARRAY_TEST = template(
+    "snmp_err_t {c.name}_set_test(const struct snmp_scalar_array_node_def *scalar, "
+    "u16_t len, void *value)"
+)
+SCALAR_ARRAY_SET = template(
+    "snmp_err_t {c.name}_set_value(const struct snmp_scalar_array_node_def *scalar, "
+    "u16_t len, void *value)"
+)
+TABLE_GET_CELL_VALUE = template(
+    "snmp_err_t {c.parent_name}_get_cell_value(const u32_t *column, "
+    "const u32_t *row_oid, u8_t row_oid_len, union snmp_variant_value *value, "
+    "u32_t *value_len)"
+)
+TABLE_GET_NEXT_CELL_INSTANCE_AND_VALUE = template(
+    "snmp_err_t {c.parent_name}_get_next_cell_instance_and_value("
+    "const u32_t *column, struct snmp_obj_id *row_oid, "
+    "union snmp_variant_value *value, u32_t *value_len)"
+)
+TABLE_GET_CELL_INSTANCE = template(
+    "snmp_err_t {c.parent_name}_get_cell_instance(const u32_t *column, "
+    "const u32_t *row_oid, u8_t row_oid_len, struct snmp_node_instance *cell_instance)"
+)
+TABLE_GET_NEXT_CELL_INSTANCE = template(
+    "snmp_err_t {c.parent_name}_get_next_cell_instance(const u32_t *column, "
+    "struct snmp_obj_id *row_oid, struct snmp_node_instance *cell_instance)"
+)
+TABLE_GET_VALUE = template(
+    "s16_t {c.parent_name}_get_value(struct snmp_node_instance *instance, void *value)"
+)
+TABLE_SET_TEST = template(
+    "snmp_err_t {c.parent_name}_set_test"
+    "(struct snmp_node_instance *instance, u16_t len, void *value)"
+)
+TABLE_SET_VALUE = template(
+    "snmp_err_t {c.parent_name}_set_value"
+    "(struct snmp_node_instance *instance, u16_t len, void *value)"
+)
+SCALAR_GET = template(
+    "s16_t {c.parent_name}_{c.name}_get_value("
+    "struct snmp_node_instance *node, void *value)"
+)
+SCALAR_TEST = template(
+    "snmp_err_t {c.parent_name}_{c.name}_set_test("
+    "struct snmp_node_instance *node, u16_t len, void *value)"
+)
+SCALAR_SET = template(
+    "snmp_err_t {c.parent_name}_{c.name}_set_value("
+    "struct snmp_node_instance *node, u16_t len, void *value)"
+)
+SEND_TRAP = template("err_t send_trap_{c.name}(const struct {c.name} *trap)")
+
+# 函数体的开头
+SWITCH_SCALAR = "\n{\n    switch (scalar->oid) {\n"
+SIMPLE_TABLE_CHECK_ROW = template(
+    "\n{{\n"
+    "    u32_t index = 1;\n\n"
+    "    if (row_oid_len != 1)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    index = row_oid[0];\n"
+    "    if (index > {max_index})\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n\n"
+    "    switch (*column) {{\n"
+)
+NEXT_ROW = template(
+    "\n{{\n"
+    "    if (row_oid->len == 0) {{\n"
+    "        u32_t oid_arr[] = {{1}};\n"
+    "        snmp_oid_assign(row_oid, oid_arr, 1);\n"
+    "    }} else if (row_oid->len > 1) {{\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    }} else {{\n"
+    "        row_oid->id[0]++;\n"
+    "    }}\n\n"
+    "    u32_t index = row_oid->id[0];\n"
+    "    if (index > {max_index})\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+)
+CHECK_ROW = template(
+    "\n{{\n"
+    "    if (row_oid_len != 1)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    u32_t index = row_oid[0];\n"
+    "    if (index > {max_index})\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    return SNMP_ERR_NOERROR;\n"
+    "}}\n\n"
+)
+SWITCH_INSTANCE = template(
+    "\n{{\n"
+    "    if (instance->instance_oid.len != 3)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    u32_t column = instance->instance_oid.id[1];\n"
+    "    u32_t index = instance->instance_oid.id[2];\n"
+    "    if (index > {max_index})\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n\n"
+    "    switch (column)\n"
+    "    {{\n"
+)
+
+# switch里的分支
+CASE = template("    case {c.subId}: // {c.name}\n")
+CASE_BREAK = template("    case {c.subId}: break; // {c.name}\n")
+ENUMS = template("        // {c.syntax.enums}\n")
+GET_STRING = '        return sprintf((char*)value, "abcdef");\n'
+GET_NUMBER = template(
+    "        *({c.syntax.ctype} *)value = {c.subId};\n"
+    "        return sizeof(*({c.syntax.ctype} *)value);\n"
+)
+GET_INDEX = template("        *({c.syntax.ctype} *)value = index;\n        return sizeof(*({c.syntax.ctype} *)value);\n")
+CHECK = template("        if ({c.syntax.check})\n            return SNMP_ERR_WRONGVALUE;\n        break;\n")
+SET_BODY = template("        // {c.syntax.target};\n")
+VARIANT_INDEX = template("        value->{c.syntax.variant} = index;\n")
+VARIANT_VALUE = template("        value->{c.syntax.variant} = *column;\n")
+VARIANT_STRING = template('        value->{c.syntax.variant} = "{c.name}";\n')
+VARIANT_LEN = template("        *value_len = {c.syntax.variant_len}(value->{c.syntax.variant});\n        break;\n")
+
+# 单个scalar的函数体
+SCALAR_ENUMS = template("    // {c.syntax.enums}\n")
+SCALAR_GET_STRING = '    return sprintf((char*)value, "abcdef");\n'
+SCALAR_GET_NUMBER = template(
+    "    *({c.syntax.ctype} *)value = {c.subId};\n    return sizeof(*({c.syntax.ctype} *)value);\n"
+)
+SCALAR_CHECK = template("    if ({c.syntax.check})\n        return SNMP_ERR_WRONGVALUE;\n")
+SCALAR_SET_BODY = template("    // {c.syntax.target};\n")
+NO_ACCESS = "    return SNMP_ERR_NOACCESS;\n}\n\n"
+RETURN_NOERROR = "    return SNMP_ERR_NOERROR;\n}\n\n"
+
+# 节点定义
+SCALAR_ARRAY_DEF = template("    {{{c.subId}, {c.syntax.syntax_type}, {c.syntax.access_type}}}, // {c.name}\n")
+SCALAR_ARRAY_NODE = template(
+    "const struct snmp_scalar_array_node {c.name}_root =\n"
+    "    SNMP_SCALAR_CREATE_ARRAY_NODE({c.subId}, {c.name}_nodes,\n"
+    "                                  {c.name}_get_value,\n"
+)
+SCALAR_ARRAY_NODE_SET = template(
+    "                                  {c.name}_set_test,\n"
+    "                                  {c.name}_set_value);\n\n"
+)
+SCALAR_ARRAY_NODE_READ_ONLY = "                                  NULL, NULL);\n\n"
+SCALAR_NODE = template(
+    "const struct snmp_scalar_node {c.name}_root = "
+    "SNMP_SCALAR_CREATE_NODE({c.subId}, {c.syntax.access_type}, {c.syntax.syntax_type}, "
+    "{c.parent_name}_{c.name}_get_value, {set_funcs});\n\n"
+)
+SCALAR_SET_FUNCS = template("{c.parent_name}_{c.name}_set_test, {c.parent_name}_{c.name}_set_value")
+ROW_DEF = template("static const struct snmp_table_col_def {c.parent_name}_{c.name}_row[] = {{\n")
+SIMPLE_ROW_DEF = template(
+    "static const struct snmp_table_simple_col_def {c.parent_name}_{c.name}_row[] = {{\n"
+)
+SIMPLE_COL_DEF = template("    {{{c.subId}, {c.syntax.syntax_type}, {c.syntax.data_type}}}, // {c.name}\n")
+TABLE_NODE = template(
+    "const struct snmp_table_node {c.name}_root =\n"
+    "    SNMP_TABLE_CREATE({c.subId}, {c.name}_{row}_row,\n"
+    "                             {c.name}_get_cell_instance,\n"
+    "                             {c.name}_get_next_cell_instance,\n"
+    "                             {c.name}_get_value,\n"
+    "                             {c.name}_set_test,\n"
+    "                             {c.name}_set_value);\n"
+    "\n"
+)
+SIMPLE_TABLE_NODE = template(
+    "const struct snmp_table_simple_node {c.name}_root =\n"
+    "    SNMP_TABLE_CREATE_SIMPLE({c.subId}, {c.name}_{row}_row,\n"
+    "                             {c.name}_get_cell_value,\n"
+    "                             {c.name}_get_next_cell_instance_and_value);\n"
+    "\n"
+)
+
+# notification
+TRAP_STRUCT_FIELD = template("    {c.syntax.ctype} {c.name};\n")
+# OID都是static const, varbind放在栈上的数组里, 发送时不分配内存.
+# {other} 是notification, {i} 是varbind的下标
+TRAP_OID = template(
+    "static const struct snmp_obj_id {c.name}_trap_oid = {{{c.oid_len}, {{{c.oid_str}}}}};\n"
+)
+VARBIND_OIDS = template("static const struct snmp_obj_id {c.name}_oids[{size}] = {{\n")
+VARBIND_OID = template("    {{{c.oid_len}, {{{c.oid_str}}}}}, // {c.name}\n")
+VARBIND_ARRAY = template(
+    "\n{{\n"
+    "    struct snmp_varbind vb[{size}];\n\n"
+    "    memset(vb, 0, sizeof(vb));\n"
+)
+VARBIND_ASSIGN = template(
+    "    snmp_oid_assign(&vb[{i}].oid, {other.name}_oids[{i}].id, {other.name}_oids[{i}].len);\n"
+    "    vb[{i}].type = {c.syntax.syntax_type};\n"
+)
+# 字符串字段是NULL时发送空字符串
+VARBIND_STRING = template(
+    "    vb[{i}].value = (void *)trap->{c.name};\n"
+    "    vb[{i}].value_len = trap->{c.name} != NULL ? strlen(trap->{c.name}) : 0;\n"
+)
+VARBIND_VALUE = template(
+    "    vb[{i}].value = (void *)&trap->{c.name};\n"
+    "    vb[{i}].value_len = sizeof(trap->{c.name});\n"
+)
+VARBIND_NEXT = template("    vb[{i}].next = &vb[{i + 1}];\n")
+VARBIND_PREV = template("    vb[{i}].prev = &vb[{i - 1}];\n")
+SEND = template(
+    "    return snmp_send_trap(&{c.name}_trap_oid, SNMP_GENTRAP_ENTERPRISE_SPECIFIC, 1, vb);\n"
+    "}}\n\n"
+)
+
+# scalar array的查表分派, 每个成员一个函数. {op.xxx} 是DispatchOp的属性
+DISPATCH_GET_TYPE = template("typedef s16_t (*{c.name}_get_fn)(void *value);\n")
+DISPATCH_SET_TYPE = template(
+    "typedef snmp_err_t (*{c.name}_set_fn)(u16_t len, void *value);\n"
+)
+MEMBER = template("static {op.result} {c.parent_name}_{c.name}_{op.suffix}({op.params})\n{{\n")
+DENSE_TABLE = template(
+    "static const {c.name}_{op.fn} {c.name}_{op.suffix}_table[{size}] = {{\n"
+)
+DENSE_ENTRY = template("    {c.parent_name}_{c.name}_{op.suffix}, // {c.subId}\n")
+DENSE_HOLE = "    NULL,\n"
+DENSE_DISPATCH = template(
+    "\n{{\n"
+    "    if (scalar->oid >= {size} || {c.name}_{op.suffix}_table[scalar->oid] == NULL)\n"
+    "        return {op.missing};\n"
+    "    return {c.name}_{op.suffix}_table[scalar->oid]({op.args});\n"
+    "}}\n\n"
+)
+SORTED_TABLE = template(
+    "static const struct {{\n"
+    "    u32_t oid;\n"
+    "    {c.name}_{op.fn} fn;\n"
+    "}} {c.name}_{op.suffix}_table[{size}] = {{\n"
+)
+SORTED_ENTRY = template("    {{{c.subId}, {c.parent_name}_{c.name}_{op.suffix}}},\n")
+SORTED_DISPATCH = template(
+    "\n{{\n"
+    "    u32_t lo = 0, hi = {size};\n\n"
+    "    while (lo < hi) {{\n"
+    "        u32_t mid = (lo + hi) / 2;\n"
+    "        if ({c.name}_{op.suffix}_table[mid].oid < scalar->oid)\n"
+    "            lo = mid + 1;\n"
+    "        else\n"
+    "            hi = mid;\n"
+    "    }}\n"
+    "    if (lo == {size} || {c.name}_{op.suffix}_table[lo].oid != scalar->oid)\n"
+    "        return {op.missing};\n"
+    "    return {c.name}_{op.suffix}_table[lo].fn({op.args});\n"
+    "}}\n\n"
+)
+
+# 表格的行存储, {c} 是行节点, 表格名是 {c.parent_name}, {size} 是最多的行数.
+# 行号就是数组下标加1, {c.parent_name}_used是占用位图
+ROW_STRUCT = template("struct {c.name} {{\n")
+ROW_FIELD = template("    {c.syntax.ctype} {c.name};\n")
+ROW_FIELD_STRING = template("    char {c.name}[{size}];\n")
+ROW_FIELD_BYTES = template("    u8_t {c.name}[{size}];\n    u16_t {c.name}_len;\n")
+ROW_STORAGE = template(
+    "static struct {c.name} {c.parent_name}_rows[{size}];\n"
+    "static u32_t {c.parent_name}_used[({size} + 31) / 32];\n\n"
+)
+ROW_LOOKUP = template("struct {c.name} *{c.parent_name}_row(u32_t index)")
+ROW_ADD = template("struct {c.name} *{c.parent_name}_add_row(u32_t index)")
+ROW_REMOVE = template("void {c.parent_name}_remove_row(u32_t index)")
+ROW_NEXT = template("u32_t {c.parent_name}_next_row(u32_t index)")
+ROW_LOOKUP_BODY = template(
+    "\n{{\n"
+    "    if (index == 0 || index > {size})\n"
+    "        return NULL;\n"
+    "    index--;\n"
+    "    if (({c.parent_name}_used[index / 32] & (1UL << (index % 32))) == 0)\n"
+    "        return NULL;\n"
+    "    return &{c.parent_name}_rows[index];\n"
+    "}}\n\n"
+)
+ROW_ADD_BODY = template(
+    "\n{{\n"
+    "    if (index == 0 || index > {size})\n"
+    "        return NULL;\n"
+    "    index--;\n"
+    "    {c.parent_name}_used[index / 32] |= 1UL << (index % 32);\n"
+    "    memset(&{c.parent_name}_rows[index], 0, sizeof({c.parent_name}_rows[index]));\n"
+    "    return &{c.parent_name}_rows[index];\n"
+    "}}\n\n"
+)
+ROW_REMOVE_BODY = template(
+    "\n{{\n"
+    "    if (index == 0 || index > {size})\n"
+    "        return;\n"
+    "    index--;\n"
+    "    {c.parent_name}_used[index / 32] &= ~(1UL << (index % 32));\n"
+    "}}\n\n"
+)
+# 大于index的下一个已占用的行号, 没有时返回0. 空的32行一次跳过
+ROW_NEXT_BODY = template(
+    "\n{{\n"
+    "    u32_t word, bits;\n\n"
+    "    if (index >= {size})\n"
+    "        return 0;\n"
+    "    word = index / 32;\n"
+    "    bits = {c.parent_name}_used[word] & (0xFFFFFFFFUL << (index % 32));\n"
+    "    while (bits == 0) {{\n"
+    "        if (++word == ({size} + 31) / 32)\n"
+    "            return 0;\n"
+    "        bits = {c.parent_name}_used[word];\n"
+    "    }}\n"
+    "    index = word * 32;\n"
+    "    while ((bits & 1) == 0) {{\n"
+    "        bits >>= 1;\n"
+    "        index++;\n"
+    "    }}\n"
+    "    return index + 1;\n"
+    "}}\n\n"
+)
+
+# 使用行存储的表格函数体的开头
+STORED_CHECK_ROW = template(
+    "\n{{\n"
+    "    if (row_oid_len != 1)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    u32_t index = row_oid[0];\n"
+    "    struct {c.name} *row = {c.parent_name}_row(index);\n"
+    "    if (row == NULL)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n\n"
+    "    switch (*column) {{\n"
+)
+STORED_NEXT_ROW = template(
+    "\n{{\n"
+    "    u32_t index = {c.parent_name}_next_row(row_oid->len > 0 ? row_oid->id[0] : 0);\n"
+    "    if (index == 0)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    snmp_oid_assign(row_oid, &index, 1);\n"
+)
+STORED_NEXT_VALUE = template(
+    "    struct {c.name} *row = &{c.parent_name}_rows[index - 1];\n\n"
+    "    switch (*column) {{\n"
+)
+STORED_CHECK_INSTANCE = template(
+    "\n{{\n"
+    "    if (row_oid_len != 1 || {c.parent_name}_row(row_oid[0]) == NULL)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    return SNMP_ERR_NOERROR;\n"
+    "}}\n\n"
+)
+STORED_SWITCH_INSTANCE = template(
+    "\n{{\n"
+    "    if (instance->instance_oid.len != 3)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    u32_t column = instance->instance_oid.id[1];\n"
+    "    u32_t index = instance->instance_oid.id[2];\n"
+    "    struct {c.name} *row = {c.parent_name}_row(index);\n"
+    "    if (row == NULL)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n\n"
+    "    switch (column)\n"
+    "    {{\n"
+)
+
+# 使用行存储的表格里每一列的读写, {c} 是列节点
+STORED_VARIANT = template("        value->{c.syntax.variant} = row->{c.name};\n")
+STORED_GET_STRING = template('        return sprintf((char*)value, "%s", row->{c.name});\n')
+STORED_GET_NUMBER = template(
+    "        *({c.syntax.ctype} *)value = row->{c.name};\n"
+    "        return sizeof(*({c.syntax.ctype} *)value);\n"
+)
+STORED_CHECK_LENGTH = template(
+    "        if (len >= sizeof(row->{c.name}))\n"
+    "            return SNMP_ERR_WRONGLENGTH;\n"
+)
+STORED_SET_STRING = template(
+    "        memcpy(row->{c.name}, value, len);\n"
+    "        row->{c.name}[len] = '\\0';\n"
+)
+STORED_SET_NUMBER = template("        row->{c.name} = *({c.syntax.ctype} *)value;\n")
+# 二进制字节串列按长度保存, 定长的(IpAddress, SIZE (n))长度是{size}
+STORED_CHECK_FIXED = template(
+    "        if (len != {size})\n"
+    "            return SNMP_ERR_WRONGLENGTH;\n"
+)
+STORED_CHECK_BYTES = template(
+    "        if (len > sizeof(row->{c.name}))\n"
+    "            return SNMP_ERR_WRONGLENGTH;\n"
+)
+STORED_SET_FIXED = template("        memcpy(row->{c.name}, value, {size});\n")
+STORED_SET_BYTES = template(
+    "        memcpy(row->{c.name}, value, len);\n"
+    "        row->{c.name}_len = len;\n"
+)
+
+# 按INDEX排序的行存储, {c} 是行节点, {size} 是最多的行数, {key_len} 是INDEX编码后的最大长度,
+# {max_len} 是实例OID里能放下的INDEX长度, 编码后更长的行不能加入.
+# 行按INDEX编码成的OID的字典序排列, 和GETNEXT的顺序相同
+INDEX_FIELD_STRING = template("    u8_t {c.name}[{size}];\n    u8_t {c.name}_len;\n")
+INDEX_FIELD_FIXED = template("    u8_t {c.name}[{size}];\n")
+SORTED_ROW_STORAGE = template(
+    "#if SNMP_MAX_OBJ_ID_LEN < {c.oid_len} + 1 + {max_len}\n"
+    '#error "{c.parent_name} row storage needs a larger SNMP_MAX_OBJ_ID_LEN"\n'
+    "#endif\n"
+    "static struct {c.name} {c.parent_name}_rows[{size}];\n"
+    "static u32_t {c.parent_name}_count;\n\n"
+)
+INDEX_ENCODE = template(
+    "u16_t {c.parent_name}_encode_index(const struct {c.name} *row, u32_t *oid)"
+)
+INDEX_DECODE = template(
+    "u8_t {c.parent_name}_decode_index(const u32_t *oid, u16_t len, struct {c.name} *row)"
+)
+SORTED_ROW_LOOKUP = template("struct {c.name} *{c.parent_name}_row(const struct {c.name} *key)")
+SORTED_ROW_ADD = template("struct {c.name} *{c.parent_name}_add_row(const struct {c.name} *key)")
+SORTED_ROW_REMOVE = template("void {c.parent_name}_remove_row(const struct {c.name} *key)")
+
+# INDEX里每个对象的编码和解码, {c} 是索引对象
+ENCODE_NUMBER = template("    oid[len++] = (u32_t)row->{c.name};\n")
+ENCODE_STRING = template(
+    "    oid[len++] = row->{c.name}_len;\n"
+    "    for (i = 0; i < row->{c.name}_len; i++)\n"
+    "        oid[len++] = row->{c.name}[i];\n"
+)
+ENCODE_FIXED = template(
+    "    for (i = 0; i < {size}; i++)\n"
+    "        oid[len++] = row->{c.name}[i];\n"
+)
+DECODE_NUMBER = template(
+    "    if (pos >= len)\n"
+    "        return 0;\n"
+    "    row->{c.name} = ({c.syntax.ctype})oid[pos++];\n"
+)
+DECODE_STRING = template(
+    "    if (pos >= len || oid[pos] > {size} || oid[pos] >= (u32_t)(len - pos))\n"
+    "        return 0;\n"
+    "    row->{c.name}_len = (u8_t)oid[pos++];\n"
+    "    for (i = 0; i < row->{c.name}_len; i++) {{\n"
+    "        if (oid[pos] > 255)\n"
+    "            return 0;\n"
+    "        row->{c.name}[i] = (u8_t)oid[pos++];\n"
+    "    }}\n"
+)
+DECODE_FIXED = template(
+    "    if (len - pos < {size})\n"
+    "        return 0;\n"
+    "    for (i = 0; i < {size}; i++) {{\n"
+    "        if (oid[pos] > 255)\n"
+    "            return 0;\n"
+    "        row->{c.name}[i] = (u8_t)oid[pos++];\n"
+    "    }}\n"
+)
+
+# 比较, 二分查找, 精确查找和查找下一行, 只在本文件内使用
+SORTED_ROW_SEARCH = template(
+    "static int {c.parent_name}_compare(const struct {c.name} *row, const u32_t *oid, u16_t len)\n"
+    "{{\n"
+    "    u32_t key[{key_len}];\n"
+    "    u16_t key_len = {c.parent_name}_encode_index(row, key);\n"
+    "    u16_t i;\n\n"
+    "    for (i = 0; i < key_len && i < len; i++) {{\n"
+    "        if (key[i] != oid[i])\n"
+    "            return key[i] < oid[i] ? -1 : 1;\n"
+    "    }}\n"
+    "    return (key_len > len) - (key_len < len);\n"
+    "}}\n\n"
+    "static u32_t {c.parent_name}_search(const u32_t *oid, u16_t len)\n"
+    "{{\n"
+    "    u32_t lo = 0, hi = {c.parent_name}_count;\n\n"
+    "    while (lo < hi) {{\n"
+    "        u32_t mid = lo + (hi - lo) / 2;\n"
+    "        if ({c.parent_name}_compare(&{c.parent_name}_rows[mid], oid, len) < 0)\n"
+    "            lo = mid + 1;\n"
+    "        else\n"
+    "            hi = mid;\n"
+    "    }}\n"
+    "    return lo;\n"
+    "}}\n\n"
+    "static struct {c.name} *{c.parent_name}_find(const u32_t *oid, u16_t len)\n"
+    "{{\n"
+    "    u32_t pos = {c.parent_name}_search(oid, len);\n\n"
+    "    if (pos == {c.parent_name}_count || "
+    "{c.parent_name}_compare(&{c.parent_name}_rows[pos], oid, len) != 0)\n"
+    "        return NULL;\n"
+    "    return &{c.parent_name}_rows[pos];\n"
+    "}}\n\n"
+    "static struct {c.name} *{c.parent_name}_next(const u32_t *oid, u16_t len)\n"
+    "{{\n"
+    "    u32_t pos = {c.parent_name}_search(oid, len);\n\n"
+    "    if (pos < {c.parent_name}_count && "
+    "{c.parent_name}_compare(&{c.parent_name}_rows[pos], oid, len) == 0)\n"
+    "        pos++;\n"
+    "    return pos < {c.parent_name}_count ? &{c.parent_name}_rows[pos] : NULL;\n"
+    "}}\n\n"
+)
+SORTED_ROW_LOOKUP_BODY = template(
+    "\n{{\n"
+    "    u32_t oid[{key_len}];\n\n"
+    "    return {c.parent_name}_find(oid, {c.parent_name}_encode_index(key, oid));\n"
+    "}}\n\n"
+)
+# 已有的行直接返回, 新行插入到排序的位置, key里的其他字段作为初始值
+SORTED_ROW_ADD_BODY = template(
+    "\n{{\n"
+    "    u32_t oid[{key_len}];\n"
+    "    u16_t len = {c.parent_name}_encode_index(key, oid);\n"
+    "    u32_t pos;\n\n"
+    "    if (len > {max_len})\n"
+    "        return NULL;\n"
+    "    pos = {c.parent_name}_search(oid, len);\n"
+    "    if (pos < {c.parent_name}_count && "
+    "{c.parent_name}_compare(&{c.parent_name}_rows[pos], oid, len) == 0)\n"
+    "        return &{c.parent_name}_rows[pos];\n"
+    "    if ({c.parent_name}_count == {size})\n"
+    "        return NULL;\n"
+    "    memmove(&{c.parent_name}_rows[pos + 1], &{c.parent_name}_rows[pos],\n"
+    "            ({c.parent_name}_count - pos) * sizeof({c.parent_name}_rows[0]));\n"
+    "    {c.parent_name}_rows[pos] = *key;\n"
+    "    {c.parent_name}_count++;\n"
+    "    return &{c.parent_name}_rows[pos];\n"
+    "}}\n\n"
+)
+SORTED_ROW_REMOVE_BODY = template(
+    "\n{{\n"
+    "    u32_t oid[{key_len}];\n"
+    "    u16_t len = {c.parent_name}_encode_index(key, oid);\n"
+    "    u32_t pos = {c.parent_name}_search(oid, len);\n\n"
+    "    if (pos == {c.parent_name}_count || "
+    "{c.parent_name}_compare(&{c.parent_name}_rows[pos], oid, len) != 0)\n"
+    "        return;\n"
+    "    {c.parent_name}_count--;\n"
+    "    memmove(&{c.parent_name}_rows[pos], &{c.parent_name}_rows[pos + 1],\n"
+    "            ({c.parent_name}_count - pos) * sizeof({c.parent_name}_rows[0]));\n"
+    "}}\n\n"
+)
+
+# 使用排序行存储的表格函数体的开头
+SORTED_CHECK_ROW = template(
+    "\n{{\n"
+    "    struct {c.name} *row = {c.parent_name}_find(row_oid, row_oid_len);\n"
+    "    if (row == NULL)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n\n"
+    "    switch (*column) {{\n"
+)
+SORTED_NEXT_ROW = template(
+    "\n{{\n"
+    "    struct {c.name} *row = {c.parent_name}_next(row_oid->id, row_oid->len);\n"
+    "    if (row == NULL)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    row_oid->len = {c.parent_name}_encode_index(row, row_oid->id);\n"
+)
+# 没有参数, 直接是字符串
+SORTED_NEXT_VALUE = "\n    switch (*column) {\n"
+SORTED_CHECK_INSTANCE = template(
+    "\n{{\n"
+    "    if ({c.parent_name}_find(row_oid, row_oid_len) == NULL)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    return SNMP_ERR_NOERROR;\n"
+    "}}\n\n"
+)
+SORTED_SWITCH_INSTANCE = template(
+    "\n{{\n"
+    "    if (instance->instance_oid.len < 3)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n"
+    "    u32_t column = instance->instance_oid.id[1];\n"
+    "    struct {c.name} *row = {c.parent_name}_find(instance->instance_oid.id + 2,\n"
+    "                                              instance->instance_oid.len - 2);\n"
+    "    if (row == NULL)\n"
+    "        return SNMP_ERR_NOSUCHINSTANCE;\n\n"
+    "    switch (column)\n"
+    "    {{\n"
+)
+
+# 字节串索引列的读取, {size} 是长度的C表达式
+INDEX_VARIANT_BYTES = template(
+    "        value->const_ptr = row->{c.name};\n"
+    "        *value_len = {size};\n"
+    "        break;\n"
+)
+INDEX_GET_BYTES = template(
+    "        memcpy(value, row->{c.name}, {size});\n"
+    "        return {size};\n"
+)
+
+# 批量发送trap的队列, {module} 是模块名, {size} 是队列长度, {c} 是notification.
+# 队列里保存struct的副本, 字符串字段只复制指针, 发送前要一直有效
+TRAP_TYPES = template("enum {module}_trap_type {{\n")
+TRAP_TYPE = template("    {module}_TRAP_{c.name},\n")
+TRAP_ENTRY = template(
+    "struct {module}_trap {{\n"
+    "    enum {module}_trap_type type;\n"
+    "    union {{\n"
+)
+TRAP_ENTRY_FIELD = template("        struct {c.name} {c.name};\n")
+TRAP_QUEUE = template(
+    "    }} trap;\n"
+    "}};\n\n"
+    "static struct {module}_trap {module}_traps[{size}];\n"
+    "static u16_t {module}_trap_head;\n"
+    "static u16_t {module}_trap_count;\n\n"
+)
+TRAP_SAME = template(
+    "static int {c.name}_same(const struct {c.name} *a, const struct {c.name} *b)\n"
+    "{{\n"
+    "    return "
+)
+# 字符串字段可以是NULL, 两个都是NULL时相同
+SAME_STRING_FUNC = template(
+    "static int {module}_same_string(const char *a, const char *b)\n"
+    "{{\n"
+    "    if (a == NULL || b == NULL)\n"
+    "        return a == b;\n"
+    "    return strcmp(a, b) == 0;\n"
+    "}}\n\n"
+)
+SAME_STRING = template("{module}_same_string(a->{c.name}, b->{c.name})")
+SAME_VALUE = template("a->{c.name} == b->{c.name}")
+QUEUE_TRAP = template("err_t queue_trap_{c.name}(const struct {c.name} *trap)")
+# 队列里已经有相同的trap时合并成一个, 队列满时返回ERR_MEM
+QUEUE_TRAP_BODY = template(
+    "\n{{\n"
+    "    struct {module}_trap *entry;\n"
+    "    u16_t i;\n\n"
+    "    for (i = 0; i < {module}_trap_count; i++) {{\n"
+    "        entry = &{module}_traps[({module}_trap_head + i) % {size}];\n"
+    "        if (entry->type == {module}_TRAP_{c.name} && {c.name}_same(&entry->trap.{c.name}, trap))\n"
+    "            return ERR_OK;\n"
+    "    }}\n"
+    "    if ({module}_trap_count == {size})\n"
+    "        return ERR_MEM;\n"
+    "    entry = &{module}_traps[({module}_trap_head + {module}_trap_count) % {size}];\n"
+    "    entry->type = {module}_TRAP_{c.name};\n"
+    "    entry->trap.{c.name} = *trap;\n"
+    "    {module}_trap_count++;\n"
+    "    return ERR_OK;\n"
+    "}}\n\n"
+)
+FLUSH_TRAPS = template("u16_t {module}_flush_traps(u16_t max)")
+# 最多发送max个, 由定时器周期调用来限制发送速率. 发送失败的trap留在队列里下次再发
+FLUSH_TRAPS_BEGIN = template(
+    "\n{{\n"
+    "    u16_t sent = 0;\n\n"
+    "    while (sent < max && {module}_trap_count > 0) {{\n"
+    "        struct {module}_trap *entry = &{module}_traps[{module}_trap_head];\n"
+    "        err_t ret = ERR_OK;\n\n"
+    "        switch (entry->type) {{\n"
+)
+FLUSH_TRAPS_CASE = template(
+    "        case {module}_TRAP_{c.name}:\n"
+    "            ret = send_trap_{c.name}(&entry->trap.{c.name});\n"
+    "            break;\n"
+)
+FLUSH_TRAPS_END = template(
+    "        }}\n"
+    "        if (ret != ERR_OK)\n"
+    "            break;\n"
+    "        {module}_trap_head = ({module}_trap_head + 1) % {size};\n"
+    "        {module}_trap_count--;\n"
+    "        sent++;\n"
+    "    }}\n"
+    "    return sent;\n"
+    "}}\n\n"
+)
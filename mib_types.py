@@ -0,0 +1,101 @@
+import functools
+
+# 基础syntax(小写): (ASN.1类型, C类型, snmp_variant_value成员, datatype)
+SYNTAXES = {
+    "integer": ("SNMP_ASN1_TYPE_INTEGER", "s32_t", "s32", "SNMP_VARIANT_VALUE_TYPE_S32"),
+    "integer32": ("SNMP_ASN1_TYPE_INTEGER", "s32_t", "s32", "SNMP_VARIANT_VALUE_TYPE_S32"),
+    "unsigned32": ("SNMP_ASN1_TYPE_UNSIGNED32", "u32_t", "u32", "SNMP_VARIANT_VALUE_TYPE_U32"),
+    "octet": (
+        "SNMP_ASN1_TYPE_OCTET_STRING",
+        "const char*",
+        "const_ptr",
+        "SNMP_VARIANT_VALUE_TYPE_CONST_PTR",
+    ),
+    "displaystring": (
+        "SNMP_ASN1_TYPE_OCTET_STRING",
+        "const char*",
+        "const_ptr",
+        "SNMP_VARIANT_VALUE_TYPE_CONST_PTR",
+    ),
+    "object": ("SNMP_ASN1_TYPE_OBJECT_ID", "u32_t", "u32", "SNMP_VARIANT_VALUE_TYPE_U32"),
+    "timeticks": ("SNMP_ASN1_TYPE_TIMETICKS", "u32_t", "u32", "SNMP_VARIANT_VALUE_TYPE_U32"),
+    "bits": ("SNMP_ASN1_TYPE_UNSIGNED32", "u32_t", "u32", "SNMP_VARIANT_VALUE_TYPE_U32"),
+    "gauge": ("SNMP_ASN1_TYPE_GAUGE", "u32_t", "u32", "SNMP_VARIANT_VALUE_TYPE_U32"),
+    "gauge32": ("SNMP_ASN1_TYPE_GAUGE", "u32_t", "u32", "SNMP_VARIANT_VALUE_TYPE_U32"),
+    "counter": ("SNMP_ASN1_TYPE_COUNTER", "u32_t", "u32", "SNMP_VARIANT_VALUE_TYPE_U32"),
+    "counter32": ("SNMP_ASN1_TYPE_COUNTER", "u32_t", "u32", "SNMP_VARIANT_VALUE_TYPE_U32"),
+    "ipaddress": (
+        "SNMP_ASN1_TYPE_IPADDRESS",
+        "const char*",
+        "const_ptr",
+        "SNMP_VARIANT_VALUE_TYPE_U32",
+    ),
+    "physaddress": (
+        "SNMP_ASN1_TYPE_OCTET_STRING",
+        "const char*",
+        "const_ptr",
+        "SNMP_VARIANT_VALUE_TYPE_U32",
+    ),
+    "networkaddress": (
+        "SNMP_ASN1_TYPE_IPADDRESS",
+        "const char*",
+        "const_ptr",
+        "SNMP_VARIANT_VALUE_TYPE_U32",
+    ),
+}
+
+# 不认识的syntax
+DEFAULT_SYNTAX = ("SNMP_ASN1_TYPE_INTEGER", "u32_t", "u32", "SNMP_VARIANT_VALUE_TYPE_U32")
+
+# 内置的TEXTUAL-CONVENTION(SNMPv2-TC), 名字 -> 基础syntax
+BUILTIN_TCS = {
+    "TruthValue": "INTEGER",
+    "RowStatus": "INTEGER",
+    "StorageType": "INTEGER",
+    "TestAndIncr": "INTEGER",
+    "TimeInterval": "INTEGER",
+    "TimeStamp": "TimeTicks",
+    "DateAndTime": "OCTET",
+    "MacAddress": "OCTET",
+    "TAddress": "OCTET",
+    "AutonomousType": "OBJECT",
+    "InstancePointer": "OBJECT",
+    "VariablePointer": "OBJECT",
+    "RowPointer": "OBJECT",
+    "TDomain": "OBJECT",
+}
+
+
+class SyntaxType:
+    """一种基础syntax对应的C代码类型, 同一种syntax的节点共享同一个对象"""
+
+    __slots__ = ("name", "asn1_type", "ctype", "variant", "data_type", "string")
+
+    def __init__(self, name):
+        self.name = name
+        self.asn1_type, self.ctype, self.variant, self.data_type = SYNTAXES.get(
+            name, DEFAULT_SYNTAX
+        )
+        # notification里按字符串发送
+        self.string = name in ("octet", "displaystring")
+
+    def __repr__(self):
+        return f"SyntaxType({self.name!r})"
+
+
+@functools.cache
+def syntax_type(name):
+    """基础syntax(小写)对应的SyntaxType"""
+    return SyntaxType(name)
+
+
+def resolve_syntax(syntax, textual_conventions=None):
+    """沿TEXTUAL-CONVENTION找到syntax的基础类型, 返回SyntaxType"""
+    seen = set()
+    while syntax.lower() not in SYNTAXES and syntax not in seen:
+        seen.add(syntax)
+        base = (textual_conventions or {}).get(syntax) or BUILTIN_TCS.get(syntax)
+        if base is None:
+            break
+        syntax = base
+    return syntax_type(syntax.lower())
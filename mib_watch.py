@@ -0,0 +1,110 @@
+import os
+import time
+
+from pyparsing import ParseException
+
+from mib_compiler import MibCompileError, MibCompiler
+from mib_fast_parser import SmiSyntaxError
+from mib_incremental import IncrementalParser
+from mib_parser import MibLinkError, print_error
+
+
+class MibWatcher:
+    """监视目录, MIB文件变化时重新生成.c/.h
+
+    常驻进程, 语法, 已编译的依赖模块和每个文件的增量解析状态都留在内存里,
+    每次重新生成只需要解析变化了的定义. 用轮询代替inotify, 不依赖平台
+    """
+
+    SUFFIXES = (".mib", ".my", ".smi")
+
+    def __init__(
+        self, directory, search_path=(), engine="fast", interval=1.0, generator_options=None
+    ):
+        self.directory = directory
+        self.engine = engine
+        self.interval = interval
+        self.generator_options = generator_options
+        self.compiler = MibCompiler([directory] + list(search_path), engine=engine)
+        self.stamps = {}
+        self.parsers = {}
+        # 文件 -> (模块名, 导入), 用来找出需要跟着重新生成的文件
+        self.headers = {}
+
+    def scan(self):
+        """目录下的MIB文件和它们的(修改时间, 大小)"""
+        stamps = {}
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.SUFFIXES):
+                stat = entry.stat()
+                stamps[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def invalidate(self, modules):
+        """找出modules以及直接或间接导入了它们的模块, 从compiler里删掉"""
+        stale = set(modules)
+        imports = {module: ctx.imports for module, ctx in self.compiler.modules.items()}
+        imports.update(self.headers.values())
+        while True:
+            more = {module for module, deps in imports.items() if stale & set(deps)}
+            if more <= stale:
+                break
+            stale |= more
+        for module in stale:
+            self.compiler.modules.pop(module, None)
+        return stale
+
+    def poll(self):
+        """检查一次, 重新生成变化了的文件和导入了它们的文件, 返回这些文件"""
+        stamps = self.scan()
+        changed = sorted(f for f, stamp in stamps.items() if self.stamps.get(f) != stamp)
+        removed = [f for f in self.stamps if f not in stamps]
+        self.stamps = stamps
+        if not changed and not removed:
+            return []
+        stale = self.invalidate(
+            self.headers[f][0] for f in changed + removed if f in self.headers
+        )
+        for fname in removed:
+            self.parsers.pop(fname, None)
+            self.headers.pop(fname, None)
+        dependents = sorted(
+            fname
+            for fname, (module, _) in self.headers.items()
+            if module in stale and fname not in changed
+        )
+        for fname in changed + dependents:
+            self.regenerate(fname)
+        return changed + dependents
+
+    def regenerate(self, fname):
+        """增量解析fname并生成代码"""
+        parser = self.parsers.setdefault(
+            fname,
+            IncrementalParser(
+                self.engine,
+                compiler=self.compiler,
+                generator_options=self.generator_options,
+            ),
+        )
+        start = time.perf_counter()
+        try:
+            ctx = parser.parse(fname)
+        except (
+            ParseException, SmiSyntaxError, OSError, MibCompileError, MibLinkError
+        ) as err:
+            print_error(err, fname)
+            return
+        self.headers[fname] = (ctx.module_name, ctx.imports)
+        print(
+            f"Regenerated {fname} in {(time.perf_counter() - start) * 1000:.1f} ms: "
+            f"{parser.parsed} definitions parsed, {parser.reused} reused, "
+            f"{parser.fragment_hits} fragments reused."
+        )
+
+    def run(self):
+        """一直运行, 直到被中断"""
+        print(f"Watching {self.directory} for MIB changes, press Ctrl-C to stop.")
+        while True:
+            self.poll()
+            time.sleep(self.interval)
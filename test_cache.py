@@ -0,0 +1,88 @@
+import marshal
+import os
+import shutil
+
+import pytest
+
+from mib_cache import CACHE_FORMAT
+from mib_parser import MibParser
+
+DMR_MIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DMR-MIB.mib")
+
+
+def load(fname, cache_dir):
+    """只解析不生成代码, 返回MibParser"""
+    parser = MibParser(engine="fast", cache_dir=str(cache_dir))
+    parser.ctx.add_base("SNMPv2-SMI", ["private", "enterprises"])
+    parser.load(str(fname))
+    return parser
+
+
+def no_parse(*_):
+    """代替parse_module, 缓存命中时不应该被调用"""
+    raise AssertionError("parsed instead of loading from cache")
+
+
+@pytest.fixture(name="mib")
+def fixture_mib(tmp_path):
+    """复制到tmp_path里的DMR-MIB.mib, 测试可以修改它"""
+    fname = tmp_path / "DMR-MIB.mib"
+    shutil.copy(DMR_MIB, fname)
+    return fname
+
+
+def assert_same(parser, expected):
+    """解析结果和expected完全相同"""
+    assert parser.node_list == expected.node_list
+    assert parser.node_dict == expected.node_dict
+    assert parser.name_oid == expected.name_oid
+    assert parser.ctx.textual_conventions == expected.ctx.textual_conventions
+
+
+def test_second_run_from_cache(tmp_path, mib, monkeypatch):
+    """第二次解析同一个文件直接从缓存加载, 节点和第一次相同"""
+    first = load(mib, tmp_path / "cache")
+    assert not first.cached
+    assert len(os.listdir(tmp_path / "cache")) == 1
+    monkeypatch.setattr(MibParser, "parse_module", no_parse)
+    second = load(mib, tmp_path / "cache")
+    assert second.cached
+    assert_same(second, first)
+    kids = second.node_dict[second.name_oid["dgInfoEntry"]].kids
+    assert [kid.subId for kid in kids] == sorted(kid.subId for kid in kids)
+
+
+def test_edit_invalidates(tmp_path, mib):
+    """源文件的内容变了(SHA-256不同)就重新解析, 得到修改后的节点"""
+    load(mib, tmp_path / "cache")
+    text = mib.read_text(encoding="utf-8")
+    assert "::= { dgInfoEntry 2 }" in text
+    mib.write_text(text.replace("::= { dgInfoEntry 2 }", "::= { dgInfoEntry 99 }"), encoding="utf-8")
+    edited = load(mib, tmp_path / "cache")
+    assert not edited.cached
+    assert edited.name_oid["dgState"][-1] == 99
+    assert len(os.listdir(tmp_path / "cache")) == 2
+    assert_same(edited, load(mib, tmp_path / "fresh"))
+
+
+@pytest.mark.parametrize(
+    "damage",
+    [
+        lambda data: data[: len(data) // 2],
+        lambda data: b"\0" * len(data),
+        lambda data: b"",
+        lambda data: marshal.dumps(42),
+        lambda data: marshal.dumps((CACHE_FORMAT, "DMR-MIB")),
+        lambda data: marshal.dumps((CACHE_FORMAT, "DMR-MIB", {}, {}, [[["x"]]])),
+    ],
+    ids=["truncated", "zeroed", "empty", "not-a-tuple", "short-tuple", "bad-node"],
+)
+def test_corrupt_cache(tmp_path, mib, damage):
+    """截断或者损坏的缓存文件当作没有命中, 重新解析并覆盖它"""
+    expected = load(mib, tmp_path / "cache")
+    (cache_file,) = (tmp_path / "cache").iterdir()
+    cache_file.write_bytes(damage(cache_file.read_bytes()))
+    parser = load(mib, tmp_path / "cache")
+    assert not parser.cached
+    assert_same(parser, expected)
+    assert load(mib, tmp_path / "cache").cached
@@ -0,0 +1,67 @@
+import sys
+
+import pytest
+
+from mib_compiler import compile_batch, dependency_levels
+from mib_parser import main
+
+
+def module(name, sub_id, imports=""):
+    """一个只有一个OBJECT IDENTIFIER的模块, imports为"名字 FROM 模块"的列表"""
+    return (
+        f"{name} DEFINITIONS ::= BEGIN\n"
+        f"IMPORTS enterprises FROM SNMPv2-SMI {imports};\n"
+        f"n{sub_id} OBJECT IDENTIFIER ::= {{ enterprises {sub_id} }}\n"
+        "END\n"
+    )
+
+
+def test_dependency_levels():
+    """只有循环里的模块算循环导入, 导入它们的模块是被阻塞的"""
+    headers = {
+        "A": {"B": ["x"]},
+        "B": {"A": ["x"]},
+        "C": {"A": ["x"]},
+        "D": {"C": ["x"], "E": ["x"]},
+        "E": {},
+        "F": {"F": ["x"]},
+    }
+    levels, cycles, blocked = dependency_levels(headers)
+    assert levels == [["E"]]
+    assert cycles == {"A": ["A", "B", "A"], "B": ["B", "A", "B"], "F": ["F", "F"]}
+    assert blocked == {"C": ["A"], "D": ["C"]}
+
+
+def test_batch_errors(tmp_path, monkeypatch):
+    """循环导入, 依赖循环的模块和生成同名文件的输入分别报告, 不会互相覆盖"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    files = {
+        "A-MIB.mib": module("A-MIB", 1, "n2 FROM B-MIB"),
+        "B-MIB.mib": module("B-MIB", 2, "n1 FROM A-MIB"),
+        "C-MIB.mib": module("C-MIB", 3, "n1 FROM A-MIB"),
+        "a/SAME.mib": module("E-MIB", 5),
+        "b/SAME.mib": module("F-MIB", 6),
+    }
+    for name, text in files.items():
+        (tmp_path / name).write_text(text)
+    results = dict(compile_batch(list(files), jobs=2, engine="fast"))
+    assert results == {
+        "A-MIB.mib": "MibCompileError: circular IMPORTS: A-MIB -> B-MIB -> A-MIB",
+        "B-MIB.mib": "MibCompileError: circular IMPORTS: B-MIB -> A-MIB -> B-MIB",
+        "C-MIB.mib": "skipped: depends on A-MIB",
+        "a/SAME.mib": None,
+        "b/SAME.mib": "output SAME.c/.h already generated for a/SAME.mib",
+    }
+    assert "n5_mib" in (tmp_path / "SAME.c").read_text()
+
+
+@pytest.mark.parametrize("jobs", ["0", "-2"])
+def test_jobs_at_least_one(monkeypatch, capsys, jobs):
+    """-j小于1时参数错误, 不会交给ProcessPoolExecutor"""
+    monkeypatch.setattr(sys, "argv", ["mib_parser.py", "-j", jobs, "A.mib", "B.mib"])
+    with pytest.raises(SystemExit) as err:
+        main()
+    assert err.value.code == 2
+    assert "must be at least 1" in capsys.readouterr().err
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from mib_parser import ENGINES, MibParser
+
+DMR_MIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DMR-MIB.mib")
+
+
+@pytest.fixture(name="results")
+def fixture_results(tmp_path, monkeypatch):
+    """用每个引擎解析DMR-MIB.mib, 返回{引擎: (MibParser, 生成的.c, 生成的.h)}"""
+    results = {}
+    for engine in ENGINES:
+        out = tmp_path / engine
+        out.mkdir()
+        monkeypatch.chdir(out)
+        parser = MibParser(engine=engine)
+        assert parser.parse(DMR_MIB)
+        results[engine] = (
+            parser,
+            (out / "DMR_MIB.c").read_text(encoding="utf-8"),
+            (out / "DMR_MIB.h").read_text(encoding="utf-8"),
+        )
+    return results
+
+
+def test_same_tree(results):
+    """两个引擎得到相同的node_list, node_dict和name_oid"""
+    expected, _, _ = results["pyparsing"]
+    for engine in ENGINES:
+        parser, _, _ = results[engine]
+        assert parser.node_list == expected.node_list, engine
+        assert parser.node_dict == expected.node_dict, engine
+        assert parser.name_oid == expected.name_oid, engine
+
+
+def test_same_output(results):
+    """两个引擎生成的.c/.h逐字节相同"""
+    _, expected_c, expected_h = results["pyparsing"]
+    for engine in ENGINES:
+        _, text_c, text_h = results[engine]
+        assert text_c == expected_c, engine
+        assert text_h == expected_h, engine
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from mib_export import HEADER, MibTree, export_tree
+from mib_io import replace_file
+from mib_parser import MibParser
+
+DMR_MIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DMR-MIB.mib")
+
+ACCESS_MIB = """\
+A-MIB DEFINITIONS ::= BEGIN
+IMPORTS enterprises, Integer32, OBJECT-TYPE FROM SNMPv2-SMI;
+aGroup OBJECT IDENTIFIER ::= { enterprises 11 }
+aHidden OBJECT-TYPE SYNTAX Integer32 MAX-ACCESS not-access STATUS current
+    DESCRIPTION "x" ::= { aGroup 1 }
+aValue OBJECT-TYPE SYNTAX Integer32 (0..7) MAX-ACCESS read-write STATUS current
+    DESCRIPTION "x" ::= { aGroup 2 }
+END
+"""
+
+
+def load(fname):
+    """只解析不生成代码, 返回node_dict"""
+    parser = MibParser(engine="fast")
+    parser.ctx.add_base("SNMPv2-SMI", ["private", "enterprises"])
+    parser.load(fname)
+    return parser.node_dict
+
+
+def check_roundtrip(node_dict, fname):
+    """导出再打开, 每个节点的字段和原来相同"""
+    export_tree(node_dict, fname)
+    with MibTree(fname) as tree:
+        assert len(tree) == len(node_dict)
+        for oid, node in node_dict.items():
+            i = tree.find(oid)
+            assert i >= 0
+            assert tree.lookup(node.name) == i
+            assert tree.node(i).astuple() == node.astuple()
+
+
+def test_roundtrip(tmp_path):
+    """DMR-MIB.mib导出后取回的节点和解析结果相同"""
+    check_roundtrip(load(DMR_MIB), str(tmp_path / "dmr.mibt"))
+
+
+def test_resolve(tmp_path):
+    """resolve按最长前缀找到节点, 返回剩下的实例部分"""
+    node_dict = load(DMR_MIB)
+    fname = str(tmp_path / "dmr.mibt")
+    export_tree(node_dict, fname)
+    oid = max(node_dict)
+    with MibTree(fname) as tree:
+        i, instance = tree.resolve(oid + (7, 0))
+        assert tree.oid(i) == oid
+        assert instance == (7, 0)
+        assert tree.resolve((2, 99)) == (-1, (2, 99))
+
+
+def test_any_access(tmp_path):
+    """access不在常见取值里(比如not-access)时也能导出和取回"""
+    mib = tmp_path / "A-MIB.mib"
+    mib.write_text(ACCESS_MIB)
+    node_dict = load(str(mib))
+    check_roundtrip(node_dict, str(tmp_path / "a.mibt"))
+    with MibTree(str(tmp_path / "a.mibt")) as tree:
+        assert tree.node(tree.lookup("aHidden")).access == "not-access"
+
+
+def test_bad_file(tmp_path):
+    """不是导出文件时报ValueError"""
+    fname = tmp_path / "bad.mibt"
+    fname.write_bytes(b"not a tree")
+    with pytest.raises(ValueError):
+        MibTree(str(fname))
+
+
+def test_truncated_file(tmp_path):
+    """截断的文件报ValueError, 已经打开的mmap和memoryview都被释放"""
+    fname = tmp_path / "dmr.mibt"
+    export_tree(load(DMR_MIB), str(fname))
+    data = fname.read_bytes()
+    for size in (HEADER.size + 4, len(data) // 2, len(data) - 1):
+        fname.write_bytes(data[:size])
+        with pytest.raises(ValueError, match="truncated") as err:
+            MibTree(str(fname))
+        # 从traceback里取出没有构造完的MibTree
+        tb = err.value.__traceback__
+        while tb.tb_frame.f_code.co_name != "__init__":
+            tb = tb.tb_next
+        tree = tb.tb_frame.f_locals["self"]
+        assert tree.buf.closed
+        assert not tree.views
+
+
+def test_failed_write_leaves_nothing(tmp_path):
+    """写入出错时不留下临时文件, 也不改动原来的文件"""
+    fname = tmp_path / "out.mibt"
+    fname.write_bytes(b"old")
+    with pytest.raises(RuntimeError):
+        with replace_file(str(fname), "wb") as f:
+            f.write(b"new")
+            raise RuntimeError("disk full")
+    assert os.listdir(tmp_path) == ["out.mibt"]
+    assert fname.read_bytes() == b"old"
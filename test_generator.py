@@ -0,0 +1,431 @@
+import shutil
+import subprocess
+import textwrap
+
+import pytest
+
+from mib_parser import MibParser
+
+HEADER = """\
+T-MIB DEFINITIONS ::= BEGIN
+IMPORTS enterprises, Integer32, Unsigned32, IpAddress, OBJECT-TYPE, MODULE-IDENTITY,
+    NOTIFICATION-TYPE FROM SNMPv2-SMI DisplayString, PhysAddress FROM SNMPv2-TC;
+t MODULE-IDENTITY LAST-UPDATED "x" ORGANIZATION "x" CONTACT-INFO "x" DESCRIPTION "x"
+    ::= { enterprises 9 }
+"""
+
+# 编译生成的代码用的lwIP替身, 只有生成的代码用到的类型和宏. snmp_send_trap由测试程序实现
+LWIP_STUB = """\
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+typedef int8_t s8_t;
+typedef uint8_t u8_t;
+typedef int16_t s16_t;
+typedef uint16_t u16_t;
+typedef int32_t s32_t;
+typedef uint32_t u32_t;
+typedef int err_t;
+#define ERR_OK 0
+#define ERR_MEM -1
+typedef enum {
+    SNMP_ERR_NOERROR, SNMP_ERR_NOSUCHINSTANCE, SNMP_ERR_WRONGVALUE, SNMP_ERR_WRONGLENGTH,
+    SNMP_ERR_NOACCESS
+} snmp_err_t;
+enum {
+    SNMP_ASN1_TYPE_INTEGER, SNMP_ASN1_TYPE_UNSIGNED32, SNMP_ASN1_TYPE_OCTET_STRING,
+    SNMP_ASN1_TYPE_OBJECT_ID, SNMP_ASN1_TYPE_TIMETICKS, SNMP_ASN1_TYPE_GAUGE,
+    SNMP_ASN1_TYPE_COUNTER, SNMP_ASN1_TYPE_IPADDRESS
+};
+enum { SNMP_VARIANT_VALUE_TYPE_S32, SNMP_VARIANT_VALUE_TYPE_U32, SNMP_VARIANT_VALUE_TYPE_CONST_PTR };
+enum {
+    SNMP_NODE_INSTANCE_READ_ONLY, SNMP_NODE_INSTANCE_READ_WRITE, SNMP_NODE_INSTANCE_WRITE_ONLY,
+    SNMP_NODE_INSTANCE_NOT_ACCESSIBLE
+};
+#define SNMP_GENTRAP_ENTERPRISE_SPECIFIC 6
+#define SNMP_MAX_OBJ_ID_LEN 50
+struct snmp_obj_id { u8_t len; u32_t id[SNMP_MAX_OBJ_ID_LEN]; };
+union snmp_variant_value { void *ptr; const void *const_ptr; u32_t u32; s32_t s32; };
+struct snmp_node_instance { struct snmp_obj_id instance_oid; };
+struct snmp_node { int dummy; };
+struct snmp_leaf_node { struct snmp_node node; };
+struct snmp_tree_node { struct snmp_node node; };
+struct snmp_scalar_node { struct snmp_leaf_node node; };
+struct snmp_scalar_array_node { struct snmp_leaf_node node; };
+struct snmp_table_node { struct snmp_leaf_node node; };
+struct snmp_table_simple_node { struct snmp_leaf_node node; };
+struct snmp_scalar_array_node_def { u32_t oid; int type; int access; };
+struct snmp_table_col_def { u32_t index; int type; int access; };
+struct snmp_table_simple_col_def { u32_t index; int type; int data; };
+struct snmp_mib { const u32_t *base_oid; const struct snmp_node *root; };
+struct snmp_varbind {
+    struct snmp_varbind *next, *prev;
+    struct snmp_obj_id oid;
+    int type;
+    u16_t value_len;
+    void *value;
+};
+static inline void snmp_oid_assign(struct snmp_obj_id *target, const u32_t *oid, u8_t len)
+{
+    target->len = len;
+    memcpy(target->id, oid, len * sizeof(u32_t));
+}
+err_t snmp_send_trap(const struct snmp_obj_id *oid, s32_t generic, s32_t specific,
+                     struct snmp_varbind *varbinds);
+#define SNMP_CREATE_TREE_NODE(id, nodes) {{0}}
+#define SNMP_CREATE_EMPTY_TREE_NODE(id) {{0}}
+#define SNMP_SCALAR_CREATE_NODE(...) {{{0}}}
+#define SNMP_SCALAR_CREATE_ARRAY_NODE(...) {{{0}}}
+#define SNMP_TABLE_CREATE(...) {{{0}}}
+#define SNMP_TABLE_CREATE_SIMPLE(...) {{{0}}}
+#define SNMP_MIB_CREATE(oid, root) {oid, root}
+"""
+
+
+def table(name, sub_id, index, columns):
+    """一个表格的定义, columns为[(列名, SYNTAX)], 列都是read-write"""
+    entry = name + "Entry"
+    seq = entry[0].upper() + entry[1:]
+    lines = [
+        f"{name}Table OBJECT-TYPE SYNTAX SEQUENCE OF {seq} MAX-ACCESS not-accessible",
+        f'    STATUS current DESCRIPTION "d" ::= {{ t {sub_id} }}',
+        f"{entry} OBJECT-TYPE SYNTAX {seq} MAX-ACCESS not-accessible",
+        f'    STATUS current DESCRIPTION "d" INDEX {{ {", ".join(index)} }}',
+        f"    ::= {{ {name}Table 1 }}",
+        f"{seq} ::= SEQUENCE {{ {', '.join(f'{col} Integer32' for col, _ in columns)} }}",
+    ]
+    for i, (col, syntax) in enumerate(columns, 1):
+        lines.append(
+            f"{col} OBJECT-TYPE SYNTAX {syntax} MAX-ACCESS read-write STATUS current"
+            f' DESCRIPTION "d" ::= {{ {entry} {i} }}'
+        )
+    return "\n".join(lines) + "\n"
+
+
+def scalars(group, sub_id, members):
+    """scalar group的定义, members为[(subId, MAX-ACCESS)], 都是Integer32 (0..10)"""
+    lines = [f"{group} OBJECT IDENTIFIER ::= {{ t {sub_id} }}"]
+    for member, access in members:
+        lines.append(
+            f"{group}M{member} OBJECT-TYPE SYNTAX Integer32 (0..10) MAX-ACCESS {access}"
+            f' STATUS current DESCRIPTION "d" ::= {{ {group} {member} }}'
+        )
+    return "\n".join(lines) + "\n"
+
+
+def generate(tmp_path, monkeypatch, body, **options):
+    """生成T-MIB, 返回(.c, .h)"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "T-MIB.mib").write_text(HEADER + textwrap.dedent(body) + "END\n")
+    parser = MibParser(engine="fast", generator_options=options)
+    assert parser.parse(str(tmp_path / "T-MIB.mib"))
+    return (tmp_path / "T_MIB.c").read_text(), (tmp_path / "T_MIB.h").read_text()
+
+
+# 两个notification, tAlarm的OBJECTS和OID的顺序不同
+TRAPS = """\
+tObjects OBJECT IDENTIFIER ::= { t 3 }
+tName OBJECT-TYPE SYNTAX DisplayString MAX-ACCESS read-only STATUS current
+    DESCRIPTION "d" ::= { tObjects 1 }
+tLevel OBJECT-TYPE SYNTAX Integer32 MAX-ACCESS read-only STATUS current
+    DESCRIPTION "d" ::= { tObjects 2 }
+tCount OBJECT-TYPE SYNTAX Unsigned32 MAX-ACCESS read-only STATUS current
+    DESCRIPTION "d" ::= { tObjects 3 }
+tTraps OBJECT IDENTIFIER ::= { t 4 }
+tAlarm NOTIFICATION-TYPE OBJECTS { tLevel, tName, tCount } STATUS current
+    DESCRIPTION "d" ::= { tTraps 1 }
+tClear NOTIFICATION-TYPE OBJECTS { tLevel } STATUS current
+    DESCRIPTION "d" ::= { tTraps 2 }
+"""
+
+# 测试程序里的snmp_send_trap, 输出trap OID的最后一个子标识符和沿next的每个varbind,
+# prev和next对不上时输出BADPREV. fail_send不为0时发送失败
+SEND_RECORDER = """\
+static int fail_send;
+
+err_t snmp_send_trap(const struct snmp_obj_id *oid, s32_t generic, s32_t specific,
+                     struct snmp_varbind *varbinds)
+{
+    struct snmp_varbind *vb;
+
+    if (fail_send)
+        return ERR_MEM;
+    printf("trap %u", (unsigned)oid->id[oid->len - 1]);
+    if (varbinds != NULL && varbinds->prev != NULL)
+        printf(" BADPREV");
+    for (vb = varbinds; vb != NULL; vb = vb->next) {
+        if (vb->next != NULL && vb->next->prev != vb)
+            printf(" BADPREV");
+        printf(" %u=", (unsigned)vb->oid.id[vb->oid.len - 1]);
+        if (vb->type == SNMP_ASN1_TYPE_OCTET_STRING)
+            printf("'%.*s'", vb->value_len, vb->value_len ? (const char *)vb->value : "");
+        else if (vb->type == SNMP_ASN1_TYPE_INTEGER)
+            printf("%ld", (long)*(s32_t *)vb->value);
+        else
+            printf("%lu", (unsigned long)*(u32_t *)vb->value);
+    }
+    printf("\\n");
+    return ERR_OK;
+}
+
+"""
+
+
+def run_c(tmp_path, main):
+    """把生成的T_MIB.c和测试程序main一起编译运行, 返回标准输出. 没有C编译器时跳过"""
+    compiler = shutil.which("gcc") or shutil.which("cc")
+    if compiler is None:
+        pytest.skip("no C compiler")
+    (tmp_path / "snmp_task.h").write_text(LWIP_STUB)
+    (tmp_path / "main.c").write_text('#include "T_MIB.c"\n\n' + textwrap.dedent(main))
+    exe = str(tmp_path / "main")
+    result = subprocess.run(
+        [compiler, "-Wall", "-o", exe, str(tmp_path / "main.c")],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    assert result.returncode == 0, result.stderr
+    result = subprocess.run([exe], capture_output=True, text=True, check=False)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result.stdout
+
+
+def test_direct_row_storage(tmp_path, monkeypatch):
+    """取值范围在1..ROWS之内的整数INDEX直接作为数组下标"""
+    body = table("one", 1, ["oneIdx"], [("oneIdx", "Integer32 (1..8)"), ("oneVal", "Integer32")])
+    text_c, _ = generate(tmp_path, monkeypatch, body, row_storage=16)
+    assert "oneTable_used[(8 + 31) / 32]" in text_c
+    assert "oneTable_encode_index" not in text_c
+
+
+def test_zero_index_sorted_storage(tmp_path, monkeypatch):
+    """可以取0的整数INDEX放不进从1开始的数组, 用排序的行存储"""
+    body = table("zero", 1, ["zeroIdx"], [("zeroIdx", "Integer32 (0..8)"), ("zeroVal", "Integer32")])
+    text_c, _ = generate(tmp_path, monkeypatch, body, row_storage=16)
+    assert "zeroTable_used" not in text_c
+    assert "zeroTable_encode_index" in text_c
+
+
+def test_long_string_index(tmp_path, monkeypatch):
+    """字符串索引按实例OID剩下的长度截短, 编码后放不下的行不能加入"""
+    body = table(
+        "name",
+        1,
+        ["nameA", "nameB"],
+        [
+            ("nameA", "DisplayString (SIZE (0..255))"),
+            ("nameB", "DisplayString (SIZE (0..255))"),
+            ("nameVal", "Integer32"),
+        ],
+    )
+    text_c, text_h = generate(tmp_path, monkeypatch, body, row_storage=16)
+    # 1.3.6.1.4.1.9.1.1加上列一共10个子标识符, INDEX最多40个
+    assert "u8_t nameA[38];" in text_h
+    assert "u8_t nameB[38];" in text_h
+    assert "u32_t key[78];" in text_c
+    assert "    if (len > 40)\n        return NULL;\n" in text_c
+    assert "#if SNMP_MAX_OBJ_ID_LEN < 9 + 1 + 40\n" in text_c
+    assert "u8_t len" not in text_c
+
+
+def test_index_too_long(tmp_path, monkeypatch):
+    """定长的INDEX就放不下实例OID时不生成行存储"""
+    body = table(
+        "wide", 1, ["wideKey"], [("wideKey", "DisplayString (SIZE (45))"), ("wideVal", "Integer32")]
+    )
+    text_c, _ = generate(tmp_path, monkeypatch, body, row_storage=16)
+    assert "wideTable_rows" not in text_c
+
+
+def test_fragment_follows_index(tmp_path, monkeypatch):
+    """INDEX里别的表格的对象变化时, 增量生成不复用旧的表格代码"""
+    # pylint: disable=import-outside-toplevel
+    from mib_incremental import IncrementalParser
+
+    monkeypatch.chdir(tmp_path)
+    fname = tmp_path / "T-MIB.mib"
+
+    def write(syntax):
+        a = table("a", 1, ["aIdx"], [("aIdx", syntax), ("aVal", "Integer32")])
+        b = table("b", 2, ["aIdx", "bIdx"], [("bIdx", "Integer32"), ("bVal", "Integer32")])
+        fname.write_text(HEADER + a + b + "END\n")
+
+    write("Integer32")
+    parser = IncrementalParser(generator_options={"row_storage": 16})
+    parser.parse(str(fname))
+    write("IpAddress")
+    parser.parse(str(fname))
+    incremental = (tmp_path / "T_MIB.c").read_text(), (tmp_path / "T_MIB.h").read_text()
+    assert "    u8_t aIdx[4];\n" in incremental[1]
+    full = tmp_path / "full"
+    full.mkdir()
+    monkeypatch.chdir(full)
+    assert MibParser(engine="fast", generator_options={"row_storage": 16}).parse(str(fname))
+    assert incremental == ((full / "T_MIB.c").read_text(), (full / "T_MIB.h").read_text())
+
+
+def test_binary_columns(tmp_path, monkeypatch):
+    """IpAddress和PhysAddress列按长度保存, 包含0的地址读出来长度和内容不变"""
+    body = table(
+        "host",
+        1,
+        ["hostIdx"],
+        [("hostIdx", "Integer32 (1..8)"), ("hostAddr", "IpAddress"), ("hostMac", "PhysAddress")],
+    )
+    _, text_h = generate(tmp_path, monkeypatch, body, row_storage=16)
+    assert "    u8_t hostAddr[4];\n" in text_h
+    assert "    u8_t hostMac[255];\n    u16_t hostMac_len;\n" in text_h
+    main = """\
+        static void check(u32_t column, u8_t *data, u16_t len)
+        {
+            struct snmp_node_instance instance = {{3, {1, column, 5}}};
+            u8_t value[256];
+            snmp_err_t err = hostTable_set_test(&instance, len, data);
+            if (err == SNMP_ERR_NOERROR)
+                hostTable_set_value(&instance, len, data);
+            s16_t got = hostTable_get_value(&instance, value);
+            printf("%d %d %d\\n", err, got, got == len && memcmp(value, data, len) == 0);
+        }
+
+        int main(void)
+        {
+            u8_t addr[4] = {10, 0, 0, 1};
+            u8_t mac[6] = {0, 1, 0, 0, 2, 0};
+            hostTable_add_row(5);
+            check(2, addr, 4);
+            check(3, mac, 6);
+            check(3, mac, 0);
+            check(2, addr, 3);
+            return 0;
+        }
+    """
+    lines = run_c(tmp_path, main).splitlines()
+    assert lines[:3] == ["0 4 1", "0 6 1", "0 0 1"]
+    # 长度不对的IpAddress不能写入, 原来的值不变
+    assert lines[3] == "3 4 0"
+
+
+def test_trap_queue(tmp_path, monkeypatch):
+    """队列合并相同的trap(包括NULL字符串), 满了返回ERR_MEM, 发送失败的留在队列里"""
+    generate(tmp_path, monkeypatch, TRAPS, trap_queue=3)
+    main = SEND_RECORDER + """\
+        int main(void)
+        {
+            char disk[] = "disk";
+            struct tAlarm alarm = {1, "disk", 7};
+            struct tAlarm copy = {1, disk, 7};
+            struct tAlarm unnamed = {2, NULL, 0};
+            struct tClear clear3 = {3};
+            struct tClear clear4 = {4};
+
+            printf("%d", queue_trap_tAlarm(&alarm));
+            printf(" %d", queue_trap_tAlarm(&copy));
+            printf(" %d", queue_trap_tAlarm(&unnamed));
+            printf(" %d", queue_trap_tAlarm(&unnamed));
+            printf(" %d", queue_trap_tClear(&clear3));
+            printf(" %d\\n", queue_trap_tClear(&clear4));
+            fail_send = 1;
+            printf("sent %u\\n", T_MIB_flush_traps(10));
+            fail_send = 0;
+            printf("sent %u\\n", T_MIB_flush_traps(2));
+            printf("%d\\n", queue_trap_tClear(&clear4));
+            printf("sent %u\\n", T_MIB_flush_traps(10));
+            return 0;
+        }
+    """
+    assert run_c(tmp_path, main).splitlines() == [
+        "0 0 0 0 0 -1",
+        "sent 0",
+        "trap 1 2=1 1='disk' 3=7",
+        "trap 1 2=2 1='' 3=0",
+        "sent 2",
+        "0",
+        "trap 2 2=3",
+        "trap 2 2=4",
+        "sent 2",
+    ]
+
+
+def test_trap_queue_size(tmp_path, monkeypatch):
+    """队列的下标和计数是u16_t, 放不下的长度直接报错"""
+    with pytest.raises(ValueError):
+        generate(tmp_path, monkeypatch, TRAPS, trap_queue=65536)
+
+
+@pytest.mark.parametrize(
+    "members, dense",
+    [
+        # 最大的subId+1不超过成员数的DENSE_FILL(2)倍时按下标查表
+        ([1, 2, 3, 5, 7], True),
+        ([1, 2, 5], True),
+        ([1, 2, 6], False),
+        ([3, 40, 1000], False),
+    ],
+)
+def test_dispatch_tables(tmp_path, monkeypatch, members, dense):
+    """查表分派的GET/SET和switch一样找到每个成员, 不存在的和只读的subId返回NOSUCHINSTANCE"""
+    readonly = members[1]
+    body = scalars("grp", 5, [(m, "read-only" if m == readonly else "read-write") for m in members])
+    text_c, _ = generate(tmp_path, monkeypatch, body, dispatch_threshold=1)
+    size = members[-1] + 1
+    assert "switch (scalar->oid)" not in text_c
+    assert (f"grp_get_value_table[{size}] = {{" in text_c) == dense
+    assert (f"u32_t lo = 0, hi = {len(members)};" in text_c) == (not dense)
+    main = f"""\
+        int main(void)
+        {{
+            u32_t oid;
+
+            for (oid = 0; oid <= {size + 1}; oid++) {{
+                struct snmp_scalar_array_node_def def = {{oid, 0, 0}};
+                s32_t value = -1, good = 5, bad = 11;
+                s16_t len = grp_get_value(&def, &value);
+                printf("%u %d %d %d %d %d\\n", (unsigned)oid, len, len ? (int)value : -1,
+                       grp_set_test(&def, sizeof(good), &good),
+                       grp_set_test(&def, sizeof(bad), &bad),
+                       grp_set_value(&def, sizeof(good), &good));
+            }}
+            return 0;
+        }}
+    """
+    expected = []
+    for oid in range(size + 2):
+        if oid not in members:
+            expected.append(f"{oid} 0 -1 1 1 1")
+        elif oid == readonly:
+            expected.append(f"{oid} 4 {oid} 1 1 1")
+        else:
+            # 5在0..10之内, 11返回SNMP_ERR_WRONGVALUE
+            expected.append(f"{oid} 4 {oid} 0 2 0")
+    assert run_c(tmp_path, main).splitlines() == expected
+
+
+def test_send_trap_varbinds(tmp_path, monkeypatch):
+    """varbind在栈上的数组里, 个数和顺序和OBJECTS相同(不是按OID排序), 不分配内存"""
+    text_c, _ = generate(tmp_path, monkeypatch, TRAPS)
+    assert "struct snmp_varbind vb[3];" in text_c
+    assert "struct snmp_varbind vb[1];" in text_c
+    assert "malloc" not in text_c and "free(" not in text_c
+    main = SEND_RECORDER + """\
+        int main(void)
+        {
+            struct tAlarm alarm = {-3, "disk", 4000000000u};
+            struct tAlarm unnamed = {5, NULL, 6};
+            struct tClear clear = {9};
+
+            printf("%d\\n", send_trap_tAlarm(&alarm));
+            printf("%d\\n", send_trap_tAlarm(&unnamed));
+            printf("%d\\n", send_trap_tClear(&clear));
+            return 0;
+        }
+    """
+    assert run_c(tmp_path, main).splitlines() == [
+        "trap 1 2=-3 1='disk' 3=4000000000",
+        "0",
+        "trap 1 2=5 1='' 3=6",
+        "0",
+        "trap 2 2=9",
+        "0",
+    ]
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from mib_index import OidIndex
+from mib_parser import MibParser
+
+DMR_MIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DMR-MIB.mib")
+
+
+@pytest.fixture(name="parser", scope="module")
+def fixture_parser():
+    """只解析DMR-MIB.mib, 不生成代码"""
+    parser = MibParser(engine="fast")
+    parser.ctx.add_base("SNMPv2-SMI", ["private", "enterprises"])
+    parser.load(DMR_MIB)
+    return parser
+
+
+@pytest.fixture(name="index")
+def fixture_index(parser):
+    """DMR-MIB.mib的OidIndex"""
+    return OidIndex(parser.node_dict)
+
+
+def test_lookup(parser, index):
+    """精确查找命中返回节点, 前缀, 实例OID和不存在的OID都返回None"""
+    oid = parser.name_oid["dgState"]
+    assert index.lookup(oid) is parser.node_dict[oid]
+    assert index.lookup(list(oid)) is parser.node_dict[oid]
+    assert list(oid) in index
+    assert index.lookup(oid + (1,)) is None
+    assert index.lookup(oid[:-1] + (99,)) is None
+    assert index.lookup(()) is None
+    assert len(index) == len(parser.node_dict)
+
+
+def test_longest_prefix(parser, index):
+    """列加INDEX组成的实例OID解析到列, 树外的OID返回None"""
+    column = parser.name_oid["dgState"]
+    assert index.longest_prefix(column + (3,)).name == "dgState"
+    assert index.longest_prefix(column + (3, 0, 7)).name == "dgState"
+    assert index.longest_prefix(column).name == "dgState"
+    # entry下没有定义的列落到entry
+    entry = parser.name_oid["dgInfoEntry"]
+    assert index.longest_prefix(entry + (99, 1)).name == "dgInfoEntry"
+    assert index.longest_prefix((2, 1)) is None
+
+
+def test_iter_subtree(parser, index):
+    """子树按字典序包含根和所有后代, 不包含数字前缀相同的兄弟(1和10..19)"""
+    column = parser.name_oid["dgIndex"]
+    assert column[-1] == 1
+    assert parser.name_oid["dgInfoEntry"] + (10,) in parser.node_dict
+    assert [node.name for node in index.iter_subtree(column)] == ["dgIndex"]
+
+    table = parser.name_oid["dgInfoTable"]
+    nodes = list(index.iter_subtree(table))
+    entry = parser.node_dict[parser.name_oid["dgInfoEntry"]]
+    assert [node.oid for node in nodes] == sorted(node.oid for node in nodes)
+    assert nodes[0].name == "dgInfoTable"
+    assert {node.name for node in nodes[2:]} == {kid.name for kid in entry.kids}
+    assert all(node.oid[: len(table)] == table for node in nodes)
+    assert list(index.iter_subtree(column + (1,))) == []
+
+
+def test_next_oid(parser, index):
+    """GETNEXT: 下一个定义的OID, 实例OID之后是下一列, 最后一个节点之后是None"""
+    column = parser.name_oid["dgIndex"]
+    assert index.next_oid(column) == parser.name_oid["dgState"]
+    assert index.next_oid(column + (5,)) == parser.name_oid["dgState"]
+    assert index.next_oid(()) == min(parser.node_dict)
+    last = max(parser.node_dict)
+    assert index.next_oid(last) is None
+    assert index.next_oid(last + (1,)) is None
@@ -0,0 +1,94 @@
+import pytest
+
+from mib_parser import ENGINES, MibLinkError, MibParser
+from mib_stream import iter_nodes
+
+HEADER = """\
+P-MIB DEFINITIONS ::= BEGIN
+IMPORTS enterprises, Integer32, OBJECT-TYPE, MODULE-IDENTITY FROM SNMPv2-SMI;
+p MODULE-IDENTITY LAST-UPDATED "x" ORGANIZATION "x" CONTACT-INFO "x" DESCRIPTION "x"
+    ::= { enterprises 10 }
+"""
+
+
+def scalar(name, parent, sub_id):
+    """一个scalar的定义"""
+    return (
+        f"{name} OBJECT-TYPE SYNTAX Integer32 MAX-ACCESS read-only STATUS current\n"
+        f'    DESCRIPTION "{name}" ::= {{ {parent} {sub_id} }}\n'
+    )
+
+
+def group(name, parent, sub_id):
+    """一个OBJECT IDENTIFIER的定义"""
+    return f"{name} OBJECT IDENTIFIER ::= {{ {parent} {sub_id} }}\n"
+
+
+def write_mib(tmp_path, body):
+    """把body写成P-MIB, 返回文件名"""
+    fname = tmp_path / "P-MIB.mib"
+    fname.write_text(HEADER + body + "END\n")
+    return str(fname)
+
+
+def load(fname, **options):
+    """只解析不生成代码, 返回MibParser"""
+    parser = MibParser(**options)
+    parser.ctx.add_base("SNMPv2-SMI", ["private", "enterprises"])
+    parser.load(fname)
+    return parser
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_parallel_forward_references(tmp_path, engine):
+    """父节点定义在后面的段里时, 并行解析得到和按顺序解析相同的树"""
+    # 每个group的scalar在前, group本身在文件末尾, 切成的段之间都是前向引用
+    body = "".join(
+        scalar(f"s{g}x{i}", f"g{g}", i) for g in range(1, 21) for i in range(100, 0, -1)
+    )
+    body += "".join(group(f"g{g}", "p", g) for g in range(20, 0, -1))
+    fname = write_mib(tmp_path, body)
+    expected = load(fname, engine=engine)
+    parser = load(fname, engine=engine, parse_jobs=2)
+    assert len(parser.node_dict) == len(expected.node_dict)
+    assert parser.node_dict == expected.node_dict
+    assert parser.name_oid == expected.name_oid
+    group_node = parser.node_dict[parser.name_oid["g3"]]
+    assert [kid.subId for kid in group_node.kids] == list(range(1, 101))
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_forward_references(tmp_path, engine):
+    """父节点定义在子节点后面时仍然链接成树, kids按subId排序, scalar照常区分"""
+    body = scalar("late2", "grp", 2) + scalar("late1", "grp", 1) + group("grp", "p", 1)
+    parser = load(write_mib(tmp_path, body), engine=engine)
+    grp = parser.node_dict[parser.name_oid["grp"]]
+    assert [kid.name for kid in grp.kids] == ["late1", "late2"]
+    assert parser.name_oid["late2"] == (1, 3, 6, 1, 4, 1, 10, 1, 2)
+    assert all(kid.type == "scalar" for kid in grp.kids)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_link_errors(tmp_path, engine):
+    """找不到的父节点和循环引用在一个MibLinkError里一起报告"""
+    body = (
+        scalar("a", "nowhere", 1)
+        + scalar("b", "nowhere", 2)
+        + group("c", "d", 1)
+        + group("d", "c", 1)
+    )
+    with pytest.raises(MibLinkError) as err:
+        load(write_mib(tmp_path, body), engine=engine)
+    assert "undefined parent 'nowhere' of 'a', 'b'" in str(err.value)
+    assert "circular parent 'c' -> 'd'" in str(err.value)
+
+
+def test_stream_large_group(tmp_path):
+    """iter_nodes返回和load相同的节点, 大的group的kids按subId排好序"""
+    body = group("grp", "p", 1) + "".join(scalar(f"s{i}", "grp", i) for i in range(1, 3001))
+    fname = write_mib(tmp_path, body)
+    expected = load(fname, engine="fast")
+    nodes = {node.oid: node for node in iter_nodes(fname)}
+    assert nodes.keys() == expected.node_dict.keys() - {(1, 3, 6, 1, 4), (1, 3, 6, 1, 4, 1)}
+    grp = nodes[expected.name_oid["grp"]]
+    assert [kid.subId for kid in grp.kids] == list(range(1, 3001))
@@ -0,0 +1,69 @@
+import os
+
+from mib_watch import MibWatcher
+
+BASE = """\
+BASE-MIB DEFINITIONS ::= BEGIN
+IMPORTS enterprises FROM SNMPv2-SMI;
+baseRoot OBJECT IDENTIFIER ::= {{ enterprises {sub_id} }}
+END
+"""
+
+USE = """\
+USE-MIB DEFINITIONS ::= BEGIN
+IMPORTS Integer32, OBJECT-TYPE FROM SNMPv2-SMI baseRoot FROM BASE-MIB;
+useValue OBJECT-TYPE SYNTAX Integer32 MAX-ACCESS read-only STATUS current
+    DESCRIPTION "d" ::= { baseRoot 1 }
+END
+"""
+
+OTHER = """\
+OTHER-MIB DEFINITIONS ::= BEGIN
+IMPORTS enterprises FROM SNMPv2-SMI;
+otherRoot OBJECT IDENTIFIER ::= { enterprises 30 }
+END
+"""
+
+
+def write(path, text, stamp):
+    """写入text并把修改时间设成stamp秒, 不依赖文件系统的时间精度"""
+    path.write_text(text)
+    os.utime(path, ns=(stamp * 10**9, stamp * 10**9))
+
+
+def test_poll(tmp_path, monkeypatch, capsys):
+    """依赖变化时导入它的文件跟着重新生成, 删除文件不会抛出异常"""
+    mibs = tmp_path / "mibs"
+    mibs.mkdir()
+    monkeypatch.chdir(tmp_path)
+    base, use, other = mibs / "BASE-MIB.mib", mibs / "USE-MIB.mib", mibs / "OTHER-MIB.mib"
+    write(base, BASE.format(sub_id=20), 1000)
+    write(use, USE, 1000)
+    write(other, OTHER, 1000)
+    watcher = MibWatcher(str(mibs))
+
+    assert watcher.poll() == [str(base), str(other), str(use)]
+    assert "{ 1, 3, 6, 1, 4, 1, 20 }" in (tmp_path / "USE_MIB.c").read_text()
+    assert watcher.poll() == []
+
+    # 只改了BASE-MIB, 导入它的USE-MIB用新的OID重新生成, OTHER-MIB不动
+    write(base, BASE.format(sub_id=21), 2000)
+    assert watcher.poll() == [str(base), str(use)]
+    assert "{ 1, 3, 6, 1, 4, 1, 21 }" in (tmp_path / "USE_MIB.c").read_text()
+
+    # 只改修改时间也算变化
+    os.utime(other, ns=(3000 * 10**9, 3000 * 10**9))
+    assert watcher.poll() == [str(other)]
+
+    # 删掉依赖: USE-MIB重新生成失败, 只输出错误
+    capsys.readouterr()
+    base.unlink()
+    assert watcher.poll() == [str(use)]
+    assert "cannot find MIB module BASE-MIB" in capsys.readouterr().out
+    assert str(base) not in watcher.headers
+
+    # 删掉被监视的文件本身
+    use.unlink()
+    assert watcher.poll() == []
+    assert str(use) not in watcher.parsers
+    assert watcher.poll() == []